@@ -125,6 +125,15 @@ class AltimetryHelper(object):
                                   int(ycenter + height / 2.0))
         return (xmin, ymin, xmax, ymax)
 
+    @classmethod
+    def dem_overview(cls, precision):
+        """Returns the name of the coarsest DEM table (overview or ``mnt``)
+        whose resolution is enough for the specified sampling step.
+        """
+        cursor = connection.cursor()
+        cursor.execute('SELECT ft_dem_overview(%s);', [precision])
+        return cursor.fetchone()[0]
+
     @classmethod
     def elevation_area(cls, geom):
         xmin, ymin, xmax, ymax = cls._nice_extent(geom)
@@ -143,6 +152,8 @@ class AltimetryHelper(object):
             logger.warn("No DEM present")
             return {}
 
+        dem = cls.dem_overview(precision)
+
         sql = """
             -- Author: Celian Garcia
             WITH columns AS (
@@ -164,7 +175,7 @@ class AltimetryHelper(object):
                 ),
                 draped AS (
                     SELECT id, ST_Value(mnt.rast, p.geom)::int AS altitude
-                    FROM mnt, points2d AS p
+                    FROM {dem} AS mnt, points2d AS p
                     WHERE ST_Intersects(mnt.rast, p.geom)
                 ),
                 all_draped AS (
@@ -189,7 +200,7 @@ class AltimetryHelper(object):
                    altitude
             FROM extent_latlng, resolution, all_draped;
         """.format(xmin=xmin, ymin=ymin, xmax=xmax, ymax=ymax,
-                   srid=settings.SRID, precision=precision)
+                   srid=settings.SRID, precision=precision, dem=dem)
         cursor.execute(sql)
         result = cursor.fetchall()
         first = result[0]
@@ -0,0 +1,53 @@
+import time
+from optparse import make_option
+
+from django.conf import settings
+from django.contrib.gis.geos import LineString
+from django.core.management.base import BaseCommand, CommandError
+
+from geotrek.common.utils import sql_extent
+from geotrek.altimetry.helpers import AltimetryHelper
+
+
+class Command(BaseCommand):
+    help = 'Measure elevation area extraction time for several trek sizes.\n'
+    help += 'Straight treks are built at the center of the loaded DEM.\n'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--sizes',
+                    default='1000,5000,20000,50000',
+                    help='Comma-separated trek lengths in meters.'),
+        make_option('--repeat',
+                    type='int',
+                    default=3,
+                    help='Number of runs per trek size (best is kept).'),
+    )
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(s) for s in options['sizes'].split(',')]
+        except ValueError:
+            raise CommandError('Invalid sizes: %s' % options['sizes'])
+
+        try:
+            xmin, ymin, xmax, ymax = sql_extent("SELECT ST_Extent(rast::geometry) FROM mnt;")
+        except Exception:
+            raise CommandError('No DEM present, load one using loaddem.')
+        xcenter = (xmin + xmax) / 2.0
+        ycenter = (ymin + ymax) / 2.0
+
+        self.stdout.write('%10s %8s %12s %10s %10s\n' % ('length', 'step', 'dem', 'points', 'seconds'))
+        for size in sizes:
+            geom = LineString((xcenter - size / 2.0, ycenter),
+                              (xcenter + size / 2.0, ycenter),
+                              srid=settings.SRID)
+            best = None
+            for i in range(options['repeat']):
+                start = time.time()
+                area = AltimetryHelper.elevation_area(geom)
+                duration = time.time() - start
+                best = duration if best is None else min(best, duration)
+            step = area['resolution']['step']
+            points = area['resolution']['x'] * area['resolution']['y']
+            dem = AltimetryHelper.dem_overview(step)
+            self.stdout.write('%10d %8d %12s %10d %10.3f\n' % (size, step, dem, points, best))
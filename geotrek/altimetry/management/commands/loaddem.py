@@ -109,8 +109,13 @@ class Command(BaseCommand):
 
         # What to do with existing DEM (if any)
         if dem_exists and replace:
-            # Drop table
+            # Drop table and its overviews
             cur = connection.cursor()
+            sql = 'SELECT o_table_name FROM raster_overviews WHERE r_table_name = \'mnt\''
+            cur.execute(sql)
+            overviews = [row[0] for row in cur.fetchall()]
+            for overview in overviews:
+                cur.execute('DROP TABLE %s' % overview)
             sql = 'DROP TABLE mnt'
             cur.execute(sql)
             cur.close()
@@ -146,7 +151,11 @@ class Command(BaseCommand):
 
         # Step 2: Convert to PostGISRaster format
         output = tempfile.NamedTemporaryFile()  # SQL code for raster creation
-        cmd = 'raster2pgsql -c -C -I -M -t 100x100 %s mnt' % new_dem.name
+        # Lower resolution overviews (o_<factor>_mnt tables) are used for
+        # coarse samplings (see ``ft_dem_overview()`` SQL function)
+        overviews = ','.join(['%d' % f for f in settings.ALTIMETRIC_DEM_OVERVIEWS])
+        overviews_opt = '-l %s ' % overviews if overviews else ''
+        cmd = 'raster2pgsql -c -C -I -M -t 100x100 %s%s mnt' % (overviews_opt, new_dem.name)
         try:
             self.stdout.write('\n-- Relaying to raster2pgsql ------------\n')
             self.stdout.write(cmd)
@@ -2,6 +2,8 @@ import logging
 
 from django.core.urlresolvers import NoReverseMatch
 
+from mapentity.helpers import is_file_newer
+
 from geotrek.common.management.commands.prepare_map_images import Command as PrepareImageCommand
 
 from geotrek.altimetry.models import AltimetryMixin
@@ -30,8 +32,12 @@ class Command(PrepareImageCommand):
                 pass
         return with_profiles
 
+    def is_up_to_date(self, instance):
+        return is_file_newer(instance.get_elevation_chart_path(), instance.date_update)
+
     def handle_instance(self, instance):
         rooturl = self.options.get('url', self.DEFAULT_URL)
         refreshed = instance.prepare_elevation_chart(rooturl)
         if not refreshed:
             logger.info('%s profile up-to-date.' % instance.get_elevation_chart_path())
+        return refreshed
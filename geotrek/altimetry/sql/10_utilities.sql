@@ -13,8 +13,33 @@ CREATE TYPE elevation_infos AS (
 );
 
 
+-------------------------------------------------------------------------------
+-- Choose the DEM overview matching a sampling step
+-------------------------------------------------------------------------------
+
+CREATE OR REPLACE FUNCTION geotrek.ft_dem_overview(step float) RETURNS varchar AS $$
+DECLARE
+    t_name varchar;
+BEGIN
+    -- Overviews are built by ``loaddem`` (see ALTIMETRIC_DEM_OVERVIEWS).
+    -- Pick the coarsest one whose pixel size does not exceed the step,
+    -- fallback on full resolution DEM otherwise.
+    SELECT o.o_table_name INTO t_name
+        FROM raster_overviews o, raster_columns c
+        WHERE o.r_table_name = 'mnt' AND o.r_raster_column = 'rast'
+          AND c.r_table_name = 'mnt' AND c.r_raster_column = 'rast'
+          AND abs(c.scale_x) * o.overview_factor <= step
+        ORDER BY o.overview_factor DESC
+        LIMIT 1;
+    RETURN coalesce(t_name, 'mnt');
+END;
+$$ LANGUAGE plpgsql;
+
+
 CREATE OR REPLACE FUNCTION geotrek.ft_drape_line(linegeom geometry, step integer)
     RETURNS SETOF geometry AS $$
+DECLARE
+    dem varchar;
 BEGIN
     -- Use sampling steps for draping geometry on DEM
     -- http://blog.mathieu-leplatre.info/drape-lines-on-a-dem-with-postgis.html
@@ -27,6 +52,9 @@ BEGIN
         RETURN QUERY SELECT (ST_DumpPoints(ST_Force_3D(linegeom))).geom AS geom;
 
     ELSE
+        -- No need to read DEM pixels smaller than the sampling step
+        dem := ft_dem_overview(step);
+
         RETURN QUERY
             WITH -- Get endings of each segment of the line
                  r1 AS (SELECT ST_PointN(linegeom, generate_series(1, ST_NPoints(linegeom)-1)) as p1,
@@ -42,14 +70,14 @@ BEGIN
                                ST_SRID(p1) AS srid FROM r3),
                  -- Set SRID of new points
                  r5 AS (SELECT ST_SetSRID(p, srid) as p FROM r4)
-            SELECT add_point_elevation(p) FROM r5;
+            SELECT add_point_elevation(p, dem) FROM r5;
     END IF;
 END;
 $$ LANGUAGE plpgsql;
 
 
 
-CREATE OR REPLACE FUNCTION geotrek.add_point_elevation(geom geometry) RETURNS geometry AS $$
+CREATE OR REPLACE FUNCTION geotrek.add_point_elevation(geom geometry, dem varchar) RETURNS geometry AS $$
 DECLARE
     ele integer;
     geom3d geometry;
@@ -60,11 +88,11 @@ BEGIN
     END IF;
 
     -- Ensure we have a DEM
-    PERFORM * FROM raster_columns WHERE r_table_name = 'mnt';
+    PERFORM * FROM raster_columns WHERE r_table_name = dem;
     IF FOUND THEN
-        SELECT ST_Value(rast, 1, geom)::integer INTO ele
-        FROM mnt
-        WHERE ST_Intersects(rast, geom);
+        EXECUTE 'SELECT ST_Value(rast, 1, $1)::integer FROM '|| quote_ident(dem) ||' WHERE ST_Intersects(rast, $1)'
+            INTO ele
+            USING geom;
     END IF;
 
     geom3d := ST_MakePoint(ST_X(geom), ST_Y(geom), ele);
@@ -74,6 +102,14 @@ END;
 $$ LANGUAGE plpgsql;
 
 
+CREATE OR REPLACE FUNCTION geotrek.add_point_elevation(geom geometry) RETURNS geometry AS $$
+BEGIN
+    -- Single points are always taken from full resolution DEM
+    RETURN add_point_elevation(geom, 'mnt');
+END;
+$$ LANGUAGE plpgsql;
+
+
 CREATE OR REPLACE FUNCTION geotrek.ft_elevation_infos(geom geometry) RETURNS elevation_infos AS $$
 DECLARE
     num_points integer;
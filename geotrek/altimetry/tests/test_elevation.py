@@ -172,6 +172,38 @@ class ElevationAreaTest(TestCase):
         self.assertEqual(extent['altitudes']['min'], 0)
 
 
+class ElevationOverviewTest(TestCase):
+    def setUp(self):
+        # A 25m DEM, with a 50m overview (as built by raster2pgsql -l 2)
+        conn = connections[DEFAULT_DB_ALIAS]
+        cur = conn.cursor()
+        cur.execute('CREATE TABLE mnt (rid serial primary key, rast raster)')
+        cur.execute('INSERT INTO mnt (rast) VALUES (ST_MakeEmptyRaster(100, 125, 0, 125, 25, -25, 0, 0, %s))', [settings.SRID])
+        cur.execute('UPDATE mnt SET rast = ST_AddBand(rast, \'16BSI\')')
+        cur.execute('SELECT AddRasterConstraints(\'mnt\'::name, \'rast\'::name)')
+        cur.execute('CREATE TABLE o_2_mnt AS SELECT rid, ST_Rescale(rast, 50, -50) AS rast FROM mnt')
+        cur.execute('SELECT AddRasterConstraints(\'o_2_mnt\'::name, \'rast\'::name)')
+        cur.execute('SELECT AddOverviewConstraints(\'o_2_mnt\'::name, \'rast\'::name, \'mnt\'::name, \'rast\'::name, 2)')
+
+    def test_full_resolution_is_used_for_fine_steps(self):
+        self.assertEqual(AltimetryHelper.dem_overview(10), 'mnt')
+        self.assertEqual(AltimetryHelper.dem_overview(25), 'mnt')
+
+    def test_coarsest_overview_is_used_for_coarse_steps(self):
+        self.assertEqual(AltimetryHelper.dem_overview(50), 'o_2_mnt')
+        self.assertEqual(AltimetryHelper.dem_overview(866), 'o_2_mnt')
+
+    def test_area_is_extracted_from_overview(self):
+        geom = LineString((100, 370), (100100, 370), srid=settings.SRID)
+        area = AltimetryHelper.elevation_area(geom)
+        self.assertEqual(area['resolution']['step'], 866)
+        self.assertEqual(len(area['altitudes'][0]), area['resolution']['x'])
+
+    def test_path_is_still_draped(self):
+        path = Path.objects.create(geom=LineString((78, 117), (3, 17)))
+        self.assertEqual(len(path.geom_3d.coords), 7)
+
+
 class LengthTest(TestCase):
 
     def setUp(self):
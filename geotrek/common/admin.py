@@ -3,7 +3,7 @@ from django.utils.translation import ugettext_lazy as _
 
 from modeltranslation.admin import TranslationAdmin
 from paperclip.models import Attachment
-from .models import FileType, Organism, Theme
+from .models import FileType, Organism, Theme, Job
 
 
 class OrganismAdmin(admin.ModelAdmin):
@@ -53,7 +53,20 @@ class ThemeAdmin(TranslationAdmin):
     search_fields = ('label',)
 
 
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('kind', 'content_type', 'object_id', 'language', 'status', 'date_insert', 'duration')
+    list_filter = ('status', 'kind', 'content_type')
+    readonly_fields = ('content_type', 'object_id', 'kind', 'language', 'status', 'date_insert',
+                       'date_start', 'date_end', 'error')
+
+    def has_add_permission(self, request):
+        """ Jobs are enqueued on publication.
+        """
+        return False
+
+
 admin.site.register(Organism, OrganismAdmin)
 admin.site.register(Attachment, AttachmentAdmin)
 admin.site.register(FileType, FileTypeAdmin)
 admin.site.register(Theme, ThemeAdmin)
+admin.site.register(Job, JobAdmin)
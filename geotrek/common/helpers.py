@@ -0,0 +1,115 @@
+import os
+import logging
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import transaction
+
+
+logger = logging.getLogger(__name__)
+
+
+class MapImageHelper(object):
+    """ Collects objects whose map image is outdated, and drops them at once,
+    at the end of the current request (see ``MapImageInvalidationMiddleware``),
+    of a ``deferred()`` block, or once an ``atomic()`` transaction is committed.
+
+    Invalidations are recorded per model, as primary keys, in one dirty set
+    per nested block: it is merged into the enclosing one when the block ends,
+    and dropped if an ``atomic()`` transaction is rolled back.
+    Objects whose map image depends on them are resolved with one
+    ``map_image_dependents(pks)`` call per model, if defined, and coalesced.
+    If rendering jobs are enabled, map images are then rendered again by
+    ``run_jobs`` workers.
+    """
+    _local = threading.local()
+
+    @classmethod
+    def _stack(cls):
+        if not hasattr(cls._local, 'stack'):
+            cls._local.stack = []
+        return cls._local.stack
+
+    @classmethod
+    def _dirty(cls):
+        stack = cls._stack()
+        return stack[-1] if stack else {}
+
+    @classmethod
+    def invalidate(cls, model, pk):
+        stack = cls._stack()
+        if stack:
+            stack[-1].setdefault(model, set()).add(pk)
+        else:
+            cls.flush({model: set([pk])})
+
+    @classmethod
+    def begin(cls):
+        cls._stack().append({})
+
+    @classmethod
+    def end(cls, discard=False):
+        stack = cls._stack()
+        if not stack:
+            return
+        dirty = stack.pop()
+        if discard:
+            return
+        if stack:
+            for model, pks in dirty.items():
+                stack[-1].setdefault(model, set()).update(pks)
+        else:
+            cls.flush(dirty)
+
+    @classmethod
+    @contextmanager
+    def deferred(cls):
+        cls.begin()
+        try:
+            yield
+        finally:
+            cls.end()
+
+    @classmethod
+    @contextmanager
+    def atomic(cls, using=None):
+        """ Transaction whose invalidations are flushed once committed,
+        and dropped if rolled back. """
+        cls.begin()
+        try:
+            with transaction.atomic(using=using):
+                yield
+        except BaseException:
+            cls.end(discard=True)
+            raise
+        cls.end()
+
+    @classmethod
+    def outdated(cls, dirty):
+        """ Returns objects to invalidate, coalesced """
+        objects = {}
+        for model, pks in dirty.items():
+            if hasattr(model, 'map_image_dependents'):
+                queryset = model.map_image_dependents(pks)
+            else:
+                queryset = model.objects.filter(pk__in=pks)
+            for obj in queryset:
+                objects[(obj.__class__, obj.pk)] = obj
+        return objects.values()
+
+    @classmethod
+    def flush(cls, dirty):
+        if not dirty:
+            return 0
+        objects = cls.outdated(dirty)
+        for obj in objects:
+            try:
+                os.remove(obj.get_map_image_path())
+            except OSError:
+                pass
+        if settings.RENDERING_JOBS_ENABLED:
+            from geotrek.common.models import Job
+            Job.objects.enqueue_many(objects, kinds=[Job.MAP_IMAGE])
+        logger.info("Invalidated %s map image(s)." % len(objects))
+        return len(objects)
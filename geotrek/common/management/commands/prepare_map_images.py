@@ -1,12 +1,111 @@
-from geotrek.common.mixins import NoDeleteMixin
+import time
+import logging
+import threading
+from Queue import Queue, Empty
+from optparse import make_option
+
+from django.db import connection
+
+from mapentity.helpers import is_file_newer
 from mapentity.management.commands.prepare_map_images import Command as MapentityCommand
 
+from geotrek.common.mixins import NoDeleteMixin, BasePublishableMixin
+
+
+logger = logging.getLogger(__name__)
+
 
 class Command(MapentityCommand):
-    """Override mapentity command of the same name to exclude deleted objects."""
+    """Override mapentity command of the same name to exclude deleted objects,
+    and capture images with a pool of workers."""
+
+    start_model_msg = "Generate all map images of model %s"
+
+    option_list = MapentityCommand.option_list + (
+        make_option('--workers',
+                    type='int',
+                    default=4,
+                    help='Number of concurrent captures.'),
+        make_option('--models',
+                    default='',
+                    help='Comma-separated model names (e.g. trek,poi), all if empty.'),
+        make_option('--published',
+                    action='store_true',
+                    default=False,
+                    help='Only published objects, for publishable models.'),
+        make_option('--force',
+                    action='store_true',
+                    default=False,
+                    help='Capture again up-to-date images.'),
+    )
+
+    def get_models(self):
+        models = super(Command, self).get_models()
+        names = [name.strip() for name in self.options.get('models', '').split(',') if name.strip()]
+        if names:
+            models = [model for model in models if model._meta.module_name in names]
+        return models
 
     def get_instances(self, model):
         if issubclass(model, NoDeleteMixin):
-            return model.objects.existing()
+            instances = model.objects.existing()
         else:
-            return model.objects.all()
+            instances = model.objects.all()
+        if self.options.get('published') and issubclass(model, BasePublishableMixin):
+            instances = [instance for instance in instances if instance.any_published]
+        return instances
+
+    def is_up_to_date(self, instance):
+        return is_file_newer(instance.get_map_image_path(), instance.date_update)
+
+    def handle_instance(self, instance):
+        return instance.prepare_map_image(self.options.get('url', self.DEFAULT_URL))
+
+    def handle(self, *args, **options):
+        self.options = options
+        queue = Queue()
+        skipped = 0
+        for model in self.get_models():
+            self.stdout.write(self.start_model_msg % model._meta.object_name + '\n')
+            for instance in self.get_instances(model):
+                if not options.get('force') and self.is_up_to_date(instance):
+                    skipped += 1
+                else:
+                    queue.put(instance)
+        total = queue.qsize()
+
+        self.prepared = self.failed = 0
+        self.lock = threading.Lock()
+        start = time.time()
+        workers = [threading.Thread(target=self.work, args=(queue,))
+                   for i in range(max(1, options.get('workers') or 1))]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        duration = time.time() - start
+
+        rate = self.prepared / duration if duration > 0 else 0
+        self.stdout.write('%s image(s) prepared, %s up-to-date, %s failed out of %s in %.3f s (%.2f images/s)\n'
+                          % (self.prepared, skipped, self.failed, total + skipped, duration, rate))
+
+    def work(self, queue):
+        try:
+            while True:
+                try:
+                    instance = queue.get_nowait()
+                except Empty:
+                    break
+                try:
+                    self.handle_instance(instance)
+                except Exception as e:
+                    logger.exception(e)
+                    self.stderr.write(u'%s %s failed: %s\n' % (instance._meta.module_name, instance.pk, e))
+                    with self.lock:
+                        self.failed += 1
+                else:
+                    with self.lock:
+                        self.prepared += 1
+        finally:
+            # Each thread has its own database connection
+            connection.close()
@@ -0,0 +1,100 @@
+import time
+import threading
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from mapentity.management.commands.prepare_map_images import Command as MapentityCommand
+from geotrek.common.mixins import PublishableMixin
+from geotrek.common.models import Job
+
+
+class Command(BaseCommand):
+    help = 'Render public outputs (map images, elevation charts, documents and PDFs)\n'
+    help += 'of published objects, using a pool of workers consuming the jobs queue.\n'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--workers',
+                    type='int',
+                    default=2,
+                    help='Number of concurrent workers.'),
+        make_option('--url',
+                    default=MapentityCommand.DEFAULT_URL,
+                    help='Root URL of Geotrek, used to render outputs.'),
+        make_option('--all',
+                    action='store_true',
+                    default=False,
+                    help='Enqueue jobs of all published objects first.'),
+        make_option('--loop',
+                    type='int',
+                    default=0,
+                    help='Keep polling queue every given seconds, instead of exiting when empty.'),
+        make_option('--status',
+                    action='store_true',
+                    default=False,
+                    help='Show queue depth and jobs durations, and exit.'),
+    )
+
+    def handle(self, *args, **options):
+        if options['status']:
+            self.show_status()
+            return
+        self.options = options
+        if options['all']:
+            self.stdout.write('%s job(s) enqueued\n' % self.enqueue_all())
+
+        while True:
+            start = time.time()
+            self.done = self.failed = 0
+            self.lock = threading.Lock()
+            workers = [threading.Thread(target=self.work) for i in range(options['workers'])]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+            if self.done or self.failed:
+                duration = time.time() - start
+                self.stdout.write('%s job(s) done, %s failed in %.3f s\n' % (self.done, self.failed, duration))
+            if not options['loop']:
+                break
+            time.sleep(options['loop'])
+
+    def enqueue_all(self):
+        from django.db.models import get_models
+
+        count = 0
+        for model in get_models():
+            if not issubclass(model, PublishableMixin):
+                continue
+            for obj in model.objects.existing():
+                if obj.any_published:
+                    count += Job.objects.enqueue(obj)
+        return count
+
+    def work(self):
+        try:
+            while True:
+                job = Job.objects.claim()
+                if job is None:
+                    break
+                try:
+                    job.run(self.options['url'])
+                except Exception as e:
+                    job.finish(error=e)
+                    with self.lock:
+                        self.failed += 1
+                    self.stderr.write(u'%s failed: %s\n' % (job, e))
+                else:
+                    job.finish()
+                    with self.lock:
+                        self.done += 1
+        finally:
+            # Each thread has its own database connection
+            connection.close()
+
+    def show_status(self):
+        self.stdout.write('%16s %10s %8s %10s\n' % ('kind', 'status', 'count', 'avg (s)'))
+        for kind, status, count, duration in Job.objects.statistics():
+            duration = '%10.3f' % duration if duration is not None else '%10s' % '-'
+            self.stdout.write('%16s %10s %8d %s\n' % (kind, status, count, duration))
@@ -0,0 +1,16 @@
+from geotrek.common.helpers import MapImageHelper
+
+
+class MapImageInvalidationMiddleware(object):
+    """
+    Defers map images invalidations until the end of the request, in order to
+    resolve and drop outdated images once, whatever the number of saved objects.
+    Invalidations of transactions rolled back within ``MapImageHelper.atomic()``
+    are dropped.
+    """
+    def process_request(self, request):
+        MapImageHelper.begin()
+
+    def process_response(self, request, response):
+        MapImageHelper.end()
+        return response
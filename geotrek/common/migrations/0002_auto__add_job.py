@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+
+from south.db import db
+from south.v2 import SchemaMigration
+
+
+class Migration(SchemaMigration):
+
+    def forwards(self, orm):
+        # Adding model 'Job'
+        db.create_table('fl_t_tache', (
+            (u'id', self.gf('django.db.models.fields.AutoField')(primary_key=True)),
+            ('content_type', self.gf('django.db.models.fields.related.ForeignKey')(to=orm['contenttypes.ContentType'], db_column='type_contenu')),
+            ('object_id', self.gf('django.db.models.fields.PositiveIntegerField')(db_column='objet')),
+            ('kind', self.gf('django.db.models.fields.CharField')(max_length=32, db_column='nature')),
+            ('language', self.gf('django.db.models.fields.CharField')(max_length=10, db_column='langue', blank=True)),
+            ('status', self.gf('django.db.models.fields.CharField')(default='pending', max_length=16, db_column='statut', db_index=True)),
+            ('date_insert', self.gf('django.db.models.fields.DateTimeField')(auto_now_add=True, db_column='date_insert', blank=True)),
+            ('date_start', self.gf('django.db.models.fields.DateTimeField')(null=True, db_column='date_debut')),
+            ('date_end', self.gf('django.db.models.fields.DateTimeField')(null=True, db_column='date_fin')),
+            ('error', self.gf('django.db.models.fields.TextField')(db_column='erreur', blank=True)),
+        ))
+        db.send_create_signal(u'common', ['Job'])
+
+    def backwards(self, orm):
+        # Deleting model 'Job'
+        db.delete_table('fl_t_tache')
+
+    models = {
+        u'authent.structure': {
+            'Meta': {'ordering': "['name']", 'object_name': 'Structure'},
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '256'})
+        },
+        u'common.filetype': {
+            'Meta': {'ordering': "['type']", 'object_name': 'FileType', 'db_table': "'fl_b_fichier'"},
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'structure': ('django.db.models.fields.related.ForeignKey', [], {'to': u"orm['authent.Structure']", 'db_column': "'structure'"}),
+            'type': ('django.db.models.fields.CharField', [], {'max_length': '128'})
+        },
+        u'common.job': {
+            'Meta': {'ordering': "['-id']", 'object_name': 'Job', 'db_table': "'fl_t_tache'"},
+            'content_type': ('django.db.models.fields.related.ForeignKey', [], {'to': u"orm['contenttypes.ContentType']", 'db_column': "'type_contenu'"}),
+            'date_end': ('django.db.models.fields.DateTimeField', [], {'null': 'True', 'db_column': "'date_fin'"}),
+            'date_insert': ('django.db.models.fields.DateTimeField', [], {'auto_now_add': 'True', 'db_column': "'date_insert'", 'blank': 'True'}),
+            'date_start': ('django.db.models.fields.DateTimeField', [], {'null': 'True', 'db_column': "'date_debut'"}),
+            'error': ('django.db.models.fields.TextField', [], {'db_column': "'erreur'", 'blank': 'True'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'kind': ('django.db.models.fields.CharField', [], {'max_length': '32', 'db_column': "'nature'"}),
+            'language': ('django.db.models.fields.CharField', [], {'max_length': '10', 'db_column': "'langue'", 'blank': 'True'}),
+            'object_id': ('django.db.models.fields.PositiveIntegerField', [], {'db_column': "'objet'"}),
+            'status': ('django.db.models.fields.CharField', [], {'default': "'pending'", 'max_length': '16', 'db_column': "'statut'", 'db_index': 'True'})
+        },
+        u'common.organism': {
+            'Meta': {'ordering': "['organism']", 'object_name': 'Organism', 'db_table': "'m_b_organisme'"},
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'organism': ('django.db.models.fields.CharField', [], {'max_length': '128', 'db_column': "'organisme'"}),
+            'structure': ('django.db.models.fields.related.ForeignKey', [], {'to': u"orm['authent.Structure']", 'db_column': "'structure'"})
+        },
+        u'common.theme': {
+            'Meta': {'ordering': "['label']", 'object_name': 'Theme', 'db_table': "'o_b_theme'"},
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'label': ('django.db.models.fields.CharField', [], {'max_length': '128', 'db_column': "'theme'"}),
+            'pictogram': ('django.db.models.fields.files.FileField', [], {'max_length': '512', 'null': 'True', 'db_column': "'picto'"})
+        },
+        u'contenttypes.contenttype': {
+            'Meta': {'ordering': "('name',)", 'unique_together': "(('app_label', 'model'),)", 'object_name': 'ContentType', 'db_table': "'django_content_type'"},
+            'app_label': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'model': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '100'})
+        }
+    }
+
+    complete_apps = ['common']
@@ -2,8 +2,11 @@ import os
 import logging
 import shutil
 import datetime
+import mimetypes
 
 from django.conf import settings
+from django.core.cache import cache
+from django.contrib.contenttypes.models import ContentType
 from django.db.models import Manager as DefaultManager
 from django.db import models
 from django.utils.translation import ugettext_lazy as _
@@ -93,6 +96,48 @@ class PicturesMixin(object):
     def pictures(self, values):
         self._pictures = values
 
+    @classmethod
+    def pictures_cache_key(cls, pk):
+        return 'pictures-%s-%s-%s' % (cls._meta.app_label, cls._meta.module_name, pk)
+
+    @classmethod
+    def prefetch_pictures(cls, objects):
+        """
+        Set ``pictures`` of all given objects (instances of ``cls``).
+        Only attachments of these objects are fetched, images are filtered in
+        SQL by file extension, and results are cached per object version.
+        """
+        from paperclip.models import Attachment
+
+        objects = list(objects)
+        keys = dict((obj.pk, cls.pictures_cache_key(obj.pk)) for obj in objects)
+        cached = cache.get_many(keys.values())
+        missing = []
+        for obj in objects:
+            version, pictures = cached.get(keys[obj.pk], (None, None))
+            if pictures is not None and version == getattr(obj, 'date_update', None):
+                obj.pictures = pictures
+            else:
+                missing.append(obj)
+        if not missing:
+            return objects
+
+        extensions = sorted(set(ext[1:] for ext, mimetype in mimetypes.types_map.items()
+                                if mimetype.startswith('image/')))
+        attachments = Attachment.objects.filter(content_type=ContentType.objects.get_for_model(cls),
+                                                object_id__in=[obj.pk for obj in missing],
+                                                attachment_file__iregex=r'\.(%s)$' % '|'.join(extensions))\
+                                        .exclude(title='mapimage')\
+                                        .order_by('-starred')
+        pictures = {}
+        for attachment in attachments:
+            pictures.setdefault(attachment.object_id, []).append(attachment)
+        for obj in missing:
+            obj.pictures = pictures.get(obj.pk, [])
+        cache.set_many(dict((keys[obj.pk], (getattr(obj, 'date_update', None), obj.pictures))
+                            for obj in missing))
+        return objects
+
     @property
     def serializable_pictures(self):
         serialized = []
@@ -275,12 +320,13 @@ class PublishableMixin(BasePublishableMixin):
                 attached = picture.attachment_file
                 break
         if attached is None:
-            super(PublishableMixin, self).prepare_map_image(rooturl)
+            return super(PublishableMixin, self).prepare_map_image(rooturl)
         else:
             # Copy it along other screenshots
             src = os.path.join(settings.MEDIA_ROOT, attached.name)
             dst = self.get_map_image_path()
             shutil.copyfile(src, dst)
+            return True
 
     def get_geom_aspect_ratio(self):
         """ Force object aspect ratio to fit height and width of
@@ -290,6 +336,14 @@ class PublishableMixin(BasePublishableMixin):
         s = settings.EXPORT_MAP_IMAGE_SIZE[modelname]
         return float(s[0]) / s[1]
 
+    def get_document_public_cache_path(self, language, extension):
+        """ Path of public document pre-rendered by jobs (see ``common.models.Job``)
+        """
+        basefolder = os.path.join(settings.MEDIA_ROOT, 'documents')
+        if not os.path.exists(basefolder):
+            os.mkdir(basefolder)
+        return os.path.join(basefolder, '%s-%s-%s.%s' % (self._meta.module_name, self.pk, language, extension))
+
     def get_attachment_print(self):
         """
         Look in attachment if there is document to be used as print version
@@ -1,14 +1,27 @@
 import os
+import logging
 from PIL import Image
 
+import requests
 from django.conf import settings
-from django.db import models
+from django.core.cache import cache
+from django.core.signing import Signer
+from django.core.urlresolvers import NoReverseMatch
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection, models
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
 from django.utils.translation import ugettext_lazy as _
 
-from paperclip.models import FileType as BaseFileType
+from mapentity.helpers import is_file_newer, convertit_download, smart_urljoin
+from paperclip.models import FileType as BaseFileType, Attachment
 
 from geotrek.authent.models import StructureRelated
-from geotrek.common.mixins import PictogramMixin
+from geotrek.common.mixins import PictogramMixin, PicturesMixin, PublishableMixin
+
+
+logger = logging.getLogger(__name__)
 
 
 class Organism(StructureRelated):
@@ -73,3 +86,195 @@ class Theme(PictogramMixin):
                 image = image.crop((0, 0, w / 2, h))
             image.save(output)
         return open(output)
+
+
+class JobManager(models.Manager):
+
+    def enqueue(self, obj, kinds=None, languages=None):
+        """ Adds rendering jobs of a published object, unless already pending.
+        Returns number of added jobs.
+        """
+        return self.enqueue_many([obj], kinds, languages)
+
+    def enqueue_many(self, objects, kinds=None, languages=None):
+        """ Same as ``enqueue()`` for several objects, in a few queries.
+        Languages default to those the object is published in.
+        """
+        if kinds is None:
+            kinds = [kind for kind, label in Job.KIND_CHOICES]
+        jobs = []
+        pending = {}
+        for obj in objects:
+            content_type = ContentType.objects.get_for_model(obj.__class__)
+            if content_type.pk not in pending:
+                pending[content_type.pk] = set(
+                    self.filter(content_type=content_type, status=Job.PENDING)
+                        .values_list('object_id', 'kind', 'language'))
+            for kind in kinds:
+                try:
+                    if kind == Job.ELEVATION_CHART:
+                        obj.get_elevation_chart_url()
+                    elif kind in Job.TRANSLATED_KINDS:
+                        obj.get_document_public_url()
+                except (AttributeError, NotImplementedError, NoReverseMatch):
+                    continue  # Output not available for this model
+                if kind not in Job.TRANSLATED_KINDS:
+                    kind_languages = ['']
+                elif languages is None:
+                    kind_languages = [status['lang'] for status in obj.published_status if status['status']]
+                else:
+                    kind_languages = languages
+                for language in kind_languages:
+                    if (obj.pk, kind, language) not in pending[content_type.pk]:
+                        pending[content_type.pk].add((obj.pk, kind, language))
+                        jobs.append(Job(content_type=content_type, object_id=obj.pk,
+                                        kind=kind, language=language))
+        self.bulk_create(jobs)
+        return len(jobs)
+
+    def claim(self):
+        """ Marks the oldest pending job as running, and returns it.
+        Returns ``None`` if queue is empty.
+        """
+        sql = """
+        UPDATE {table} SET statut = %s, date_debut = now()
+        WHERE id = (SELECT id FROM {table} WHERE statut = %s ORDER BY id LIMIT 1 FOR UPDATE)
+          AND statut = %s
+        RETURNING id;
+        """.format(table=Job._meta.db_table)
+        cursor = connection.cursor()
+        while True:
+            cursor.execute(sql, [Job.RUNNING, Job.PENDING, Job.PENDING])
+            row = cursor.fetchone()
+            if row is not None:
+                return self.get(pk=row[0])
+            # Concurrent worker may have claimed it meanwhile
+            if not self.filter(status=Job.PENDING).exists():
+                return None
+
+    def statistics(self):
+        """ Returns (kind, status, count, average duration in seconds) """
+        sql = """
+        SELECT nature, statut, count(*), avg(extract(epoch FROM date_fin - date_debut))
+        FROM {table} GROUP BY nature, statut ORDER BY nature, statut;
+        """.format(table=Job._meta.db_table)
+        cursor = connection.cursor()
+        cursor.execute(sql)
+        return cursor.fetchall()
+
+
+class Job(models.Model):
+    """
+    Rendering of public outputs of published objects (map image, elevation chart,
+    public document and its PDF), processed by ``run_jobs`` workers.
+    """
+    MAP_IMAGE = 'map_image'
+    ELEVATION_CHART = 'elevation_chart'
+    DOCUMENT = 'document'
+    PDF = 'pdf'
+    KIND_CHOICES = (
+        (MAP_IMAGE, _(u"Map image")),
+        (ELEVATION_CHART, _(u"Elevation chart")),
+        (DOCUMENT, _(u"Public document")),
+        (PDF, _(u"Public PDF")),
+    )
+    TRANSLATED_KINDS = (DOCUMENT, PDF)
+    EXTENSIONS = {DOCUMENT: 'odt', PDF: 'pdf'}
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (PENDING, _(u"Pending")),
+        (RUNNING, _(u"Running")),
+        (DONE, _(u"Done")),
+        (FAILED, _(u"Failed")),
+    )
+
+    content_type = models.ForeignKey(ContentType, db_column='type_contenu')
+    object_id = models.PositiveIntegerField(db_column='objet')
+    kind = models.CharField(max_length=32, choices=KIND_CHOICES, db_column='nature', verbose_name=_(u"Kind"))
+    language = models.CharField(max_length=10, blank=True, db_column='langue', verbose_name=_(u"Language"))
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=PENDING, db_index=True,
+                              db_column='statut', verbose_name=_(u"Status"))
+    date_insert = models.DateTimeField(auto_now_add=True, editable=False, db_column='date_insert',
+                                       verbose_name=_(u"Insertion date"))
+    date_start = models.DateTimeField(null=True, editable=False, db_column='date_debut',
+                                      verbose_name=_(u"Start date"))
+    date_end = models.DateTimeField(null=True, editable=False, db_column='date_fin',
+                                    verbose_name=_(u"End date"))
+    error = models.TextField(blank=True, db_column='erreur', verbose_name=_(u"Error"))
+
+    objects = JobManager()
+
+    class Meta:
+        db_table = 'fl_t_tache'
+        verbose_name = _(u"Job")
+        verbose_name_plural = _(u"Jobs")
+        ordering = ['-id']
+
+    def __unicode__(self):
+        return u"%s %s-%s %s" % (self.get_kind_display(), self.content_type.model, self.object_id, self.language)
+
+    @classmethod
+    def render_token(cls, obj, language):
+        """ Signed token allowing workers only to bypass outdated outputs (see ``PublicRenderingMixin``) """
+        return Signer(salt='geotrek.common.job').signature('%s.%s.%s' % (obj._meta.module_name, obj.pk, language))
+
+    @property
+    def duration(self):
+        if self.date_start is None or self.date_end is None:
+            return None
+        return (self.date_end - self.date_start).total_seconds()
+
+    def run(self, rooturl):
+        """ Renders output, unless up-to-date. Returns ``False`` if nothing was done.
+        """
+        obj = self.content_type.get_object_for_this_type(pk=self.object_id)
+        if self.kind == self.MAP_IMAGE:
+            return obj.prepare_map_image(rooturl)
+        if self.kind == self.ELEVATION_CHART:
+            return obj.prepare_elevation_chart(rooturl)
+
+        path = obj.get_document_public_cache_path(self.language, self.EXTENSIONS[self.kind])
+        if is_file_newer(path, obj.date_update):
+            return False
+        source = smart_urljoin(rooturl, obj.get_document_public_url()) + '?lang=%s&render=%s' % (
+            self.language, self.render_token(obj, self.language))
+        if self.kind == self.PDF:
+            convertit_download(source, path,
+                               from_type='application/vnd.oasis.opendocument.text',
+                               to_type='application/pdf')
+        else:
+            response = requests.get(source, headers={'Accept-Language': self.language})
+            response.raise_for_status()
+            tmp_path = '%s.%s.tmp' % (path, os.getpid())
+            with open(tmp_path, 'wb') as f:
+                f.write(response.content)
+            os.rename(tmp_path, path)
+        return True
+
+    def finish(self, error=None):
+        self.status = self.DONE if error is None else self.FAILED
+        self.error = u'' if error is None else unicode(error)
+        self.date_end = timezone.now()
+        self.save(update_fields=['status', 'error', 'date_end'])
+
+
+@receiver(post_save, sender=Attachment, dispatch_uid="attachment_pictures_invalidate")
+@receiver(post_delete, sender=Attachment, dispatch_uid="attachment_pictures_invalidate_d")
+def invalidate_pictures(sender, instance, **kwargs):
+    """ Drop pictures cached by ``PicturesMixin.prefetch_pictures()`` """
+    model = instance.content_type.model_class()
+    if model is not None and issubclass(model, PicturesMixin):
+        cache.delete(model.pictures_cache_key(instance.object_id))
+
+
+@receiver(post_save, dispatch_uid="publishable_jobs_enqueue")
+def enqueue_jobs(sender, instance, **kwargs):
+    """ Render public outputs of published objects in background """
+    if not settings.RENDERING_JOBS_ENABLED or not isinstance(instance, PublishableMixin):
+        return
+    if instance.any_published and not getattr(instance, 'deleted', False):
+        Job.objects.enqueue(instance)
@@ -20,6 +20,40 @@ class TranslatedModelSerializer(rest_serializers.ModelSerializer):
         return super(TranslatedModelSerializer, self).get_field(model_field)
 
 
+class PrefetchPlanSerializerMixin(object):
+    """ Declares how to fetch related objects of many objects at once.
+
+    ``select_related`` and ``prefetch_related`` are applied to API views querysets
+    using ``prefetch_queryset()``. ``batch_resolvers`` are called with the list of
+    serialized objects, to set spatial and topology relations with a few queries.
+    """
+    select_related = ()
+    prefetch_related = ()
+    batch_resolvers = ()
+
+    def __init__(self, instance=None, *args, **kwargs):
+        if kwargs.get('many') and instance is not None:
+            instance = self.prefetch_objects(instance)
+        super(PrefetchPlanSerializerMixin, self).__init__(instance, *args, **kwargs)
+
+    @classmethod
+    def prefetch_queryset(cls, queryset):
+        return queryset.select_related(*cls.select_related).prefetch_related(*cls.prefetch_related)
+
+    @classmethod
+    def prefetch_objects(cls, objects):
+        objects = list(objects)
+        for resolver in cls.batch_resolvers:
+            resolver(objects)
+        return objects
+
+
+def prefetch_pictures(objects):
+    """ Batch resolver of ``PicturesMixin`` pictures """
+    if objects:
+        objects[0].__class__.prefetch_pictures(objects)
+
+
 class PictogramSerializerMixin(rest_serializers.ModelSerializer):
     pictogram = rest_serializers.Field('get_pictogram_url')
 
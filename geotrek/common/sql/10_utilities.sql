@@ -45,3 +45,27 @@ BEGIN
 END;
 $$ LANGUAGE plpgsql;
 
+
+
+-------------------------------------------------------------------------------
+-- Triggers suspension
+-------------------------------------------------------------------------------
+-- Set-based operations (e.g. zoning edges computation) take care of derived
+-- values themselves, and suspend some per-row triggers meanwhile.
+-- Suspension only lasts until the end of the current transaction.
+
+CREATE OR REPLACE FUNCTION geotrek.ft_suspend_triggers(name varchar, suspended boolean) RETURNS void AS $$
+BEGIN
+    PERFORM set_config('geotrek.suspended_' || name, CASE WHEN suspended THEN 'on' ELSE 'off' END, true);
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION geotrek.ft_triggers_suspended(name varchar) RETURNS boolean AS $$
+BEGIN
+    RETURN current_setting('geotrek.suspended_' || name) = 'on';
+EXCEPTION
+    WHEN undefined_object THEN
+        -- Never set during this session
+        RETURN FALSE;
+END;
+$$ LANGUAGE plpgsql;
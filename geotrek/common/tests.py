@@ -1,8 +1,10 @@
 import os
+from StringIO import StringIO
 
 import mock
 
 from django.db import connection
+from django.core.management import call_command
 from django.test import TestCase
 from django.core.urlresolvers import reverse
 from django.core.exceptions import ImproperlyConfigured
@@ -146,3 +148,73 @@ class DefaultPictureTest(TestCase):
         self.assertEqual(len(self.trek.attachments), 4)
         self.assertEqual(len(self.trek.pictures), 3)
         self.assertTrue(starred.attachment_file.name in self.trek.thumbnail.name)
+
+    def test_pictures_are_prefetched_for_listed_objects_only(self):
+        from geotrek.trekking.factories import TrekFactory
+        from geotrek.trekking.models import Trek
+        other = TrekFactory.create()
+        self.add_attachment(attachment=get_dummy_uploaded_image())
+        treks = Trek.prefetch_pictures(Trek.objects.filter(pk__in=[self.trek.pk, other.pk]).order_by('pk'))
+        self.assertEqual([len(t.pictures) for t in treks], [1, 0])
+        # Attachments are not queried anymore
+        with self.assertNumQueries(0):
+            self.assertEqual(len(treks[0].pictures), 1)
+
+
+class JobQueueTest(TestCase):
+    def setUp(self):
+        from geotrek.trekking.factories import TrekFactory
+        with self.settings(RENDERING_JOBS_ENABLED=True):
+            self.trek = TrekFactory.create()
+
+    def test_jobs_are_enqueued_on_publication(self):
+        from .models import Job
+        kinds = set(Job.objects.values_list('kind', flat=True))
+        self.assertEqual(kinds, set([Job.MAP_IMAGE, Job.ELEVATION_CHART, Job.DOCUMENT, Job.PDF]))
+
+    def test_pending_jobs_are_not_enqueued_twice(self):
+        from .models import Job
+        count = Job.objects.count()
+        self.assertEqual(Job.objects.enqueue(self.trek), 0)
+        self.assertEqual(Job.objects.count(), count)
+
+    def test_jobs_are_claimed_once(self):
+        from .models import Job
+        count = Job.objects.count()
+        claimed = set()
+        job = Job.objects.claim()
+        while job is not None:
+            self.assertEqual(job.status, Job.RUNNING)
+            claimed.add(job.pk)
+            job.finish()
+            job = Job.objects.claim()
+        self.assertEqual(len(claimed), count)
+        self.assertFalse(Job.objects.filter(status=Job.PENDING).exists())
+        statistics = Job.objects.statistics()
+        self.assertEqual(sum([row[2] for row in statistics]), count)
+        self.assertEqual(set([row[1] for row in statistics]), set([Job.DONE]))
+
+
+class PrepareMapImagesTest(TestCase):
+    def setUp(self):
+        from geotrek.trekking.factories import TrekFactory
+        self.published = TrekFactory.create(published=True)
+        self.unpublished = TrekFactory.create(published=False)
+
+    @mock.patch('geotrek.common.mixins.PublishableMixin.prepare_map_image')
+    def test_only_published_objects_of_given_models_are_captured(self, mocked):
+        output = StringIO()
+        call_command('prepare_map_images', models='trek', published=True, workers=2, stdout=output)
+        self.assertEqual(mocked.call_count, 1)
+        self.assertIn('1 image(s) prepared, 0 up-to-date, 0 failed out of 1', output.getvalue())
+
+    @mock.patch('geotrek.common.mixins.PublishableMixin.prepare_map_image')
+    def test_failures_and_up_to_date_images_are_reported(self, mocked):
+        mocked.side_effect = Exception('Capture failed')
+        with open(self.published.get_map_image_path(), 'w') as f:
+            f.write('***')
+        output = StringIO()
+        call_command('prepare_map_images', models='trek', stdout=output, stderr=StringIO())
+        self.assertEqual(mocked.call_count, 1)
+        self.assertIn('0 image(s) prepared, 1 up-to-date, 1 failed out of 2', output.getvalue())
+        os.remove(self.published.get_map_image_path())
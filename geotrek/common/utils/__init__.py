@@ -126,3 +126,81 @@ def intersecting(cls, obj, distance=None):
         # Prevent self intersection
         qs = qs.exclude(pk=obj.pk)
     return qs
+
+
+def intersecting_in_bulk(cls, objects, distance=None):
+    """ Same as ``intersecting()`` for several objects at once, with one query.
+    Returns lists of ``cls`` instances by object pk.
+    """
+    objects = [obj for obj in objects if obj.geom is not None]
+    if not objects:
+        return {}
+    qn = connection.ops.quote_name
+    geom_model = objects[0]._meta.get_field('geom').model
+    other_model = cls._meta.get_field('geom').model
+    if distance:
+        predicate = 'ST_DWithin(o.geom, c.geom, %s)'
+        params = [distance]
+    else:
+        predicate = 'ST_Intersects(o.geom, c.geom)'
+        params = []
+    sql = """
+    SELECT o.{pk}, c.{other_pk}
+    FROM {table} o, {other_table} c
+    WHERE o.{pk} IN %s AND {predicate}
+    """.format(pk=qn(geom_model._meta.pk.column), table=qn(geom_model._meta.db_table),
+               other_pk=qn(other_model._meta.pk.column), other_table=qn(other_model._meta.db_table),
+               predicate=predicate)
+    cursor = connection.cursor()
+    cursor.execute(sql, [tuple(obj.pk for obj in objects)] + params)
+    pairs = [(pk, other_pk) for pk, other_pk in cursor.fetchall()
+             if not (objects[0].__class__ == cls and pk == other_pk)]
+    return instances_by_owner(cls.objects.all(), pairs)
+
+
+def instances_by_owner(queryset, pairs):
+    """ Returns lists of ``queryset`` instances by owner pk, given ``(owner pk, instance pk)``
+    pairs, with one query. Default ordering of ``queryset`` is kept in lists.
+    """
+    instances = queryset.filter(pk__in=set(pk for owner, pk in pairs))
+    owners = {}
+    for owner, pk in pairs:
+        owners.setdefault(pk, []).append(owner)
+    result = {}
+    for instance in instances:
+        for owner in owners[instance.pk]:
+            result.setdefault(owner, []).append(instance)
+    return result
+
+
+def bulk_insert(model, objects):
+    """ Inserts objects with one query per table, including parent tables of
+    multi-table inheritance, which ``bulk_create()`` does not support.
+    Primary keys are set on objects. ``save()`` is not called, and no signal is sent.
+    """
+    from django.db.models import AutoField
+    from django.db.models.sql import InsertQuery
+
+    objects = list(objects)
+    if not objects:
+        return objects
+    chain = [model]
+    while chain[0]._meta.parents:
+        chain.insert(0, chain[0]._meta.parents.keys()[0])
+
+    cursor = connection.cursor()
+    for concrete in chain:
+        opts = concrete._meta
+        fields = [f for f in opts.local_fields if not isinstance(f, AutoField)]
+        query = InsertQuery(concrete)
+        query.insert_values(fields, objects)
+        sql, params = query.get_compiler(connection=connection).as_sql()[0]
+        if opts.pk in fields:
+            # Primary key is the link to parent, already known
+            cursor.execute(sql, params)
+            continue
+        cursor.execute(sql + ' RETURNING %s' % connection.ops.quote_name(opts.pk.column), params)
+        for obj, (pk,) in zip(objects, cursor.fetchall()):
+            for link in chain:
+                setattr(obj, link._meta.pk.attname, pk)
+    return objects
@@ -1,3 +1,5 @@
+import os
+
 from django.core.exceptions import ValidationError
 from django.utils.decorators import method_decorator
 from django.conf import settings
@@ -6,14 +8,38 @@ from django.contrib.auth.decorators import login_required, user_passes_test
 from django.db.utils import DatabaseError
 from django.core.exceptions import ObjectDoesNotExist
 from django.http import HttpResponse
+from django.utils import translation
+from django.utils.crypto import constant_time_compare
+from django.utils.translation import ugettext as _
 
-from mapentity.helpers import api_bbox
+from mapentity.helpers import api_bbox, is_file_newer
 from mapentity import views as mapentity_views
 
+from geotrek.common.helpers import MapImageHelper
+from geotrek.common.models import Job
 from geotrek.common.utils import sql_extent
 from geotrek import __version__
 
 
+class FlattenPicturesMixin(object):
+    def get_template_names(self):
+        """ Due to bug in Django, providing get_queryset() method hides
+        template_names lookup.
+        https://code.djangoproject.com/ticket/17484
+        """
+        opts = self.get_model()._meta
+        extra = ["%s/%s%s.html" % (opts.app_label, opts.object_name.lower(), self.template_name_suffix)]
+        return extra + super(FlattenPicturesMixin, self).get_template_names()
+
+    def get_queryset(self):
+        """ Override queryset to avoid attachment lookup while serializing.
+        It will fetch pictures of listed objects only, and force ``pictures``
+        attribute of instances.
+        """
+        queryset = super(FlattenPicturesMixin, self).get_queryset()
+        return self.get_model().prefetch_pictures(queryset)
+
+
 class FormsetMixin(object):
     context_name = None
     formset_class = None
@@ -23,9 +49,11 @@ class FormsetMixin(object):
         formset_form = context[self.context_name]
 
         if formset_form.is_valid():
-            response = super(FormsetMixin, self).form_valid(form)
-            formset_form.instance = self.object
-            formset_form.save()
+            # Object and formset are saved at once, map images invalidated once committed
+            with MapImageHelper.atomic():
+                response = super(FormsetMixin, self).form_valid(form)
+                formset_form.instance = self.object
+                formset_form.save()
         else:
             response = self.form_invalid(form)
         return response
@@ -42,14 +70,68 @@ class FormsetMixin(object):
         return context
 
 
-class DocumentPublicPDF(mapentity_views.DocumentConvert):
+class PublicRenderingMixin(object):
+    """ Serves public outputs pre-rendered by jobs (see ``run_jobs`` command),
+    if up-to-date, and enqueues their rendering otherwise.
+    Meanwhile, if rendering jobs are enabled, outdated outputs are served
+    (or 202 if never rendered) instead of rendering them within the request.
+    Jobs request ``?render=<token>`` to obtain a fresh rendering, the token is
+    signed (see ``Job.render_token()``) and ignored for anyone else.
+    """
+    job_kind = None
+    render_parameter = 'render'
+
+    def dispatch(self, *args, **kwargs):
+        lang = self.request.GET.get('lang')
+        if lang:
+            translation.activate(lang)
+            self.request.LANGUAGE_CODE = lang
+        return super(PublicRenderingMixin, self).dispatch(*args, **kwargs)
+
+    def file_response(self, path):
+        response = HttpResponse(mimetype=self.rendered_mimetype)
+        with open(path, 'rb') as f:
+            response.write(f.read())
+        return response
+
+    def rendered_response(self, obj):
+        """ Returns the response to serve instead of rendering, if any """
+        language = translation.get_language()
+        token = self.request.GET.get(self.render_parameter)
+        if token and constant_time_compare(token, Job.render_token(obj, language)):
+            return None
+        path = obj.get_document_public_cache_path(language, Job.EXTENSIONS[self.job_kind])
+        if is_file_newer(path, obj.date_update):
+            return self.file_response(path)
+        if settings.RENDERING_JOBS_ENABLED and obj.any_published:
+            Job.objects.enqueue(obj, kinds=[self.job_kind], languages=[language])
+            if os.path.exists(path):
+                return self.file_response(path)
+            response = HttpResponse(_(u"Document is being prepared, please retry later."),
+                                    status=202, content_type='text/plain')
+            response['Retry-After'] = 60
+            return response
+        return None
+
+
+class DocumentPublicPDF(PublicRenderingMixin, mapentity_views.DocumentConvert):
+    job_kind = Job.PDF
+    rendered_mimetype = 'application/pdf'
 
     def source_url(self):
         return self.get_object().get_document_public_url()
 
+    def render_to_response(self, context, **response_kwargs):
+        response = self.rendered_response(self.get_object())
+        if response is not None:
+            return response
+        return super(DocumentPublicPDF, self).render_to_response(context, **response_kwargs)
+
 
-class DocumentPublic(mapentity_views.MapEntityDocument):
+class DocumentPublic(PublicRenderingMixin, mapentity_views.MapEntityDocument):
     template_name_suffix = "_public"
+    job_kind = Job.DOCUMENT
+    rendered_mimetype = 'application/vnd.oasis.opendocument.text'
 
     def get_context_data(self, **kwargs):
         context = super(DocumentPublic, self).get_context_data(**kwargs)
@@ -70,8 +152,16 @@ class DocumentPublic(mapentity_views.MapEntityDocument):
             return response
         except ObjectDoesNotExist:
             pass
+        response = self.rendered_response(obj)
+        if response is not None:
+            return response
+        self.prepare_rendering(obj)
         return super(DocumentPublic, self).render_to_response(context, **response_kwargs)
 
+    def prepare_rendering(self, obj):
+        """ Prepares files required by the document (e.g. charts), only when rendered """
+        pass
+
 
 #
 # Concrete views
@@ -199,7 +199,17 @@ class Topology(AltimetryMixin, TimeStampedModelMixin, NoDeleteMixin):
     def add_property(cls, name, func):
         if hasattr(cls, name):
             raise AttributeError("%s has already an attribute %s" % (cls, name))
-        setattr(cls, name, property(func))
+
+        def getter(self):
+            # Value computed for several topologies at once, see ``prefetch_property()``
+            prefetched = self.__dict__.get('_prefetched_properties', {})
+            if name in prefetched:
+                return prefetched[name]
+            return func(self)
+        setattr(cls, name, property(getter))
+
+    def prefetch_property(self, name, value):
+        self.__dict__.setdefault('_prefetched_properties', {})[name] = value
 
     @classproperty
     def KIND(cls):
@@ -42,6 +42,11 @@ DROP TRIGGER IF EXISTS e_t_evenement_latest_updated_d_tgr ON e_t_evenement;
 CREATE OR REPLACE FUNCTION geotrek.evenement_latest_updated_d() RETURNS trigger AS $$
 DECLARE
 BEGIN
+    -- Touched once by caller
+    IF ft_triggers_suspended('topologies') THEN
+        RETURN NULL;
+    END IF;
+
     -- Touch latest path
     UPDATE e_t_evenement SET date_update = NOW()
     WHERE id IN (SELECT id FROM e_t_evenement ORDER BY date_update DESC LIMIT 1);
@@ -187,7 +192,7 @@ CREATE OR REPLACE FUNCTION geotrek.evenement_elevation_iu() RETURNS trigger AS $
 DECLARE
     elevation elevation_infos;
 BEGIN
-    IF {{TREKKING_TOPOLOGY_ENABLED}} THEN
+    IF {{TREKKING_TOPOLOGY_ENABLED}} OR ft_triggers_suspended('topologies') THEN
         RETURN NEW;
     END IF;
     SELECT * FROM ft_elevation_infos(NEW.geom) INTO elevation;
@@ -50,6 +50,11 @@ DECLARE
     eid integer;
     eids integer[];
 BEGIN
+    -- Geometries are computed by caller (e.g. zoning edges)
+    IF ft_triggers_suspended('topologies') THEN
+        RETURN NULL;
+    END IF;
+
     IF TG_OP = 'INSERT' THEN
         eids := array_append(eids, NEW.evenement);
     ELSE
@@ -85,6 +90,10 @@ DECLARE
     junction geometry;
     t_count integer;
 BEGIN
+    IF ft_triggers_suspended('topologies') THEN
+        RETURN NULL;
+    END IF;
+
     -- Deal with previously connected paths in the case of an UDPATE action
     IF TG_OP = 'UPDATE' THEN
         -- There were connected paths only if it was a junction point
@@ -70,7 +70,7 @@ class PhysicalEdge(MapEntityMixin, Topology):
 Path.add_property('physical_edges', PhysicalEdge.path_physicals)
 Topology.add_property('physical_edges', PhysicalEdge.topology_physicals)
 Intervention.add_property('physical_edges', lambda self: self.topology.physical_edges if self.topology else [])
-Project.add_property('physical_edges', lambda self: self.edges_by_attr('physical_edges'))
+Project.add_property('physical_edges', lambda self: self.overlapping_edges(PhysicalEdge))
 
 
 class LandType(StructureRelated):
@@ -134,7 +134,7 @@ class LandEdge(MapEntityMixin, Topology):
 Path.add_property('land_edges', LandEdge.path_lands)
 Topology.add_property('land_edges', LandEdge.topology_lands)
 Intervention.add_property('land_edges', lambda self: self.topology.land_edges if self.topology else [])
-Project.add_property('land_edges', lambda self: self.edges_by_attr('land_edges'))
+Project.add_property('land_edges', lambda self: self.overlapping_edges(LandEdge))
 
 
 class CompetenceEdge(MapEntityMixin, Topology):
@@ -184,7 +184,7 @@ class CompetenceEdge(MapEntityMixin, Topology):
 Path.add_property('competence_edges', CompetenceEdge.path_competences)
 Topology.add_property('competence_edges', CompetenceEdge.topology_competences)
 Intervention.add_property('competence_edges', lambda self: self.topology.competence_edges if self.topology else [])
-Project.add_property('competence_edges', lambda self: self.edges_by_attr('competence_edges'))
+Project.add_property('competence_edges', lambda self: self.overlapping_edges(CompetenceEdge))
 
 
 class WorkManagementEdge(MapEntityMixin, Topology):
@@ -234,7 +234,7 @@ class WorkManagementEdge(MapEntityMixin, Topology):
 Path.add_property('work_edges', WorkManagementEdge.path_works)
 Topology.add_property('work_edges', WorkManagementEdge.topology_works)
 Intervention.add_property('work_edges', lambda self: self.topology.work_edges if self.topology else [])
-Project.add_property('work_edges', lambda self: self.edges_by_attr('work_edges'))
+Project.add_property('work_edges', lambda self: self.overlapping_edges(WorkManagementEdge))
 
 
 class SignageManagementEdge(MapEntityMixin, Topology):
@@ -284,4 +284,4 @@ class SignageManagementEdge(MapEntityMixin, Topology):
 Path.add_property('signage_edges', SignageManagementEdge.path_signages)
 Topology.add_property('signage_edges', SignageManagementEdge.topology_signages)
 Intervention.add_property('signage_edges', lambda self: self.topology.signage_edges if self.topology else [])
-Project.add_property('signage_edges', lambda self: self.edges_by_attr('signage_edges'))
+Project.add_property('signage_edges', lambda self: self.overlapping_edges(SignageManagementEdge))
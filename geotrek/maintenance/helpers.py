@@ -0,0 +1,117 @@
+from collections import OrderedDict
+
+from django.db import connection
+
+from geotrek.authent.models import Structure
+from geotrek.core.models import Stake
+
+from .models import InterventionType, InterventionStatus, Project
+
+
+class CostRollupHelper(object):
+    """ Reads interventions costs from rollups maintained by triggers
+    (see ``sql/30_cumuls.sql``), summed along the requested dimensions.
+    Reading never scans interventions, whatever their number.
+    """
+    # Dimension name: (rollup column, model of values)
+    DIMENSIONS = OrderedDict([
+        ('year', ('annee', None)),
+        ('structure', ('structure', Structure)),
+        ('stake', ('enjeu', Stake)),
+        ('type', ('type', InterventionType)),
+        ('status', ('status', InterventionStatus)),
+        ('project', ('chantier', Project)),
+    ])
+    MEASURES = OrderedDict([
+        ('interventions', 'nombre'),
+        ('mandays', 'jours'),
+        ('mandays_cost', 'cout_jours'),
+        ('material_cost', 'cout_materiel'),
+        ('heliport_cost', 'cout_heliport'),
+        ('subcontract_cost', 'cout_soustraitant'),
+    ])
+    COSTS = ['mandays_cost', 'material_cost', 'heliport_cost', 'subcontract_cost']
+
+    def __init__(self, group_by=None, filters=None, year_min=None, year_max=None):
+        """
+        :param group_by: list of dimension names
+        :param filters: dimension names with lists of allowed values
+        """
+        self.group_by = list(group_by or [])
+        self.filters = dict(filters or {})
+        self.year_min = year_min
+        self.year_max = year_max
+        unknown = set(self.group_by + self.filters.keys()) - set(self.DIMENSIONS)
+        if unknown:
+            raise ValueError('Unknown dimension(s): %s' % ', '.join(sorted(unknown)))
+
+    @classmethod
+    def from_query(cls, params):
+        """ Builds from request parameters, like
+        ``?group_by=year,stake&year_min=2005&structure=1&structure=2``
+        """
+        def integer(value):
+            try:
+                return int(value)
+            except (ValueError, TypeError):
+                raise ValueError('Invalid value: %s' % value)
+
+        group_by = [name.strip() for name in params.get('group_by', '').split(',') if name.strip()]
+        filters = {}
+        for name in cls.DIMENSIONS:
+            values = [value for value in params.getlist(name) if value != '']
+            if values:
+                filters[name] = [integer(value) for value in values]
+        year_min = integer(params['year_min']) if params.get('year_min') else None
+        year_max = integer(params['year_max']) if params.get('year_max') else None
+        return cls(group_by, filters, year_min, year_max)
+
+    def sql(self):
+        columns = [self.DIMENSIONS[name][0] for name in self.group_by]
+        conditions = []
+        params = []
+        for name, values in self.filters.items():
+            conditions.append('%s = ANY(%%s)' % self.DIMENSIONS[name][0])
+            params.append(values)
+        if self.year_min is not None:
+            conditions.append('annee >= %s')
+            params.append(self.year_min)
+        if self.year_max is not None:
+            conditions.append('annee <= %s')
+            params.append(self.year_max)
+
+        sql = 'SELECT %s FROM m_t_intervention_cumul' % ', '.join(
+            columns + ['SUM(%s)' % column for column in self.MEASURES.values()])
+        if conditions:
+            sql += ' WHERE %s' % ' AND '.join(conditions)
+        if columns:
+            sql += ' GROUP BY {columns} ORDER BY {columns}'.format(columns=', '.join(columns))
+        return sql, params
+
+    def rows(self):
+        sql, params = self.sql()
+        cursor = connection.cursor()
+        cursor.execute(sql, params)
+        rows = []
+        for values in cursor.fetchall():
+            row = OrderedDict(zip(self.group_by, values[:len(self.group_by)]))
+            for name, value in zip(self.MEASURES, values[len(self.group_by):]):
+                row[name] = float(value or 0)
+            row['interventions'] = int(row['interventions'])
+            row['total_cost'] = sum(row[name] for name in self.COSTS)
+            rows.append(row)
+        # Groups without any intervention left
+        if self.group_by:
+            rows = [result for result in rows if result['interventions'] > 0]
+        return rows
+
+    def labels(self, rows):
+        """ Labels of dimensions values found in ``rows``, one query per dimension """
+        labels = {}
+        for name in self.group_by:
+            model = self.DIMENSIONS[name][1]
+            if model is None:
+                continue
+            pks = set(row[name] for row in rows if row[name] is not None)
+            labels[name] = dict((pk, unicode(obj)) for pk, obj in model.objects.in_bulk(pks).items())
+        return labels
@@ -1,30 +1,73 @@
 # -*- coding: utf-8 -*-
-import os
+import time
 from datetime import datetime
 
 from django.conf import settings
 from django.utils.translation import ugettext_lazy as _
+from django.core.cache import cache
+from django.db import connection
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 from django.contrib.gis.db import models
-from django.contrib.gis.geos import GeometryCollection
+from django.contrib.gis.geos import GeometryCollection, GEOSGeometry
 
 from mapentity.models import MapEntityMixin
 
 from geotrek.authent.models import StructureRelated
 from geotrek.altimetry.models import AltimetryMixin
-from geotrek.core.models import Topology, Path, Trail
+from geotrek.core.models import Topology, Path, PathAggregation, Trail
 from geotrek.common.models import Organism
+from geotrek.common.helpers import MapImageHelper
 from geotrek.common.mixins import TimeStampedModelMixin, NoDeleteMixin
-from geotrek.common.utils import classproperty
+from geotrek.common.utils import classproperty, instances_by_owner
 from geotrek.infrastructure.models import Infrastructure, Signage
 
 
-class InterventionManager(models.GeoManager):
+class YearsManagerMixin(object):
+    """ Lists the distinct years of existing objects with ``years_sql``,
+    cached per version of the model, bumped when objects are saved or deleted
+    (see ``bump_years_version``).
+    """
+    years_sql = None
+
+    def years_version_key(self):
+        return 'years-version-%s' % self.model._meta.module_name
+
+    def years_version(self):
+        key = self.years_version_key()
+        version = cache.get(key)
+        if version is None:
+            # Never reuse the versions of an evicted counter
+            version = int(time.time() * 1000)
+            cache.set(key, version)
+        return version
+
+    def bump_years_version(self):
+        try:
+            cache.incr(self.years_version_key())
+        except ValueError:
+            cache.set(self.years_version_key(), int(time.time() * 1000))
+
     def all_years(self):
-        all_dates = self.existing().values_list('date', flat=True)
-        all_years = list(reversed(sorted(set([d.year for d in all_dates]))))
+        key = 'years-%s-%s' % (self.model._meta.module_name, self.years_version())
+        all_years = cache.get(key)
+        if all_years is None:
+            cursor = connection.cursor()
+            cursor.execute(self.years_sql)
+            all_years = [int(year) for (year,) in cursor.fetchall()]
+            cache.set(key, all_years)
         return all_years
 
 
+class InterventionManager(YearsManagerMixin, models.GeoManager):
+    years_sql = """
+    SELECT DISTINCT extract(year FROM date)::integer AS annee
+    FROM m_t_intervention
+    WHERE NOT supprime
+    ORDER BY annee DESC
+    """
+
+
 class Intervention(MapEntityMixin, AltimetryMixin, TimeStampedModelMixin, StructureRelated, NoDeleteMixin):
 
     name = models.CharField(verbose_name=_(u"Name"), max_length=128, db_column='nom',
@@ -117,11 +160,8 @@ class Intervention(MapEntityMixin, AltimetryMixin, TimeStampedModelMixin, Struct
             self.topology.save(update_fields=['kind'])
 
         # Invalidate project map
-        if self.project:
-            try:
-                os.remove(self.project.get_map_image_path())
-            except OSError:
-                pass
+        if self.project_id:
+            MapImageHelper.invalidate(Project, self.project_id)
 
         self.reload()
 
@@ -201,8 +241,32 @@ class Intervention(MapEntityMixin, AltimetryMixin, TimeStampedModelMixin, Struct
             return [Infrastructure.objects.existing().get(pk=self.topology.pk)]
         return []
 
+    # Sums of mandays of interventions of ``intervention_column``
+    mandays_sql = """
+    SELECT COALESCE(SUM(md.nb_jours), 0)
+    FROM m_r_intervention_fonction md
+    WHERE md.intervention = {intervention_column}
+    """
+    mandays_cost_sql = """
+    SELECT COALESCE(SUM(md.nb_jours * f.cout_jour), 0)
+    FROM m_r_intervention_fonction md, m_b_fonction f
+    WHERE md.intervention = {intervention_column} AND f.id = md.fonction
+    """
+
+    @classmethod
+    def with_costs(cls, queryset):
+        """ Computes mandays and costs of all interventions of ``queryset`` within its query """
+        column = '%s.%s' % (connection.ops.quote_name(cls._meta.db_table),
+                            connection.ops.quote_name(cls._meta.pk.column))
+        return queryset.extra(select={
+            'sum_mandays': cls.mandays_sql.format(intervention_column=column),
+            'sum_mandays_cost': cls.mandays_cost_sql.format(intervention_column=column),
+        })
+
     @property
     def total_manday(self):
+        if 'sum_mandays' in self.__dict__:
+            return float(self.sum_mandays)
         total = 0.0
         for md in self.manday_set.all():
             total += float(md.nb_days)
@@ -214,6 +278,8 @@ class Intervention(MapEntityMixin, AltimetryMixin, TimeStampedModelMixin, Struct
 
     @property
     def total_cost_mandays(self):
+        if 'sum_mandays_cost' in self.__dict__:
+            return float(self.sum_mandays_cost)
         total = 0.0
         for md in self.manday_set.all():
             total += md.cost
@@ -352,14 +418,13 @@ class ManDay(models.Model):
         return self.nb_days
 
 
-class ProjectManager(models.GeoManager):
-    def all_years(self):
-        all_years = []
-        for (begin, end) in self.existing().values_list('begin_year', 'end_year'):
-            all_years.append(begin)
-            all_years.append(end)
-        all_years = list(reversed(sorted(set(all_years))))
-        return all_years
+class ProjectManager(YearsManagerMixin, models.GeoManager):
+    years_sql = """
+    SELECT annee_debut AS annee FROM m_t_chantier WHERE NOT supprime
+    UNION
+    SELECT annee_fin FROM m_t_chantier WHERE NOT supprime
+    ORDER BY annee DESC
+    """
 
 
 class Project(MapEntityMixin, TimeStampedModelMixin, StructureRelated, NoDeleteMixin):
@@ -397,35 +462,47 @@ class Project(MapEntityMixin, TimeStampedModelMixin, StructureRelated, NoDeleteM
         super(Project, self).__init__(*args, **kwargs)
         self._geom = None
 
+    # Collection of interventions geometries, for projects of ``project_column``
+    geom_sql = """
+    SELECT ST_Force_Collection(ST_Collect(e.geom))
+    FROM m_t_intervention i, e_t_evenement e
+    WHERE i.chantier = {project_column} AND NOT i.supprime AND e.id = i.topology_id
+    """
+
+    @classmethod
+    def with_geom(cls, queryset):
+        """ Computes geometries of all projects of ``queryset`` within its query """
+        sql = cls.geom_sql.format(project_column='%s.%s' % (connection.ops.quote_name(cls._meta.db_table),
+                                                            connection.ops.quote_name(cls._meta.pk.column)))
+        return queryset.extra(select={'collected_geom': sql})
+
+    def topology_ids(self, kind=None):
+        """ Subquery of interventions topologies """
+        interventions = self.interventions.existing()
+        if kind:
+            interventions = interventions.filter(topology__kind=kind)
+        return interventions.values('topology')
+
+    def path_ids(self):
+        """ Subquery of paths of interventions topologies """
+        return PathAggregation.objects.filter(topo_object__in=self.topology_ids()).values('path')
+
     @property
     def paths(self):
-        s = []
-        for i in self.interventions.existing():
-            s += i.paths
-        return Path.objects.filter(pk__in=[p.pk for p in set(s)])
+        return Path.objects.filter(pk__in=self.path_ids())
 
     @property
     def trails(self):
-        s = []
-        for i in self.interventions.existing():
-            for p in i.paths.all():
-                if p.trail:
-                    s.append(p.trail)
-        return Trail.objects.filter(pk__in=[t.pk for t in set(s)])
+        trail_ids = PathAggregation.objects.filter(path__in=self.path_ids()).values('topo_object')
+        return Trail.objects.existing().filter(pk__in=trail_ids)
 
     @property
     def signages(self):
-        s = []
-        for i in self.interventions.existing():
-            s += i.signages
-        return list(set(s))
+        return list(Signage.objects.existing().filter(pk__in=self.topology_ids(kind=Signage.KIND)))
 
     @property
     def infrastructures(self):
-        s = []
-        for i in self.interventions.existing():
-            s += i.infrastructures
-        return list(set(s))
+        return list(Infrastructure.objects.existing().filter(pk__in=self.topology_ids(kind=Infrastructure.KIND)))
 
     @classproperty
     def geomfield(cls):
@@ -437,13 +514,18 @@ class Project(MapEntityMixin, TimeStampedModelMixin, StructureRelated, NoDeleteM
 
     @property
     def geom(self):
-        """ Merge all interventions geometry into a collection
+        """ Merge all interventions geometry into a collection, in one query
+        (or none if computed with ``with_geom()``)
         """
-        if self._geom is None:
-            interventions = Intervention.objects.existing().filter(project=self)
-            geoms = [i.geom for i in interventions if i.geom is not None]
-            if geoms:
-                self._geom = GeometryCollection(*geoms, srid=settings.SRID)
+        if self._geom is None and self.pk:
+            if 'collected_geom' in self.__dict__:
+                collected = self.collected_geom
+            else:
+                cursor = connection.cursor()
+                cursor.execute(self.geom_sql.format(project_column='%s'), [self.pk])
+                collected = cursor.fetchone()[0]
+            if collected:
+                self._geom = GEOSGeometry(collected, srid=settings.SRID)
         return self._geom
 
     @geom.setter
@@ -477,13 +559,30 @@ class Project(MapEntityMixin, TimeStampedModelMixin, StructureRelated, NoDeleteM
     def period_verbose_name(cls):
         return _("Period")
 
+    # Sum of costs of interventions, for projects of ``project_column``
+    total_cost_sql = """
+    SELECT COALESCE(SUM(i.cout_materiel + i.cout_heliport + i.cout_soustraitant + ({mandays_cost})), 0)
+    FROM m_t_intervention i
+    WHERE i.chantier = {project_column} AND NOT i.supprime
+    """
+
+    @classmethod
+    def with_costs(cls, queryset):
+        """ Computes interventions total cost of all projects of ``queryset`` within its query """
+        sql = cls.total_cost_sql.format(mandays_cost=Intervention.mandays_cost_sql.format(intervention_column='i.id'),
+                                        project_column='%s.%s' % (connection.ops.quote_name(cls._meta.db_table),
+                                                                  connection.ops.quote_name(cls._meta.pk.column)))
+        return queryset.extra(select={'sum_interventions_cost': sql})
+
     @property
     def interventions_total_cost(self):
-        total = 0
-        qs = self.interventions.existing()
-        for i in qs.prefetch_related('manday_set', 'manday_set__job'):
-            total += i.total_cost
-        return total
+        if 'sum_interventions_cost' in self.__dict__:
+            return float(self.sum_interventions_cost)
+        cursor = connection.cursor()
+        cursor.execute(self.total_cost_sql.format(
+            mandays_cost=Intervention.mandays_cost_sql.format(intervention_column='i.id'),
+            project_column='%s'), [self.pk])
+        return float(cursor.fetchone()[0])
 
     @classproperty
     def interventions_total_cost_verbose_name(cls):
@@ -500,9 +599,52 @@ class Project(MapEntityMixin, TimeStampedModelMixin, StructureRelated, NoDeleteM
     def topology_projects(cls, topology):
         return cls.objects.existing().filter(interventions__in=topology.interventions).distinct()
 
+    # Topologies overlapping interventions of projects (same as ``Topology.overlapping()``)
+    overlapping_sql = """
+    SELECT {columns}
+    FROM m_t_intervention i, e_r_evenement_troncon ia, e_r_evenement_troncon a, e_t_evenement t
+    WHERE i.chantier IN %s AND ia.evenement = i.topology_id
+      AND a.troncon = ia.troncon AND t.id = a.evenement AND NOT t.supprime AND {kind_condition}
+      AND least(a.pk_debut, a.pk_fin) <= greatest(ia.pk_debut, ia.pk_fin)
+      AND greatest(a.pk_debut, a.pk_fin) >= least(ia.pk_debut, ia.pk_fin)
+    """
+
+    @classmethod
+    def _overlapping_sql(cls, klass, projects_pks, columns):
+        params = [tuple(projects_pks)]
+        if klass.KIND == Topology.KIND:
+            kind_condition = 'true'
+        else:
+            kind_condition = 't.kind = %s'
+            params.append(klass.KIND)
+        return cls.overlapping_sql.format(columns=columns, kind_condition=kind_condition), params
+
+    def overlapping_edges(self, klass):
+        """ Topologies of ``klass`` overlapping interventions of project, with one query
+        for all interventions (same result as ``edges_by_attr()``).
+        """
+        sql, params = self._overlapping_sql(klass, [self.pk], 't.id')
+        where = '%s.%s IN (%s)' % (connection.ops.quote_name(klass._meta.db_table),
+                                   connection.ops.quote_name(klass._meta.pk.column), sql)
+        return klass.objects.existing().extra(where=[where], params=params)
+
+    @classmethod
+    def overlapping_edges_in_bulk(cls, klass, projects):
+        """ Same as ``overlapping_edges()`` for several projects at once.
+        Returns lists of ``klass`` instances by project pk.
+        """
+        projects = [project for project in projects if project.pk]
+        if not projects:
+            return {}
+        sql, params = cls._overlapping_sql(klass, [project.pk for project in projects], 'DISTINCT i.chantier, t.id')
+        cursor = connection.cursor()
+        cursor.execute(sql, params)
+        return instances_by_owner(klass.objects.existing(), cursor.fetchall())
+
     def edges_by_attr(self, interventionattr):
         """ Return related topology objects of project, by aggregating the same attribute
-        on its interventions.
+        on its interventions. Prefer ``overlapping_edges()`` for relations based on
+        topologies overlapping.
         (See geotrek.land.models)
         """
         pks = []
@@ -577,3 +719,15 @@ class Funding(models.Model):
 
     def __unicode__(self):
         return self.amount
+
+
+@receiver(post_save, dispatch_uid="maintenance_years_bump")
+@receiver(post_delete, dispatch_uid="maintenance_years_bump_d")
+def bump_years_version(sender, instance, **kwargs):
+    """ Refresh years lists of filters. Topologies deletion also deletes
+    their interventions in database (see ``sql/10_interventions.sql``).
+    Bulk ``update()`` of dates must call ``bump_years_version()`` explicitly. """
+    if isinstance(instance, Intervention) or (isinstance(instance, Topology) and instance.deleted):
+        Intervention.objects.bump_years_version()
+    if isinstance(instance, Project):
+        Project.objects.bump_years_version()
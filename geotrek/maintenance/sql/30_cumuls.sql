@@ -0,0 +1,239 @@
+-------------------------------------------------------------------------------
+-- Interventions costs rollups
+-------------------------------------------------------------------------------
+-- Number of interventions, mandays and costs of existing interventions, summed
+-- by year, structure, stake, type, status and project. Rows are updated
+-- incrementally by triggers on interventions, mandays, jobs and projects,
+-- so that analytics do not scan interventions history.
+-- Interventions of deleted projects are counted without project.
+-- Each group has one row at most (unique index), updated under a lock of its key.
+
+CREATE TABLE IF NOT EXISTS gestion.m_t_intervention_cumul (
+    annee integer NOT NULL,
+    structure integer NOT NULL,
+    enjeu integer,
+    type integer,
+    status integer NOT NULL,
+    chantier integer,
+    nombre integer NOT NULL DEFAULT 0,
+    jours numeric NOT NULL DEFAULT 0,
+    cout_jours numeric NOT NULL DEFAULT 0,
+    cout_materiel double precision NOT NULL DEFAULT 0,
+    cout_heliport double precision NOT NULL DEFAULT 0,
+    cout_soustraitant double precision NOT NULL DEFAULT 0
+);
+
+DROP INDEX IF EXISTS m_t_intervention_cumul_idx;
+CREATE INDEX m_t_intervention_cumul_idx ON gestion.m_t_intervention_cumul (annee, structure, status);
+
+-- Groups without stake, type or project share the same key
+DROP INDEX IF EXISTS m_t_intervention_cumul_groupe_idx;
+CREATE UNIQUE INDEX m_t_intervention_cumul_groupe_idx ON gestion.m_t_intervention_cumul
+    (annee, structure, status, COALESCE(enjeu, -1), COALESCE(type, -1), COALESCE(chantier, -1));
+
+
+-- Interventions of deleted projects have no project
+CREATE OR REPLACE FUNCTION gestion.ft_intervention_cumul_chantier(i_chantier integer) RETURNS integer AS $$
+    SELECT id FROM m_t_chantier WHERE id = $1 AND NOT supprime;
+$$ LANGUAGE sql;
+
+
+CREATE OR REPLACE FUNCTION gestion.ft_intervention_cumul_ajouter(
+        i_date date, i_structure integer, i_enjeu integer, i_type integer, i_status integer, i_chantier integer,
+        d_nombre integer, d_jours numeric, d_cout_jours numeric,
+        d_materiel double precision, d_heliport double precision, d_soustraitant double precision)
+RETURNS void AS $$
+DECLARE
+    i_annee integer := extract(year FROM i_date)::integer;
+BEGIN
+    -- Concurrent transactions would insert the same group twice
+    PERFORM pg_advisory_xact_lock(hashtext('m_t_intervention_cumul|' || i_annee || '|' || i_structure || '|'
+                                           || i_status || '|' || COALESCE(i_enjeu, -1) || '|'
+                                           || COALESCE(i_type, -1) || '|' || COALESCE(i_chantier, -1)));
+
+    UPDATE m_t_intervention_cumul SET
+        nombre = nombre + d_nombre,
+        jours = jours + d_jours,
+        cout_jours = cout_jours + d_cout_jours,
+        cout_materiel = cout_materiel + d_materiel,
+        cout_heliport = cout_heliport + d_heliport,
+        cout_soustraitant = cout_soustraitant + d_soustraitant
+    WHERE annee = i_annee AND structure = i_structure AND status = i_status
+      AND enjeu IS NOT DISTINCT FROM i_enjeu AND type IS NOT DISTINCT FROM i_type
+      AND chantier IS NOT DISTINCT FROM i_chantier;
+    IF NOT FOUND THEN
+        INSERT INTO m_t_intervention_cumul (annee, structure, enjeu, type, status, chantier,
+                                            nombre, jours, cout_jours,
+                                            cout_materiel, cout_heliport, cout_soustraitant)
+        VALUES (i_annee, i_structure, i_enjeu, i_type, i_status, i_chantier,
+                d_nombre, d_jours, d_cout_jours,
+                d_materiel, d_heliport, d_soustraitant);
+    END IF;
+
+    -- Mandays belong to interventions: no intervention left means nothing left
+    DELETE FROM m_t_intervention_cumul
+    WHERE annee = i_annee AND structure = i_structure AND status = i_status
+      AND enjeu IS NOT DISTINCT FROM i_enjeu AND type IS NOT DISTINCT FROM i_type
+      AND chantier IS NOT DISTINCT FROM i_chantier
+      AND nombre = 0;
+END;
+$$ LANGUAGE plpgsql;
+
+
+CREATE OR REPLACE FUNCTION gestion.ft_intervention_cumul_rebuild() RETURNS integer AS $$
+DECLARE
+    t_count integer;
+BEGIN
+    DELETE FROM m_t_intervention_cumul;
+    INSERT INTO m_t_intervention_cumul (annee, structure, enjeu, type, status, chantier,
+                                        nombre, jours, cout_jours,
+                                        cout_materiel, cout_heliport, cout_soustraitant)
+    SELECT extract(year FROM i.date)::integer, i.structure, i.enjeu, i.type, i.status, c.id,
+           count(*), COALESCE(SUM(md.jours), 0), COALESCE(SUM(md.cout_jours), 0),
+           SUM(i.cout_materiel), SUM(i.cout_heliport), SUM(i.cout_soustraitant)
+    FROM m_t_intervention i
+    LEFT JOIN m_t_chantier c ON c.id = i.chantier AND NOT c.supprime
+    LEFT JOIN (SELECT md.intervention, SUM(md.nb_jours) AS jours, SUM(md.nb_jours * f.cout_jour) AS cout_jours
+               FROM m_r_intervention_fonction md, m_b_fonction f
+               WHERE f.id = md.fonction
+               GROUP BY md.intervention) md ON md.intervention = i.id
+    WHERE NOT i.supprime
+    GROUP BY 1, i.structure, i.enjeu, i.type, i.status, c.id;
+    SELECT count(*) FROM m_t_intervention_cumul INTO t_count;
+    RETURN t_count;
+END;
+$$ LANGUAGE plpgsql;
+
+
+-------------------------------------------------------------------------------
+-- Sync when interventions, mandays, jobs or projects are modified
+-------------------------------------------------------------------------------
+
+CREATE OR REPLACE FUNCTION gestion.intervention_cumul_iud() RETURNS trigger AS $$
+DECLARE
+    i_id integer;
+    t_jours numeric;
+    t_cout_jours numeric;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        i_id := NEW.id;
+    ELSE
+        i_id := OLD.id;
+    END IF;
+    -- Mandays are not modified with interventions
+    SELECT COALESCE(SUM(md.nb_jours), 0), COALESCE(SUM(md.nb_jours * f.cout_jour), 0)
+    FROM m_r_intervention_fonction md, m_b_fonction f
+    WHERE md.intervention = i_id AND f.id = md.fonction
+    INTO t_jours, t_cout_jours;
+
+    IF TG_OP != 'INSERT' AND NOT OLD.supprime THEN
+        PERFORM ft_intervention_cumul_ajouter(OLD.date, OLD.structure, OLD.enjeu, OLD.type, OLD.status,
+                                              ft_intervention_cumul_chantier(OLD.chantier),
+                                              -1, -t_jours, -t_cout_jours,
+                                              -OLD.cout_materiel, -OLD.cout_heliport, -OLD.cout_soustraitant);
+    END IF;
+    IF TG_OP != 'DELETE' AND NOT NEW.supprime THEN
+        PERFORM ft_intervention_cumul_ajouter(NEW.date, NEW.structure, NEW.enjeu, NEW.type, NEW.status,
+                                              ft_intervention_cumul_chantier(NEW.chantier),
+                                              1, t_jours, t_cout_jours,
+                                              NEW.cout_materiel, NEW.cout_heliport, NEW.cout_soustraitant);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS m_t_intervention_cumul_iud_tgr ON m_t_intervention;
+CREATE TRIGGER m_t_intervention_cumul_iud_tgr
+AFTER INSERT OR DELETE OR UPDATE OF date, structure, enjeu, type, status, chantier, supprime,
+    cout_materiel, cout_heliport, cout_soustraitant ON m_t_intervention
+FOR EACH ROW EXECUTE PROCEDURE intervention_cumul_iud();
+
+
+CREATE OR REPLACE FUNCTION gestion.intervention_fonction_cumul_iud() RETURNS trigger AS $$
+DECLARE
+    i m_t_intervention;
+BEGIN
+    IF TG_OP != 'INSERT' THEN
+        SELECT * FROM m_t_intervention WHERE id = OLD.intervention AND NOT supprime INTO i;
+        IF FOUND THEN
+            PERFORM ft_intervention_cumul_ajouter(i.date, i.structure, i.enjeu, i.type, i.status,
+                                                  ft_intervention_cumul_chantier(i.chantier),
+                                                  0, -OLD.nb_jours,
+                                                  -OLD.nb_jours * (SELECT cout_jour FROM m_b_fonction WHERE id = OLD.fonction),
+                                                  0, 0, 0);
+        END IF;
+    END IF;
+    IF TG_OP != 'DELETE' THEN
+        SELECT * FROM m_t_intervention WHERE id = NEW.intervention AND NOT supprime INTO i;
+        IF FOUND THEN
+            PERFORM ft_intervention_cumul_ajouter(i.date, i.structure, i.enjeu, i.type, i.status,
+                                                  ft_intervention_cumul_chantier(i.chantier),
+                                                  0, NEW.nb_jours,
+                                                  NEW.nb_jours * (SELECT cout_jour FROM m_b_fonction WHERE id = NEW.fonction),
+                                                  0, 0, 0);
+        END IF;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS m_r_intervention_fonction_cumul_iud_tgr ON m_r_intervention_fonction;
+CREATE TRIGGER m_r_intervention_fonction_cumul_iud_tgr
+AFTER INSERT OR UPDATE OR DELETE ON m_r_intervention_fonction
+FOR EACH ROW EXECUTE PROCEDURE intervention_fonction_cumul_iud();
+
+
+-- Jobs costs are rarely modified, and affect many interventions
+CREATE OR REPLACE FUNCTION gestion.fonction_cumul_u() RETURNS trigger AS $$
+BEGIN
+    PERFORM ft_intervention_cumul_rebuild();
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS m_b_fonction_cumul_u_tgr ON m_b_fonction;
+CREATE TRIGGER m_b_fonction_cumul_u_tgr
+AFTER UPDATE OF cout_jour ON m_b_fonction
+FOR EACH STATEMENT EXECUTE PROCEDURE fonction_cumul_u();
+
+
+CREATE OR REPLACE FUNCTION gestion.chantier_cumul_u() RETURNS trigger AS $$
+DECLARE
+    i record;
+BEGIN
+    IF OLD.supprime = NEW.supprime THEN
+        RETURN NULL;
+    END IF;
+    FOR i IN SELECT it.*,
+                    COALESCE((SELECT SUM(md.nb_jours) FROM m_r_intervention_fonction md
+                              WHERE md.intervention = it.id), 0) AS jours,
+                    COALESCE((SELECT SUM(md.nb_jours * f.cout_jour) FROM m_r_intervention_fonction md, m_b_fonction f
+                              WHERE md.intervention = it.id AND f.id = md.fonction), 0) AS cout_jours
+             FROM m_t_intervention it
+             WHERE it.chantier = NEW.id AND NOT it.supprime
+    LOOP
+        -- Move interventions between the project and no project
+        PERFORM ft_intervention_cumul_ajouter(i.date, i.structure, i.enjeu, i.type, i.status,
+                                              CASE WHEN NEW.supprime THEN NEW.id ELSE NULL END,
+                                              -1, -i.jours, -i.cout_jours,
+                                              -i.cout_materiel, -i.cout_heliport, -i.cout_soustraitant);
+        PERFORM ft_intervention_cumul_ajouter(i.date, i.structure, i.enjeu, i.type, i.status,
+                                              CASE WHEN NEW.supprime THEN NULL ELSE NEW.id END,
+                                              1, i.jours, i.cout_jours,
+                                              i.cout_materiel, i.cout_heliport, i.cout_soustraitant);
+    END LOOP;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS m_t_chantier_cumul_u_tgr ON m_t_chantier;
+CREATE TRIGGER m_t_chantier_cumul_u_tgr
+AFTER UPDATE OF supprime ON m_t_chantier
+FOR EACH ROW EXECUTE PROCEDURE chantier_cumul_u();
+
+
+-------------------------------------------------------------------------------
+-- (Re)build from existing interventions
+-------------------------------------------------------------------------------
+
+SELECT ft_intervention_cumul_rebuild();
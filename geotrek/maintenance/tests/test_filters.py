@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
 from datetime import datetime
 
+import mock
+from django.core.cache import get_cache
 from django.test import TestCase
 
 from geotrek.land.factories import (
@@ -11,6 +13,7 @@ from geotrek.core.factories import PathFactory, PathAggregationFactory, getRando
 
 from geotrek.maintenance.filters import (ProjectFilterSet, InterventionFilterSet,
                                          InterventionYearSelect, ProjectYearSelect)
+from geotrek.maintenance.models import Intervention, Project
 from geotrek.maintenance.factories import (InterventionFactory, ProjectFactory,
                                            InfrastructureInterventionFactory)
 
@@ -229,6 +232,31 @@ class InterventionYearsFilterTest(TestCase):
         self.assertEqual(output.count('<option'), 4)
         self.assertIn('>2024<', output)
 
+    def test_years_are_listed_by_database(self):
+        InfrastructureInterventionFactory.create(date=datetime(2012, 3, 4))
+        InfrastructureInterventionFactory.create(date=datetime(1990, 1, 1), deleted=True)
+        with self.assertNumQueries(1):
+            years = Intervention.objects.all_years()
+        self.assertEqual(years, [2012, 1932])
+
+    def test_years_are_cached_until_interventions_change(self):
+        locmem = get_cache('django.core.cache.backends.locmem.LocMemCache', LOCATION='years')
+        with mock.patch('geotrek.maintenance.models.cache', locmem):
+            self.assertEqual(Intervention.objects.all_years(), [2012, 1932])
+            with self.assertNumQueries(0):
+                self.assertEqual(Intervention.objects.all_years(), [2012, 1932])
+            intervention = InfrastructureInterventionFactory.create(date=datetime(2024, 11, 10))
+            self.assertEqual(Intervention.objects.all_years(), [2024, 2012, 1932])
+            intervention.topology.delete()
+            self.assertEqual(Intervention.objects.all_years(), [2012, 1932])
+        locmem.clear()
+
+    def test_deleted_interventions_disappear(self):
+        intervention = InfrastructureInterventionFactory.create(date=datetime(2024, 11, 10))
+        self.assertEqual(Intervention.objects.all_years(), [2024, 2012, 1932])
+        intervention.delete()
+        self.assertEqual(Intervention.objects.all_years(), [2012, 1932])
+
 
 class ProjectYearsFilterTest(TestCase):
     def setUp(self):
@@ -252,6 +280,13 @@ class ProjectYearsFilterTest(TestCase):
         self.assertEqual(output.count('<option'), 6)
         self.assertIn('>2100<', output)
 
+    def test_years_are_listed_by_database(self):
+        ProjectFactory.create(begin_year=1500, end_year=1500, deleted=True)
+        ProjectFactory.create(begin_year=1400, end_year=1400, deleted=True)
+        with self.assertNumQueries(1):
+            years = Project.objects.all_years()
+        self.assertEqual(years, [2000, 1800, 1700, 1500])
+
     def test_new_projects_can_be_filtered_on_new_years(self):
         filter = ProjectFilterSet(data={'in_year': 1250})
         p = ProjectFactory.create(begin_year=1200, end_year=1300)
@@ -3,7 +3,7 @@ from django.utils import translation
 
 from geotrek.infrastructure.models import Infrastructure
 from geotrek.infrastructure.factories import InfrastructureFactory, SignageFactory
-from geotrek.maintenance.models import Intervention
+from geotrek.maintenance.models import Intervention, Project
 from geotrek.maintenance.factories import (InterventionFactory,
                                            InfrastructureInterventionFactory,
                                            InfrastructurePointInterventionFactory,
@@ -61,6 +61,23 @@ class InterventionTest(TestCase):
         ManDayFactory.create(intervention=i, nb_days=8)
         self.assertEqual(i.total_manday, 14)  # intervention haz a default manday
 
+    def test_costs_computed_in_query(self):
+        i = InterventionFactory.create(material_cost=100, heliport_cost=10, subcontract_cost=1)
+        ManDayFactory.create(intervention=i, nb_days=2, job__cost=50)
+        expected = (i.total_manday, i.total_cost_mandays, i.total_cost)
+        with self.assertNumQueries(1):
+            annotated = Intervention.with_costs(Intervention.objects.filter(pk=i.pk))[0]
+            self.assertEqual((annotated.total_manday, annotated.total_cost_mandays, annotated.total_cost),
+                             expected)
+
+        project = ProjectFactory.create()
+        project.interventions.add(i)
+        InterventionFactory.create(project=project, material_cost=1000).delete()
+        self.assertEqual(project.interventions_total_cost, i.total_cost)
+        with self.assertNumQueries(1):
+            annotated = Project.with_costs(Project.objects.filter(pk=project.pk))[0]
+            self.assertEqual(annotated.interventions_total_cost, i.total_cost)
+
     def test_path_helpers(self):
         p = PathFactory.create()
 
@@ -2,11 +2,14 @@ from django.test import TestCase
 
 from geotrek.infrastructure.factories import InfrastructureFactory, SignageFactory
 from geotrek.maintenance.factories import InterventionFactory, ProjectFactory
-from geotrek.core.factories import TopologyFactory, PathAggregationFactory
+from geotrek.maintenance.models import Project
+from geotrek.core.factories import TopologyFactory, PathAggregationFactory, TrailFactory
 from geotrek.land.factories import (SignageManagementEdgeFactory, WorkManagementEdgeFactory,
                                     CompetenceEdgeFactory)
 from geotrek.zoning.factories import (CityEdgeFactory, DistrictEdgeFactory,
                                       RestrictedAreaEdgeFactory)
+from geotrek.land.models import SignageManagementEdge
+from geotrek.zoning.models import CityEdge
 
 
 class ProjectTest(TestCase):
@@ -73,6 +76,33 @@ class ProjectTest(TestCase):
 
         self.assertEquals(proj.infrastructures, [])
 
+    def test_geom_collects_interventions_geometries(self):
+        proj = ProjectFactory.create()
+        self.assertEqual(proj.geom, None)
+        InterventionFactory.create(project=proj, topology=TopologyFactory.create())
+        InterventionFactory.create(project=proj, topology=TopologyFactory.create())
+        InterventionFactory.create(project=proj, topology=TopologyFactory.create()).delete()
+
+        proj = Project.objects.get(pk=proj.pk)
+        with self.assertNumQueries(1):
+            self.assertEqual(proj.geom.geom_type, 'GeometryCollection')
+        self.assertEqual(len(proj.geom), 2)
+
+        proj = Project.with_geom(Project.objects.filter(pk=proj.pk))[0]
+        with self.assertNumQueries(0):
+            self.assertEqual(len(proj.geom), 2)
+
+    def test_trails_of_interventions_paths(self):
+        proj = ProjectFactory.create()
+        topology = TopologyFactory.create()
+        InterventionFactory.create(project=proj, topology=topology)
+        trail = TrailFactory.create(no_path=True)
+        trail.add_path(topology.paths.get())
+        TrailFactory.create()
+
+        with self.assertNumQueries(1):
+            self.assertEqual(list(proj.trails), [trail])
+
 
 class ProjectLandTest(TestCase):
     def setUp(self):
@@ -127,3 +157,15 @@ class ProjectLandTest(TestCase):
         self.assertIn(self.restricted, self.intervention.area_edges)
         self.assertIn(self.restricted, self.project.area_edges)
         self.assertIn(self.restricted.restricted_area, self.project.areas)
+
+    def test_project_edges_resolved_with_one_query(self):
+        with self.assertNumQueries(1):
+            edges = list(self.project.overlapping_edges(CityEdge))
+        self.assertItemsEqual(edges, self.project.edges_by_attr('city_edges'))
+
+    def test_project_edges_in_bulk(self):
+        other = ProjectFactory.create()
+        with self.assertNumQueries(2):
+            found = Project.overlapping_edges_in_bulk(SignageManagementEdge, [self.project, other])
+        self.assertIn(self.signagemgt, found[self.project.pk])
+        self.assertNotIn(other.pk, found)
@@ -23,7 +23,8 @@ from geotrek.core.factories import (PathFactory, PathAggregationFactory,
 from geotrek.infrastructure.factories import InfrastructureFactory
 from geotrek.maintenance.factories import (InterventionFactory, InfrastructureInterventionFactory,
                                            InterventionDisorderFactory, InterventionStatusFactory,
-                                           ProjectFactory, ContractorFactory, InterventionJobFactory)
+                                           ProjectFactory, ContractorFactory, InterventionJobFactory,
+                                           ManDayFactory)
 
 
 class InterventionViewsTest(CommonTest):
@@ -311,6 +312,75 @@ class ProjectViewsTest(CommonTest):
         self.assertNotContains(response, intervention.name)
 
 
+class InterventionCostsTest(TestCase):
+    def setUp(self):
+        user = PathManagerFactory(password='booh')
+        self.client.login(username=user.username, password='booh')
+        self.url = '/api/intervention/costs.json'
+        self.stake = StakeFactory.create()
+        self.project = ProjectFactory.create()
+        self.intervention = InterventionFactory.create(date='2012-05-01', stake=self.stake,
+                                                       material_cost=100, heliport_cost=10,
+                                                       project=self.project)
+        ManDayFactory.create(intervention=self.intervention, nb_days=2,
+                             job=InterventionJobFactory.create(cost=300))
+        InterventionFactory.create(date='2013-05-01', stake=self.stake, subcontract_cost=50)
+
+    def get(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.content)['results']
+
+    def test_login_required(self):
+        self.client.logout()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 302)
+
+    def test_costs_are_summed_by_year(self):
+        results = self.get(group_by='year')
+        self.assertEqual(len(results), 2)
+        self.assertEqual(results[0]['year'], 2012)
+        self.assertEqual(results[0]['interventions'], 1)
+        self.assertEqual(results[0]['mandays'], 2.0)
+        self.assertEqual(results[0]['mandays_cost'], 600.0)
+        self.assertEqual(results[0]['total_cost'], 710.0)
+        self.assertEqual(results[1]['total_cost'], 50.0)
+
+    def test_costs_can_be_filtered_and_labelled(self):
+        response = self.client.get(self.url, {'group_by': 'stake', 'year_min': 2013})
+        content = json.loads(response.content)
+        self.assertEqual(content['results'], [{
+            'stake': self.stake.pk, 'interventions': 1, 'mandays': 0.0, 'mandays_cost': 0.0,
+            'material_cost': 0.0, 'heliport_cost': 0.0, 'subcontract_cost': 50.0, 'total_cost': 50.0}])
+        self.assertEqual(content['labels']['stake'], {str(self.stake.pk): unicode(self.stake)})
+
+    def test_costs_follow_modifications(self):
+        self.intervention.material_cost = 200
+        self.intervention.save()
+        self.assertEqual(self.get(year=2012)[0]['total_cost'], 810.0)
+        self.intervention.manday_set.all().delete()
+        self.assertEqual(self.get(year=2012)[0]['total_cost'], 210.0)
+        self.intervention.delete()
+        results = self.get(group_by='year')
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0]['year'], 2013)
+
+    def test_interventions_of_deleted_projects_have_no_project(self):
+        self.assertEqual(self.get(group_by='project', project=self.project.pk)[0]['interventions'], 1)
+        self.project.delete()
+        self.assertEqual(self.get(group_by='project', project=self.project.pk), [])
+        results = self.get(group_by='project')
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0]['project'], None)
+        self.assertEqual(results[0]['interventions'], 2)
+
+    def test_invalid_parameters(self):
+        response = self.client.get(self.url, {'group_by': 'colour'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(self.url, {'year': 'last'})
+        self.assertEqual(response.status_code, 400)
+
+
 class ExportTest(TestCase):
 
     def test_shape_mixed(self):
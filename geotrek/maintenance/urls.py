@@ -1,7 +1,14 @@
+from django.conf.urls import patterns, url
+
 from mapentity import registry
 
 from . import models
+from .views import InterventionCosts
 
 
-urlpatterns = registry.register(models.Intervention)
+urlpatterns = patterns(
+    '',
+    url(r'^api/intervention/costs.json$', InterventionCosts.as_view(), name="intervention_costs_json"),
+)
+urlpatterns += registry.register(models.Intervention)
 urlpatterns += registry.register(models.Project)
@@ -2,9 +2,14 @@
 
 import logging
 
+from django.contrib.auth.decorators import login_required
+from django.http import HttpResponseBadRequest
+from django.utils.decorators import method_decorator
 from django.utils.translation import ugettext_lazy as _
+from django.views.generic import View
 from mapentity.views import (MapEntityLayer, MapEntityList, MapEntityJsonList, MapEntityFormat,
-                             MapEntityDetail, MapEntityDocument, MapEntityCreate, MapEntityUpdate, MapEntityDelete)
+                             MapEntityDetail, MapEntityDocument, MapEntityCreate, MapEntityUpdate, MapEntityDelete,
+                             JSONResponseMixin)
 
 from geotrek.core.views import CreateFromTopologyMixin
 from geotrek.altimetry.models import AltimetryMixin
@@ -12,6 +17,7 @@ from geotrek.common.views import FormsetMixin
 from geotrek.authent.decorators import same_structure_required
 from geotrek.infrastructure.models import Infrastructure, Signage
 from .models import Intervention, Project
+from .helpers import CostRollupHelper
 from .filters import InterventionFilterSet, ProjectFilterSet
 from .forms import (InterventionForm, InterventionCreateForm, ProjectForm,
                     FundingFormSet, ManDayFormSet)
@@ -36,6 +42,7 @@ class InterventionJsonList(MapEntityJsonList, InterventionList):
 
 
 class InterventionFormatList(MapEntityFormat, InterventionList):
+    queryset = Intervention.with_costs(Intervention.objects.existing())
     columns = InterventionList.columns + \
         ['disorders', 'total_manday', 'project',
          'width', 'height', 'length', 'area',
@@ -108,13 +115,34 @@ class InterventionDelete(MapEntityDelete):
         return super(InterventionDelete, self).dispatch(*args, **kwargs)
 
 
+class InterventionCosts(JSONResponseMixin, View):
+    """ Interventions costs summed by year, structure, stake, type, status
+    or project, read from rollups (see ``CostRollupHelper``).
+    """
+    def get(self, request, *args, **kwargs):
+        try:
+            helper = CostRollupHelper.from_query(request.GET)
+        except ValueError as e:
+            return HttpResponseBadRequest(unicode(e))
+        rows = helper.rows()
+        return self.render_to_response({
+            'group_by': helper.group_by,
+            'labels': helper.labels(rows),
+            'results': rows,
+        })
+
+    @method_decorator(login_required)
+    def dispatch(self, *args, **kwargs):
+        return super(InterventionCosts, self).dispatch(*args, **kwargs)
+
+
 class ProjectLayer(MapEntityLayer):
     queryset = Project.objects.existing()
     properties = ['name']
 
     def get_queryset(self):
         nonemptyqs = Intervention.objects.existing().filter(project__isnull=False).values('project')
-        return super(ProjectLayer, self).get_queryset().filter(pk__in=nonemptyqs)
+        return Project.with_geom(super(ProjectLayer, self).get_queryset().filter(pk__in=nonemptyqs))
 
 
 class ProjectList(MapEntityList):
@@ -128,6 +156,7 @@ class ProjectJsonList(MapEntityJsonList, ProjectList):
 
 
 class ProjectFormatList(MapEntityFormat, ProjectList):
+    queryset = Project.with_costs(Project.with_geom(Project.objects.existing()))
     columns = ProjectList.columns + \
         ['constraint', 'global_cost', 'interventions', 'interventions_total_cost',
          'comments', 'contractors', 'project_owner', 'project_manager',
@@ -184,6 +184,7 @@ MIDDLEWARE_CLASSES = (
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'geotrek.common.middleware.MapImageInvalidationMiddleware',
     # Uncomment the next line for simple clickjacking protection:
     # 'django.middleware.clickjacking.XFrameOptionsMiddleware',
 
@@ -407,6 +408,7 @@ ALTIMETRIC_PROFILE_FONTSIZE = 25
 ALTIMETRIC_PROFILE_FONT = 'ubuntu'
 ALTIMETRIC_AREA_MAX_RESOLUTION = 150  # Maximum number of points (by width/height)
 ALTIMETRIC_AREA_MARGIN = 0.15
+ALTIMETRIC_DEM_OVERVIEWS = (2, 4, 8, 16)  # DEM overview factors built by loaddem
 
 
 # Let this be defined at instance-level
@@ -473,6 +475,11 @@ LAND_BBOX_CITIES_ENABLED = True
 LAND_BBOX_DISTRICTS_ENABLED = True
 LAND_BBOX_AREAS_ENABLED = False
 
+LAND_SUBDIVIDE_MAX_VERTICES = 256  # Max vertices of zoning polygon pieces used in spatial predicates
+LAND_TILES_ROOT = os.path.join(PROJECT_ROOT_PATH, 'var', 'tiles')  # Land layers tiles disk cache
+PUBLIC_SNAPSHOTS_ROOT = os.path.join(PROJECT_ROOT_PATH, 'var', 'snapshots')  # Published treks and POIs documents
+RENDERING_JOBS_ENABLED = False  # Render public documents of published objects with ``run_jobs`` workers
+
 PUBLISHED_BY_LANG = True
 
 EXPORT_MAP_IMAGE_SIZE = {
@@ -524,4 +531,5 @@ MESSAGE_TAGS = {
 }
 
 CACHE_TIMEOUT_LAND_LAYERS = 60 * 60 * 24
-CACHE_TIMEOUT_TOURISM_DATASOURCES = 60 * 60 * 24
+CACHE_TIMEOUT_TOURISM_DATASOURCES = 60 * 60 * 24  # Data sources are refreshed in background after this delay
+TOURISM_DATASOURCE_TIMEOUT = 10  # seconds
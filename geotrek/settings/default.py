@@ -45,6 +45,8 @@ STATIC_ROOT = envini.get('staticroot', section="django", default=os.path.join(DE
 CACHE_ROOT = envini.get('cacheroot', section="django", default=os.path.join(DEPLOY_ROOT, 'var', 'cache'))
 UPLOAD_DIR = envini.get('uploaddir', section="django", default=UPLOAD_DIR)
 MAPENTITY_CONFIG['TEMP_DIR'] = envini.get('tmproot', section="django", default=os.path.join(DEPLOY_ROOT, 'var', 'tmp'))
+LAND_TILES_ROOT = os.path.join(DEPLOY_ROOT, 'var', 'tiles')
+PUBLIC_SNAPSHOTS_ROOT = os.path.join(DEPLOY_ROOT, 'var', 'snapshots')
 
 
 DATABASES['default']['NAME'] = envini.get('dbname')
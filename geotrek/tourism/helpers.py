@@ -1,14 +1,25 @@
+import time
+import codecs
+import hashlib
 import logging
 import json
+import threading
 
 import geojson
+import requests
+from requests.exceptions import RequestException
 from tif2geojson import tif2geojson
+from django.conf import settings
+from django.core.cache import get_cache
 
 from geotrek.tourism.models import DATA_SOURCE_TYPES
 
 
 logger = logging.getLogger(__name__)
 
+STREAM_CHUNK_SIZE = 64 * 1024
+EMPTY_COLLECTION = '{"type": "FeatureCollection", "features": []}'
+
 
 def post_process(source, language, content):
 
@@ -42,6 +53,12 @@ def post_process(source, language, content):
 
 
 def sitra_to_geojson(objects, language):
+    features = [sitra_feature(objdict, language) for objdict in objects]
+    result = geojson.FeatureCollection(features)
+    return result
+
+
+def sitra_feature(objdict, language):
 
     def key_lang(d, key, lang):
         lang_key = '%s%s' % (key, language.title())
@@ -54,38 +71,235 @@ def sitra_to_geojson(objects, language):
                 return value
         return {}
 
-    features = []
-
-    for objdict in objects:
-
-        name = key_lang(objdict['nom'], 'libelle', language)
-        description = key_lang(objdict.get('presentation', {}).get('descriptifCourt', {}), 'libelle', language)
-        website = find_by_type(objdict.get('informations', {}).get('moyensCommunication', {}), 205).get('coordonnee')
-        phone = find_by_type(objdict.get('informations', {}).get('moyensCommunication', {}), 201).get('coordonnee')
-        geometry = objdict.get('localisation', {}).get('geolocalisation', {}).get('geoJson')
-
-        pictures = []
-        illustrations = objdict.get('illustrations', [])
-        for illustration in illustrations:
-            picture = {}
-            picture['url'] = illustration.get('traductionFichiers', [{}])[0].get('url')
-            picture['legend'] = key_lang(illustration.get('nom', {}), 'libelle', language)
-            picture['copyright'] = key_lang(illustration.get('copyright', {}), 'libelle', language)
-            pictures.append(picture)
-
-        id_ = objdict['id']
-        properties = {}
-        properties['title'] = name
-        properties['category'] = objdict['type']
-        properties['description'] = description
-        properties['website'] = website
-        properties['phone'] = phone
-        properties['pictures'] = pictures
-
-        feature = geojson.Feature(id=id_,
-                                  geometry=geometry,
-                                  properties=properties)
-        features.append(feature)
+    name = key_lang(objdict['nom'], 'libelle', language)
+    description = key_lang(objdict.get('presentation', {}).get('descriptifCourt', {}), 'libelle', language)
+    website = find_by_type(objdict.get('informations', {}).get('moyensCommunication', {}), 205).get('coordonnee')
+    phone = find_by_type(objdict.get('informations', {}).get('moyensCommunication', {}), 201).get('coordonnee')
+    geometry = objdict.get('localisation', {}).get('geolocalisation', {}).get('geoJson')
 
-    result = geojson.FeatureCollection(features)
-    return result
+    pictures = []
+    illustrations = objdict.get('illustrations', [])
+    for illustration in illustrations:
+        picture = {}
+        picture['url'] = illustration.get('traductionFichiers', [{}])[0].get('url')
+        picture['legend'] = key_lang(illustration.get('nom', {}), 'libelle', language)
+        picture['copyright'] = key_lang(illustration.get('copyright', {}), 'libelle', language)
+        pictures.append(picture)
+
+    id_ = objdict['id']
+    properties = {}
+    properties['title'] = name
+    properties['category'] = objdict['type']
+    properties['description'] = description
+    properties['website'] = website
+    properties['phone'] = phone
+    properties['pictures'] = pictures
+
+    return geojson.Feature(id=id_,
+                           geometry=geometry,
+                           properties=properties)
+
+
+def iter_json_array(chunks, key):
+    """ Yields items of the array ``key`` of a JSON document received as byte chunks,
+    without loading the whole document. Raises ``ValueError`` if array is missing
+    or truncated.
+    """
+    decoder = json.JSONDecoder()
+    charset = codecs.getincrementaldecoder('utf-8')()
+    marker = u'"%s"' % key
+    buf = u''
+    found = False
+    for chunk in chunks:
+        buf += charset.decode(chunk) if isinstance(chunk, str) else chunk
+        if not found:
+            i = buf.find(marker)
+            j = buf.find(u'[', i + len(marker)) if i >= 0 else -1
+            if j < 0:
+                # Keep enough to match marker split between chunks
+                buf = buf[i:] if i >= 0 else buf[-len(marker):]
+                continue
+            buf = buf[j + 1:]
+            found = True
+        while True:
+            buf = buf.lstrip(u' \t\r\n,')
+            if buf.startswith(u']'):
+                return
+            try:
+                item, end = decoder.raw_decode(buf)
+            except ValueError:
+                break  # Incomplete item, wait for next chunk
+            yield item
+            buf = buf[end:]
+    raise ValueError("Array '%s' is missing or truncated" % key)
+
+
+def sitra_features(chunks, language):
+    """ Same as ``sitra_to_geojson()``, converting objects while they are read """
+    for objdict in iter_json_array(chunks, 'objetsTouristiques'):
+        yield sitra_feature(objdict, language)
+
+
+def serialize_features(features):
+    """ Yields GeoJSON collection text, one feature at a time """
+    yield '{"type": "FeatureCollection", "features": ['
+    for i, feature in enumerate(features):
+        yield (', ' if i else '') + json.dumps(feature)
+    yield ']}'
+
+
+def post_process_stream(source, language, response):
+    """ Same as ``post_process()``, returning serialized GeoJSON chunks.
+    SITRA payloads are converted while downloaded.
+    """
+    if source.type == DATA_SOURCE_TYPES.SITRA:
+        features = sitra_features(response.iter_content(STREAM_CHUNK_SIZE), language)
+    else:
+        features = post_process(source, language, response.text)['features']
+    return serialize_features(features)
+
+
+class Payload(object):
+    """ Downloaded content of a source, read either as text or as chunks (like
+    ``requests`` responses), counting its size in bytes.
+    """
+    def __init__(self, response=None, content=None, encoding=None):
+        self.response = response
+        self.content = content
+        self.encoding = encoding or 'utf-8'
+        self.size = 0
+
+    @property
+    def text(self):
+        if self.response is not None:
+            self.size = len(self.response.content)
+            return self.response.text
+        self.size = len(self.content)
+        return self.content.decode(self.encoding, 'replace')
+
+    def iter_content(self, chunk_size=1):
+        if self.response is not None:
+            chunks = self.response.iter_content(chunk_size)
+        else:
+            chunks = (self.content[i:i + chunk_size] for i in range(0, len(self.content), chunk_size))
+        for chunk in chunks:
+            self.size += len(chunk)
+            yield chunk
+
+
+class DataSourceHelper(object):
+    """ Keeps the last good result of a data source per language in the fat cache,
+    and serves it immediately. Once older than ``CACHE_TIMEOUT_TOURISM_DATASOURCES``,
+    it is refreshed in background, using conditional requests (ETag and Last-Modified).
+
+    Results are stored serialized, and SITRA payloads are converted while downloaded.
+    Fetch latency (seconds) and payload size (bytes) are recorded along the result.
+    """
+    KEEP_TIMEOUT = 60 * 60 * 24 * 30  # Stale result is better than nothing
+    _refreshing = set()
+    _lock = threading.Lock()
+
+    def __init__(self, source, language):
+        self.source = source
+        self.language = language
+        self.cache = get_cache('fat')
+        self.key = 'datasource_%s_%s_%s' % (source.pk, language, hashlib.md5(source.url.encode('utf-8')).hexdigest())
+
+    def entry(self):
+        return self.cache.get(self.key)
+
+    def get(self):
+        entry = self.entry()
+        if entry is None:
+            entry = self.refresh()
+        elif time.time() - entry['fetched'] > settings.CACHE_TIMEOUT_TOURISM_DATASOURCES:
+            self.refresh_async()
+        if entry is None:
+            return EMPTY_COLLECTION
+        return entry['content']
+
+    def refresh_async(self):
+        with self._lock:
+            if self.key in self._refreshing:
+                return
+            self._refreshing.add(self.key)
+
+        def target():
+            try:
+                self.refresh()
+            finally:
+                with self._lock:
+                    self._refreshing.discard(self.key)
+
+        thread = threading.Thread(target=target)
+        thread.daemon = True
+        thread.start()
+
+    @classmethod
+    def conditional_headers(cls, entry):
+        headers = {}
+        if entry is not None:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def download(self, entry=None, timeout=None, retries=0, stream=False):
+        """ Fetches source, conditionally if ``entry`` is given.
+        Returns response and latency, raises ``RequestException`` after ``retries`` failures.
+        """
+        timeout = timeout or settings.TOURISM_DATASOURCE_TIMEOUT
+        for attempt in range(retries + 1):
+            start = time.time()
+            try:
+                response = requests.get(self.source.url, headers=self.conditional_headers(entry),
+                                        timeout=timeout, stream=stream)
+                if response.status_code != 304:
+                    response.raise_for_status()
+                return response, time.time() - start
+            except RequestException as e:
+                if attempt == retries:
+                    raise
+                logger.warning(u"Source '%s' download failed (%s), retrying" % (self.source.url, e))
+
+    def touch(self, entry, latency):
+        """ Source was not modified, keep entry fresh """
+        entry.update(fetched=time.time(), latency=latency, size=0)
+        self.cache.set(self.key, entry, self.KEEP_TIMEOUT)
+        logger.info(u"Source '%s' not modified (%.3f s)" % (self.source.url, latency))
+        return entry
+
+    def store(self, response, latency, content, size):
+        entry = {
+            'content': content,
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'fetched': time.time(),
+            'latency': latency,
+            'size': size,
+        }
+        self.cache.set(self.key, entry, self.KEEP_TIMEOUT)
+        logger.info(u"Source '%s' fetched (%.3f s, %s bytes)" % (self.source.url, latency, entry['size']))
+        return entry
+
+    def refresh(self):
+        """ Fetches source, and returns new entry, or last good one if failed """
+        entry = self.entry()
+        try:
+            response, latency = self.download(entry, stream=True)
+        except RequestException as e:
+            logger.error(u"Source '%s' cannot be downloaded" % self.source.url)
+            logger.exception(e)
+            return entry
+        if entry is not None and response.status_code == 304:
+            return self.touch(entry, latency)
+
+        payload = Payload(response)
+        try:
+            content = ''.join(post_process_stream(self.source, self.language, payload))
+        except (ValueError, AssertionError) as e:
+            logger.error(u"Source '%s' cannot be converted" % self.source.url)
+            logger.exception(e)
+            return entry
+        return self.store(response, latency, content, payload.size)
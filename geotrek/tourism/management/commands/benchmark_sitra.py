@@ -0,0 +1,93 @@
+import os
+import json
+import time
+import resource
+import tempfile
+from multiprocessing import Process, Queue
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+from geotrek.tourism.helpers import (sitra_to_geojson, serialize_features,
+                                     sitra_features, STREAM_CHUNK_SIZE)
+
+
+def synthetic_object(i):
+    return {
+        'id': i,
+        'type': 'HOTELLERIE',
+        'nom': {'libelleFr': u'Objet touristique %s' % i, 'libelleEn': u'Touristic object %s' % i},
+        'presentation': {'descriptifCourt': {'libelleFr': u'Description %s ' % i * 20}},
+        'informations': {'moyensCommunication': [
+            {'type': {'id': 201}, 'coordonnee': '04 92 00 00 00'},
+            {'type': {'id': 205}, 'coordonnee': 'http://example.com/%s' % i},
+        ]},
+        'localisation': {'geolocalisation': {'geoJson': {'type': 'Point', 'coordinates': [6.1, 44.8]}}},
+        'illustrations': [{
+            'nom': {'libelleFr': u'Photo %s' % i},
+            'copyright': {'libelleFr': u'Auteur'},
+            'traductionFichiers': [{'url': 'http://example.com/%s.jpg' % i}],
+        }] * 3,
+    }
+
+
+def load(filename, language):
+    with open(filename, 'rb') as f:
+        objects = json.loads(f.read())['objetsTouristiques']
+    return json.dumps(sitra_to_geojson(objects, language))
+
+
+def stream(filename, language):
+    with open(filename, 'rb') as f:
+        chunks = iter(lambda: f.read(STREAM_CHUNK_SIZE), '')
+        return ''.join(serialize_features(sitra_features(chunks, language)))
+
+
+def measure(method, filename, language, queue):
+    """ Runs in a dedicated process, to measure its own peak memory """
+    start = time.time()
+    content = method(filename, language)
+    duration = time.time() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    queue.put((duration, peak, len(content)))
+
+
+class Command(BaseCommand):
+    help = 'Measure time and peak memory of SITRA conversion, loading whole payload\n'
+    help += 'or streaming it, on a large synthetic SITRA file.\n'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--objects',
+                    type='int',
+                    default=50000,
+                    help='Number of touristic objects in synthetic file.'),
+        make_option('--language',
+                    default='en',
+                    help='Conversion language.'),
+    )
+
+    def handle(self, *args, **options):
+        if options['objects'] <= 0:
+            raise CommandError('Invalid number of objects: %s' % options['objects'])
+        fd, filename = tempfile.mkstemp(suffix='.json')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write('{"numFound": %s, "objetsTouristiques": [' % options['objects'])
+                for i in range(options['objects']):
+                    f.write((', ' if i else '') + json.dumps(synthetic_object(i)))
+                f.write('], "query": {}}')
+            size = os.path.getsize(filename)
+            self.stdout.write('%s objects, %.1f MB\n' % (options['objects'], size / 1024.0 / 1024.0))
+
+            self.stdout.write('%10s %10s %14s %12s\n' % ('method', 'seconds', 'peak (MB)', 'output (MB)'))
+            for name, method in (('load', load), ('stream', stream)):
+                queue = Queue()
+                process = Process(target=measure, args=(method, filename, options['language'], queue))
+                process.start()
+                duration, peak, length = queue.get()
+                process.join()
+                # ru_maxrss is in kilobytes on Linux
+                self.stdout.write('%10s %10.3f %14.1f %12.1f\n' % (name, duration, peak / 1024.0,
+                                                                   length / 1024.0 / 1024.0))
+        finally:
+            os.remove(filename)
@@ -0,0 +1,110 @@
+import time
+from multiprocessing import Pool
+from multiprocessing.pool import ThreadPool
+from optparse import make_option
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from requests.exceptions import RequestException
+
+from geotrek.tourism.helpers import DataSourceHelper, Payload, post_process_stream
+from geotrek.tourism.models import DataSource
+
+
+def convert(args):
+    """ Runs in conversion processes (which do not use database) """
+    source, language, content, encoding = args
+    try:
+        return ''.join(post_process_stream(source, language, Payload(content=content, encoding=encoding)))
+    except (ValueError, AssertionError):
+        return None
+
+
+class Command(BaseCommand):
+    args = '[<datasource id> ...]'
+    help = 'Fetch all external data sources concurrently, convert them to GeoJSON\n'
+    help += 'and store them in cache, ready to be served. Run it periodically (e.g. cron).\n'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--workers',
+                    type='int',
+                    default=8,
+                    help='Number of concurrent downloads (connections).'),
+        make_option('--processes',
+                    type='int',
+                    default=None,
+                    help='Number of conversion processes (default is number of CPUs).'),
+        make_option('--timeout',
+                    type='int',
+                    default=settings.TOURISM_DATASOURCE_TIMEOUT,
+                    help='Download timeout in seconds.'),
+        make_option('--retries',
+                    type='int',
+                    default=2,
+                    help='Number of download retries.'),
+    )
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.languages = [l[0] for l in settings.MAPENTITY_CONFIG['TRANSLATED_LANGUAGES']]
+        sources = DataSource.objects.all()
+        if args:
+            sources = sources.filter(pk__in=args)
+        sources = list(sources)
+        start = time.time()
+
+        threads = ThreadPool(max(1, options['workers']))
+        downloads = threads.map(self.download, sources)
+        threads.close()
+
+        tasks = []
+        for source, helpers, entries, response, latency in downloads:
+            if response is not None and response.status_code != 304:
+                tasks.extend([(source, helper.language, response.content, response.encoding)
+                              for helper in helpers])
+        processes = Pool(options['processes'])
+        results = iter(processes.map(convert, tasks))
+        processes.close()
+        processes.join()
+
+        updated = failed = 0
+        for source, helpers, entries, response, latency in downloads:
+            if response is None:
+                status = 'failed'
+            elif response.status_code == 304:
+                # Entries read before download, missing ones are fetched again when requested
+                for helper, entry in zip(helpers, entries):
+                    if entry is not None:
+                        helper.touch(entry, latency)
+                status = 'not modified'
+            else:
+                status = 'updated'
+                for helper in helpers:
+                    content = next(results)
+                    if content is None:
+                        status = 'invalid'
+                    else:
+                        helper.store(response, latency, content, len(response.content))
+            if status in ('failed', 'invalid'):
+                failed += 1
+            else:
+                updated += 1
+            size = len(response.content) if response is not None else 0
+            self.stdout.write(u'%-40s %-12s %8.3f s %10d bytes\n' % (source.title[:40], status, latency, size))
+
+        self.stdout.write('%s source(s) refreshed, %s failed in %.3f s\n' % (updated, failed, time.time() - start))
+
+    def download(self, source):
+        """ Runs in download threads, returns entries read before download """
+        helpers = [DataSourceHelper(source, language) for language in self.languages]
+        entries = [helper.entry() for helper in helpers]
+        # Conditional request only if all languages are available
+        entry = entries[0] if None not in entries else None
+        start = time.time()
+        try:
+            response, latency = helpers[0].download(entry, timeout=self.options['timeout'],
+                                                    retries=self.options['retries'])
+        except RequestException as e:
+            self.stderr.write(u"Source '%s' cannot be downloaded: %s\n" % (source.url, e))
+            return source, helpers, entries, None, time.time() - start
+        return source, helpers, entries, response, latency
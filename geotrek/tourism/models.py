@@ -4,6 +4,10 @@ import logging
 
 from django.conf import settings
 from django.contrib.gis.db import models
+from django.core.cache import cache
+from django.db import connection
+from django.db.models.signals import post_save
+from django.dispatch import receiver
 from django.utils.translation import ugettext_lazy as _
 from django.utils.functional import lazy
 
@@ -21,7 +25,7 @@ from geotrek.common.mixins import (NoDeleteMixin, TimeStampedModelMixin,
                                    PictogramMixin, PublishableMixin,
                                    PicturesMixin)
 from geotrek.common.models import Theme
-from geotrek.common.utils import intersecting
+from geotrek.common.utils import intersecting, intersecting_in_bulk, instances_by_owner
 
 from extended_choices import Choices
 from multiselectfield import MultiSelectField
@@ -93,6 +97,13 @@ class InformationDeskType(PictogramMixin):
         return self.label
 
 
+class InformationDeskManager(models.GeoManager):
+    def layer(self):
+        """ Desks with their type, and coordinates transformed to ``API_SRID``
+        in the query """
+        return self.get_queryset().select_related('type').transform(settings.API_SRID)
+
+
 class InformationDesk(models.Model):
 
     name = models.CharField(verbose_name=_(u"Title"), max_length=256, db_column='nom')
@@ -121,6 +132,8 @@ class InformationDesk(models.Model):
                              blank=True, null=True,
                              srid=settings.SRID, spatial_index=False)
 
+    objects = InformationDeskManager()
+
     class Meta:
         db_table = 't_b_renseignement'
         verbose_name = _(u"Information desk")
@@ -146,32 +159,72 @@ class InformationDesk(models.Model):
             'pictogram': self.type.pictogram.url,
         }
 
+    @property
+    def api_geom(self):
+        if not self.geom:
+            return None
+        if self.geom.srid == settings.API_SRID:
+            # Already transformed in query (see ``InformationDeskManager.layer()``)
+            return self.geom
+        return self.geom.transform(settings.API_SRID, clone=True)
+
     @property
     def latitude(self):
-        if self.geom:
-            api_geom = self.geom.transform(settings.API_SRID, clone=True)
-            return api_geom.y
-        return None
+        api_geom = self.api_geom
+        return api_geom.y if api_geom else None
 
     @property
     def longitude(self):
-        if self.geom:
-            api_geom = self.geom.transform(settings.API_SRID, clone=True)
-            return api_geom.x
-        return None
+        api_geom = self.api_geom
+        return api_geom.x if api_geom else None
+
+    @classmethod
+    def thumbnail_cache_key(cls, pk):
+        return 'thumbnail-%s-%s-%s' % (cls._meta.app_label, cls._meta.module_name, pk)
+
+    def prepare_thumbnail(self):
+        """ Generates photo thumbnail, and keeps its URL in cache with the photo name """
+        thumb_url = None
+        if self.photo:
+            thumbnailer = get_thumbnailer(self.photo)
+            try:
+                thumb_detail = thumbnailer.get_thumbnail(aliases.get('thumbnail'))
+                thumb_url = os.path.join(settings.MEDIA_URL, thumb_detail.name)
+            except InvalidImageFormatError:
+                logger.error(_("Image %s invalid or missing from disk.") % self.photo)
+        cache.set(self.thumbnail_cache_key(self.pk), (self.photo.name or '', thumb_url))
+        return thumb_url
+
+    @classmethod
+    def prefetch_thumbnails(cls, desks):
+        """
+        Set ``photo_url`` of all given desks, read from cache at once (see
+        ``prepare_thumbnail()``). Thumbnails are only generated for desks
+        missing from cache, or whose photo has changed.
+        """
+        desks = list(desks)
+        keys = dict((desk.pk, cls.thumbnail_cache_key(desk.pk)) for desk in desks)
+        cached = cache.get_many(keys.values())
+        for desk in desks:
+            name, thumb_url = cached.get(keys[desk.pk], (None, None))
+            if name is None or name != (desk.photo.name or ''):
+                thumb_url = desk.prepare_thumbnail()
+            desk._photo_url = thumb_url
+        return desks
 
     @property
     def photo_url(self):
         if not self.photo:
             return None
-        thumbnailer = get_thumbnailer(self.photo)
-        try:
-            thumb_detail = thumbnailer.get_thumbnail(aliases.get('thumbnail'))
-            thumb_url = os.path.join(settings.MEDIA_URL, thumb_detail.name)
-        except InvalidImageFormatError:
-            thumb_url = None
-            logger.error(_("Image %s invalid or missing from disk.") % self.photo)
-        return thumb_url
+        if '_photo_url' not in self.__dict__:
+            self.prefetch_thumbnails([self])
+        return self._photo_url
+
+
+@receiver(post_save, sender=InformationDesk, dispatch_uid="informationdesk_thumbnail")
+def prepare_informationdesk_thumbnail(sender, instance, **kwargs):
+    """ Keep thumbnail ready for information desks layers """
+    instance.prepare_thumbnail()
 
 
 GEOMETRY_TYPES = Choices(
@@ -256,6 +309,65 @@ class TouristicContentType2(TouristicContentType):
         verbose_name_plural = _(u"Second list types")
 
 
+PROXIMITY_KINDS = ('TREK', 'POI')
+
+# Properties listing objects nearby, by model (see ``add_nearby_property()``)
+NEARBY_PROPERTIES = {}
+
+
+def proximity_type(model):
+    return 'topology' if issubclass(model, Topology) else model._meta.module_name
+
+
+def in_proximity_table(obj):
+    """ Whether objects close to ``obj`` are maintained by triggers """
+    return obj.pk is not None and (not isinstance(obj, Topology) or obj.kind in PROXIMITY_KINDS)
+
+
+def nearby(cls, obj):
+    """ Objects of ``cls`` closer than ``TOURISM_INTERSECTION_MARGIN`` to ``obj``, read from
+    the proximity table maintained by triggers (see ``sql/20_proximite.sql``).
+    """
+    if not in_proximity_table(obj):
+        return intersecting(cls, obj, distance=settings.TOURISM_INTERSECTION_MARGIN)
+    qn = connection.ops.quote_name
+    where = ('%s.%s IN (SELECT voisin FROM t_r_proximite WHERE objet_type = %%s AND objet = %%s'
+             ' AND voisin_type = %%s AND distance <= %%s)') % (qn(cls._meta.db_table), qn(cls._meta.pk.column))
+    params = [proximity_type(obj.__class__), obj.pk, proximity_type(cls), settings.TOURISM_INTERSECTION_MARGIN]
+    return cls.objects.extra(where=[where], params=params)
+
+
+def nearby_in_bulk(cls, objects):
+    """ Same as ``nearby()`` for several objects at once, with one query.
+    Returns lists of ``cls`` instances by object pk.
+    """
+    found = intersecting_in_bulk(cls, [obj for obj in objects if not in_proximity_table(obj)],
+                                 distance=settings.TOURISM_INTERSECTION_MARGIN)
+    objects = [obj for obj in objects if in_proximity_table(obj)]
+    if not objects:
+        return found
+    cursor = connection.cursor()
+    cursor.execute("SELECT objet, voisin FROM t_r_proximite "
+                   "WHERE objet_type = %s AND objet IN %s AND voisin_type = %s AND distance <= %s;",
+                   [proximity_type(objects[0].__class__), tuple(obj.pk for obj in objects),
+                    proximity_type(cls), settings.TOURISM_INTERSECTION_MARGIN])
+    found.update(instances_by_owner(cls.objects.all(), cursor.fetchall()))
+    return found
+
+
+def add_nearby_property(model, name, cls):
+    """ Adds ``name`` property to ``model``, listing ``cls`` objects nearby.
+    Values of many objects can be set at once with ``prefetch_nearby()``.
+    """
+    def getter(self):
+        prefetched = self.__dict__.get('_prefetched_properties', {})
+        if name in prefetched:
+            return prefetched[name]
+        return nearby(cls, self)
+    model.add_property(name, getter)
+    NEARBY_PROPERTIES.setdefault(model, []).append((name, cls))
+
+
 class TouristicContent(MapEntityMixin, PublishableMixin, StructureRelated,
                        TimeStampedModelMixin, PicturesMixin, NoDeleteMixin):
     """ A generic touristic content (accomodation, museum, etc.) in the park
@@ -295,8 +407,8 @@ class TouristicContent(MapEntityMixin, PublishableMixin, StructureRelated,
     def __unicode__(self):
         return self.name
 
-Topology.add_property('touristic_contents', lambda self: intersecting(TouristicContent, self, distance=settings.TOURISM_INTERSECTION_MARGIN))
-TouristicContent.add_property('touristic_contents', lambda self: intersecting(TouristicContent, self, distance=settings.TOURISM_INTERSECTION_MARGIN))
+add_nearby_property(Topology, 'touristic_contents', TouristicContent)
+add_nearby_property(TouristicContent, 'touristic_contents', TouristicContent)
 
 
 class TouristicEventType(models.Model):
@@ -373,7 +485,23 @@ class TouristicEvent(MapEntityMixin, PublishableMixin, StructureRelated,
     def __unicode__(self):
         return self.name
 
-TouristicEvent.add_property('touristic_contents', lambda self: intersecting(TouristicContent, self, distance=settings.TOURISM_INTERSECTION_MARGIN))
-Topology.add_property('touristic_events', lambda self: intersecting(TouristicEvent, self, distance=settings.TOURISM_INTERSECTION_MARGIN))
-TouristicContent.add_property('touristic_events', lambda self: intersecting(TouristicEvent, self, distance=settings.TOURISM_INTERSECTION_MARGIN))
-TouristicEvent.add_property('touristic_events', lambda self: intersecting(TouristicEvent, self, distance=settings.TOURISM_INTERSECTION_MARGIN))
+add_nearby_property(TouristicEvent, 'touristic_contents', TouristicContent)
+add_nearby_property(Topology, 'touristic_events', TouristicEvent)
+add_nearby_property(TouristicContent, 'touristic_events', TouristicEvent)
+add_nearby_property(TouristicEvent, 'touristic_events', TouristicEvent)
+
+
+def prefetch_nearby(objects):
+    """ Set properties listing objects nearby (see ``add_nearby_property()``) of all
+    given objects, with one query per property instead of one per object.
+    """
+    objects = list(objects)
+    if not objects:
+        return
+    properties = [prop for model, props in NEARBY_PROPERTIES.items()
+                  if isinstance(objects[0], model) for prop in props]
+    for name, cls in properties:
+        found = nearby_in_bulk(cls, objects)
+        for obj in objects:
+            # Same as ``Topology.prefetch_property()``
+            obj.__dict__.setdefault('_prefetched_properties', {})[name] = found.get(obj.pk, [])
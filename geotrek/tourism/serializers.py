@@ -1,7 +1,8 @@
 from rest_framework import serializers as rest_serializers
 
 from geotrek.common.serializers import (ThemeSerializer, PublishableSerializerMixin, PictogramSerializerMixin,
-                                        PicturesSerializerMixin, TranslatedModelSerializer)
+                                        PicturesSerializerMixin, TranslatedModelSerializer,
+                                        PrefetchPlanSerializerMixin, prefetch_pictures)
 from geotrek.zoning.serializers import ZoningSerializerMixin
 from geotrek.trekking import serializers as trekking_serializers
 from geotrek.tourism import models as tourism_models
@@ -58,8 +59,12 @@ class TouristicContentCategorySerializer(PictogramSerializerMixin, TranslatedMod
         fields = ('id', 'types', 'label', 'type1_label', 'type2_label', 'pictogram')
 
 
-class TouristicContentSerializer(PicturesSerializerMixin, PublishableSerializerMixin,
+class TouristicContentSerializer(PrefetchPlanSerializerMixin, PicturesSerializerMixin, PublishableSerializerMixin,
                                  ZoningSerializerMixin, TranslatedModelSerializer):
+    select_related = ('category',)
+    prefetch_related = ('themes', 'type1', 'type2', 'category__types')
+    batch_resolvers = (prefetch_pictures, tourism_models.prefetch_nearby)
+
     themes = ThemeSerializer(many=True)
     category = TouristicContentCategorySerializer()
     type1 = TouristicContentTypeSerializer(many=True)
@@ -97,8 +102,12 @@ class TouristicEventPublicSerializer(TranslatedModelSerializer):
         fields = ('id', 'name')
 
 
-class TouristicEventSerializer(PicturesSerializerMixin, PublishableSerializerMixin,
+class TouristicEventSerializer(PrefetchPlanSerializerMixin, PicturesSerializerMixin, PublishableSerializerMixin,
                                ZoningSerializerMixin, TranslatedModelSerializer):
+    select_related = ('type', 'public')
+    prefetch_related = ('themes',)
+    batch_resolvers = (prefetch_pictures, tourism_models.prefetch_nearby)
+
     themes = ThemeSerializer(many=True)
     type = TouristicEventTypeSerializer()
     public = TouristicEventPublicSerializer()
@@ -0,0 +1,6 @@
+-------------------------------------------------------------------------------
+-- Zones of touristic contents and events (see zoning/sql/30_objets_zones.sql)
+-------------------------------------------------------------------------------
+
+SELECT ft_objet_zone_register('touristiccontent', 't_t_contenu_touristique');
+SELECT ft_objet_zone_register('touristicevent', 't_t_evenement_touristique');
@@ -0,0 +1,108 @@
+-------------------------------------------------------------------------------
+-- Proximity of touristic contents and events
+-------------------------------------------------------------------------------
+-- Touristic contents and events, treks and POIs closer than
+-- TOURISM_INTERSECTION_MARGIN are listed in this table (both ways), maintained
+-- by triggers on both sides, instead of running ST_DWithin() for every object
+-- and relation. Pairs of topologies are not listed (see trekking relations).
+-- Distances are stored, so that smaller margins can be applied when reading.
+
+CREATE TABLE IF NOT EXISTS tourisme.t_r_proximite (
+    objet_type varchar(32) NOT NULL,
+    objet integer NOT NULL,
+    voisin_type varchar(32) NOT NULL,
+    voisin integer NOT NULL,
+    distance double precision NOT NULL
+);
+
+DROP INDEX IF EXISTS t_r_proximite_objet_idx;
+CREATE INDEX t_r_proximite_objet_idx ON tourisme.t_r_proximite (objet_type, objet, voisin_type);
+
+DROP INDEX IF EXISTS t_r_proximite_voisin_idx;
+CREATE INDEX t_r_proximite_voisin_idx ON tourisme.t_r_proximite (voisin_type, voisin);
+
+
+DROP VIEW IF EXISTS tourisme.t_v_proximite_objet;
+CREATE VIEW tourisme.t_v_proximite_objet AS (
+    SELECT 'touristiccontent'::varchar AS objet_type, id AS objet, geom FROM t_t_contenu_touristique
+    UNION ALL
+    SELECT 'touristicevent'::varchar, id, geom FROM t_t_evenement_touristique
+    UNION ALL
+    SELECT 'topology'::varchar, id, geom FROM e_t_evenement WHERE kind IN ('TREK', 'POI')
+);
+
+
+CREATE OR REPLACE FUNCTION tourisme.ft_proximite_link(otype varchar, oids integer[]) RETURNS void AS $$
+BEGIN
+    -- NULL type means all objects (no reverse pairs needed), NULL ids all objects of type
+    EXECUTE 'WITH paires AS ('
+         || '  SELECT o.objet_type, o.objet, v.objet_type AS voisin_type, v.objet AS voisin,'
+         || '         ST_Distance(o.geom, v.geom) AS distance'
+         || '  FROM t_v_proximite_objet o, t_v_proximite_objet v'
+         || '  WHERE ($1 IS NULL OR o.objet_type = $1) AND ($2 IS NULL OR o.objet = ANY($2))'
+         || '    AND NOT (o.objet_type = v.objet_type AND o.objet = v.objet)'
+         || '    AND NOT (o.objet_type = ''topology'' AND v.objet_type = ''topology'')'
+         || '    AND ST_DWithin(o.geom, v.geom, {{TOURISM_INTERSECTION_MARGIN}}))'
+         || ' INSERT INTO t_r_proximite (objet_type, objet, voisin_type, voisin, distance)'
+         || ' SELECT objet_type, objet, voisin_type, voisin, distance FROM paires'
+         || ' UNION ALL'
+         || ' SELECT voisin_type, voisin, objet_type, objet, distance FROM paires'
+         || '  WHERE $1 IS NOT NULL AND NOT (voisin_type = $1 AND ($2 IS NULL OR voisin = ANY($2)))'
+    USING otype, oids;
+END;
+$$ LANGUAGE plpgsql;
+
+
+CREATE OR REPLACE FUNCTION tourisme.ft_proximite_rebuild() RETURNS integer AS $$
+DECLARE
+    t_count integer;
+BEGIN
+    DELETE FROM t_r_proximite;
+    PERFORM ft_proximite_link(NULL, NULL);
+    SELECT count(*) FROM t_r_proximite INTO t_count;
+    RETURN t_count;
+END;
+$$ LANGUAGE plpgsql;
+
+
+-------------------------------------------------------------------------------
+-- Sync when objects are modified
+-------------------------------------------------------------------------------
+
+CREATE OR REPLACE FUNCTION tourisme.proximite_iud() RETURNS trigger AS $$
+DECLARE
+    otype varchar := TG_ARGV[0];
+BEGIN
+    IF TG_OP != 'INSERT' THEN
+        DELETE FROM t_r_proximite WHERE objet_type = otype AND objet = OLD.id;
+        DELETE FROM t_r_proximite WHERE voisin_type = otype AND voisin = OLD.id;
+    END IF;
+    IF TG_OP != 'DELETE' THEN
+        PERFORM ft_proximite_link(otype, ARRAY[NEW.id]);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS t_t_contenu_touristique_proximite_iud_tgr ON t_t_contenu_touristique;
+CREATE TRIGGER t_t_contenu_touristique_proximite_iud_tgr
+AFTER INSERT OR UPDATE OF geom OR DELETE ON t_t_contenu_touristique
+FOR EACH ROW EXECUTE PROCEDURE proximite_iud('touristiccontent');
+
+DROP TRIGGER IF EXISTS t_t_evenement_touristique_proximite_iud_tgr ON t_t_evenement_touristique;
+CREATE TRIGGER t_t_evenement_touristique_proximite_iud_tgr
+AFTER INSERT OR UPDATE OF geom OR DELETE ON t_t_evenement_touristique
+FOR EACH ROW EXECUTE PROCEDURE proximite_iud('touristicevent');
+
+-- Topologies geometries are computed by triggers when their paths change
+DROP TRIGGER IF EXISTS e_t_evenement_proximite_iud_tgr ON e_t_evenement;
+CREATE TRIGGER e_t_evenement_proximite_iud_tgr
+AFTER INSERT OR UPDATE OF geom OR DELETE ON e_t_evenement
+FOR EACH ROW EXECUTE PROCEDURE proximite_iud('topology');
+
+
+-------------------------------------------------------------------------------
+-- (Re)build with current margin
+-------------------------------------------------------------------------------
+
+SELECT ft_proximite_rebuild();
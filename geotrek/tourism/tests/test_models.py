@@ -1,10 +1,12 @@
 from django.test import TestCase
 from django.conf import settings
+from django.db import connection
 from django.test.utils import override_settings
 
 from geotrek.core import factories as core_factories
 from geotrek.tourism import factories as tourism_factories
 from geotrek.trekking import factories as trekking_factories
+from geotrek.tourism.models import TouristicContent, TouristicEvent, prefetch_nearby
 
 
 class TourismRelations(TestCase):
@@ -60,3 +62,35 @@ class TourismRelations(TestCase):
         self.assertNotIn(self.content, self.poi.touristic_contents.all())
         self.assertNotIn(self.event, self.trek.touristic_events.all())
         self.assertNotIn(self.event, self.poi.touristic_events.all())
+
+    def test_spatial_links_follow_geometry_changes(self):
+        self.content.geom = 'SRID=%s;POINT(5000 5000)' % settings.SRID
+        self.content.save()
+        self.assertNotIn(self.content, self.trek.touristic_contents.all())
+        self.assertNotIn(self.trek, self.content.treks.all())
+        self.assertNotIn(self.content2, self.content.touristic_contents.all())
+        self.assertNotIn(self.content, self.event.touristic_contents.all())
+        self.content.geom = 'SRID=%s;POINT(1 1)' % settings.SRID
+        self.content.save()
+        self.assertIn(self.content, self.trek.touristic_contents.all())
+        self.assertIn(self.content, self.event.touristic_contents.all())
+
+    def test_spatial_links_are_removed_with_objects(self):
+        pk = self.event.pk
+        TouristicEvent.objects.filter(pk=pk).delete()
+        cursor = connection.cursor()
+        cursor.execute("SELECT count(*) FROM t_r_proximite WHERE "
+                       "(objet_type = 'touristicevent' AND objet = %s) OR "
+                       "(voisin_type = 'touristicevent' AND voisin = %s)", [pk, pk])
+        self.assertEqual(cursor.fetchone()[0], 0)
+
+    def test_spatial_links_prefetched_in_bulk(self):
+        contents = list(TouristicContent.objects.filter(pk__in=[self.content.pk, self.content2.pk]))
+        with self.assertNumQueries(8):
+            prefetch_nearby(contents)
+        with self.assertNumQueries(0):
+            for content in contents:
+                self.assertIn(self.trek, content.treks)
+                self.assertIn(self.poi, content.pois)
+                self.assertIn(self.event, content.touristic_events)
+        self.assertIn(self.content2, contents[0].touristic_contents + contents[1].touristic_contents)
@@ -1,12 +1,17 @@
 # -*- coding: utf-8 -*-
 import os
 import json
+import threading
+from StringIO import StringIO
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
 
 import mock
 from requests.exceptions import ConnectionError
 from django.contrib.auth.models import Group
 from django.core.urlresolvers import reverse
 from django.conf import settings
+from django.core.cache import get_cache
+from django.core.management import call_command
 from django.test.utils import override_settings
 
 from geotrek.authent.factories import StructureFactory, UserProfileFactory
@@ -17,7 +22,10 @@ from geotrek.trekking import factories as trekking_factories
 from geotrek.zoning import factories as zoning_factories
 from geotrek.common import factories as common_factories
 from geotrek.common.utils.testdata import get_dummy_uploaded_image
-from geotrek.tourism.models import DATA_SOURCE_TYPES
+from geotrek.tourism.models import DATA_SOURCE_TYPES, InformationDesk
+from geotrek.tourism.management.commands.refresh_datasources import Command as RefreshCommand
+from geotrek.tourism.helpers import (DataSourceHelper, sitra_to_geojson,
+                                     sitra_features, serialize_features)
 from geotrek.tourism.factories import (DataSourceFactory,
                                        InformationDeskFactory,
                                        TouristicContentFactory,
@@ -76,6 +84,13 @@ class DataSourceListViewTests(TrekkingManagerTest):
                          u'/api/datasource/datasource-%s.geojson' % self.source.id)
 
 
+# Data sources responses are cached in memory, and dropped after each test
+datasources_cache = override_settings(CACHES={'default': settings.CACHES['default'],
+                                              'fat': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                                                      'LOCATION': 'datasources'}})
+
+
+@datasources_cache
 class DataSourceViewTests(TrekkingManagerTest):
     def setUp(self):
         self.source = DataSourceFactory.create(type=DATA_SOURCE_TYPES.GEOJSON)
@@ -83,16 +98,29 @@ class DataSourceViewTests(TrekkingManagerTest):
         self.login()
 
     def tearDown(self):
+        get_cache('fat').clear()
         self.client.logout()
 
     def test_source_is_fetched_upon_view_call(self):
         with mock.patch('requests.get') as mocked:
+            mocked().headers = {}
             mocked().text = '{}'
             self.client.get(self.url)
-            mocked.assert_called_with(self.source.url)
+            self.assertEqual(mocked.call_args[0][0], self.source.url)
+            self.assertEqual(mocked.call_args[1]['timeout'], settings.TOURISM_DATASOURCE_TIMEOUT)
+
+    def test_source_with_non_ascii_url(self):
+        self.source.url = u'http://example.com/données.geojson'
+        self.source.save()
+        with mock.patch('requests.get') as mocked:
+            mocked().headers = {}
+            mocked().text = '{}'
+            response = self.client.get(self.url)
+            self.assertEqual(response.status_code, 200)
 
     def test_empty_source_response_return_empty_data(self):
         with mock.patch('requests.get') as mocked:
+            mocked().headers = {}
             mocked().text = '{}'
             response = self.client.get(self.url)
             self.assertEqual(response.status_code, 200)
@@ -101,6 +129,7 @@ class DataSourceViewTests(TrekkingManagerTest):
 
     def test_source_is_returned_as_geojson_when_invalid_geojson(self):
         with mock.patch('requests.get') as mocked:
+            mocked().headers = {}
             mocked().text = '{"bar": "foo"}'
             response = self.client.get(self.url)
             geojson = json.loads(response.content)
@@ -109,6 +138,7 @@ class DataSourceViewTests(TrekkingManagerTest):
 
     def test_source_is_returned_as_geojson_when_invalid_response(self):
         with mock.patch('requests.get') as mocked:
+            mocked().headers = {}
             mocked().text = '404 page not found'
             response = self.client.get(self.url)
             geojson = json.loads(response.content)
@@ -124,6 +154,119 @@ class DataSourceViewTests(TrekkingManagerTest):
             self.assertEqual(geojson['features'], [])
 
 
+class StandInSourceHandler(BaseHTTPRequestHandler):
+    body = '{"type": "FeatureCollection", "features": [{"type": "Feature", "geometry": null, "properties": {}}]}'
+    etag = '"v1"'
+    requests = []
+
+    def do_GET(self):
+        self.requests.append(dict(self.headers))
+        if self.headers.get('If-None-Match') == self.etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('ETag', self.etag)
+        self.send_header('Content-Type', 'application/json')
+        self.end_headers()
+        self.wfile.write(self.body)
+
+    def log_message(self, *args):
+        pass
+
+
+@datasources_cache
+class DataSourceRefreshTests(TrekkingManagerTest):
+    def setUp(self):
+        StandInSourceHandler.requests = []
+        self.server = HTTPServer(('127.0.0.1', 0), StandInSourceHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        url = 'http://127.0.0.1:%s/source.geojson' % self.server.server_port
+        self.source = DataSourceFactory.create(type=DATA_SOURCE_TYPES.GEOJSON, url=url)
+        self.url = reverse('tourism:datasource_geojson', kwargs={'pk': self.source.pk})
+        self.login()
+
+    def tearDown(self):
+        self.stop_server()
+        get_cache('fat').clear()
+        self.client.logout()
+
+    def stop_server(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def test_result_is_served_from_cache_while_fresh(self):
+        for i in range(3):
+            response = self.client.get(self.url)
+            self.assertEqual(len(json.loads(response.content)['features']), 1)
+        self.assertEqual(len(StandInSourceHandler.requests), 1)
+
+    def test_latency_and_size_are_recorded(self):
+        helper = DataSourceHelper(self.source, 'en')
+        helper.get()
+        entry = helper.entry()
+        self.assertEqual(entry['size'], len(StandInSourceHandler.body))
+        self.assertTrue(entry['latency'] > 0)
+        self.assertEqual(entry['etag'], '"v1"')
+
+    def test_refresh_is_conditional(self):
+        helper = DataSourceHelper(self.source, 'en')
+        helper.get()
+        entry = helper.refresh()
+        self.assertEqual(StandInSourceHandler.requests[-1].get('if-none-match'), '"v1"')
+        self.assertEqual(entry['size'], 0)
+        self.assertEqual(len(json.loads(entry['content'])['features']), 1)
+
+    def test_stale_result_is_served_while_refreshing(self):
+        helper = DataSourceHelper(self.source, 'en')
+        helper.get()
+        with self.settings(CACHE_TIMEOUT_TOURISM_DATASOURCES=-1):
+            with mock.patch.object(DataSourceHelper, 'refresh_async') as mocked:
+                result = helper.get()
+                self.assertEqual(mocked.call_count, 1)
+        self.assertEqual(len(result['features']), 1)
+        self.assertEqual(len(StandInSourceHandler.requests), 1)
+
+    def test_last_good_result_is_kept_when_source_fails(self):
+        helper = DataSourceHelper(self.source, 'en')
+        helper.get()
+        self.stop_server()
+        entry = helper.refresh()
+        self.assertEqual(len(json.loads(entry['content'])['features']), 1)
+
+    def test_all_sources_are_refreshed_by_command(self):
+        output = StringIO()
+        call_command('refresh_datasources', workers=2, processes=1, stdout=output)
+        self.assertIn('1 source(s) refreshed, 0 failed', output.getvalue())
+        self.assertIn('updated', output.getvalue())
+        for language, name in settings.MAPENTITY_CONFIG['TRANSLATED_LANGUAGES']:
+            entry = DataSourceHelper(self.source, language).entry()
+            self.assertEqual(len(json.loads(entry['content'])['features']), 1)
+        call_command('refresh_datasources', stdout=output)
+        self.assertIn('not modified', output.getvalue())
+
+    def test_entries_evicted_while_refreshing_are_kept(self):
+        call_command('refresh_datasources', processes=1, stdout=StringIO())
+        download = RefreshCommand.download
+
+        def evicting_download(command, source):
+            result = download(command, source)
+            get_cache('fat').clear()
+            return result
+
+        output = StringIO()
+        with mock.patch.object(RefreshCommand, 'download', evicting_download):
+            call_command('refresh_datasources', processes=1, stdout=output)
+        self.assertIn('not modified', output.getvalue())
+        self.assertNotEqual(DataSourceHelper(self.source, 'en').entry(), None)
+        self.assertEqual(len(StandInSourceHandler.requests), 2)
+
+
+@datasources_cache
 class DataSourceTourInFranceViewTests(TrekkingManagerTest):
     def setUp(self):
         here = os.path.dirname(__file__)
@@ -135,10 +278,12 @@ class DataSourceTourInFranceViewTests(TrekkingManagerTest):
         self.login()
 
     def tearDown(self):
+        get_cache('fat').clear()
         self.client.logout()
 
     def test_source_is_returned_as_geojson_when_tourinfrance(self):
         with mock.patch('requests.get') as mocked:
+            mocked().headers = {}
             mocked().text = "<xml></xml>"
             response = self.client.get(self.url)
             geojson = json.loads(response.content)
@@ -146,6 +291,7 @@ class DataSourceTourInFranceViewTests(TrekkingManagerTest):
 
     def test_source_is_returned_in_language_request(self):
         with mock.patch('requests.get') as mocked:
+            mocked().headers = {}
             mocked().text = self.sample
             response = self.client.get(self.url, HTTP_ACCEPT_LANGUAGE='es-ES')
             geojson = json.loads(response.content)
@@ -154,6 +300,7 @@ class DataSourceTourInFranceViewTests(TrekkingManagerTest):
                              u'Ubicada en la región minera del Aveyron, nuestra casa rural os permitirá decubrir la naturaleza y el patrimonio industrial de la cuenca de Aubin y Decazeville.')
 
 
+@datasources_cache
 class DataSourceSitraViewTests(TrekkingManagerTest):
     def setUp(self):
         here = os.path.dirname(__file__)
@@ -165,18 +312,21 @@ class DataSourceSitraViewTests(TrekkingManagerTest):
         self.login()
 
     def tearDown(self):
+        get_cache('fat').clear()
         self.client.logout()
 
     def test_source_is_returned_as_geojson_when_sitra(self):
         with mock.patch('requests.get') as mocked:
-            mocked().text = "{}"
+            mocked().headers = {}
+            mocked().iter_content.return_value = ["{}"]
             response = self.client.get(self.url)
             geojson = json.loads(response.content)
             self.assertEqual(geojson['type'], 'FeatureCollection')
 
     def test_source_is_returned_in_language_request(self):
         with mock.patch('requests.get') as mocked:
-            mocked().text = self.sample
+            mocked().headers = {}
+            mocked().iter_content.return_value = [self.sample]
             response = self.client.get(self.url, HTTP_ACCEPT_LANGUAGE='es-ES')
             geojson = json.loads(response.content)
             feature = geojson['features'][0]
@@ -185,7 +335,8 @@ class DataSourceSitraViewTests(TrekkingManagerTest):
 
     def test_default_language_is_returned_when_not_available(self):
         with mock.patch('requests.get') as mocked:
-            mocked().text = self.sample
+            mocked().headers = {}
+            mocked().iter_content.return_value = [self.sample]
             response = self.client.get(self.url, HTTP_ACCEPT_LANGUAGE='es-ES')
             geojson = json.loads(response.content)
             feature = geojson['features'][0]
@@ -194,7 +345,8 @@ class DataSourceSitraViewTests(TrekkingManagerTest):
 
     def test_website_can_be_obtained(self):
         with mock.patch('requests.get') as mocked:
-            mocked().text = self.sample
+            mocked().headers = {}
+            mocked().iter_content.return_value = [self.sample]
             response = self.client.get(self.url, HTTP_ACCEPT_LANGUAGE='es-ES')
             geojson = json.loads(response.content)
             feature = geojson['features'][0]
@@ -203,7 +355,8 @@ class DataSourceSitraViewTests(TrekkingManagerTest):
 
     def test_phone_can_be_obtained(self):
         with mock.patch('requests.get') as mocked:
-            mocked().text = self.sample
+            mocked().headers = {}
+            mocked().iter_content.return_value = [self.sample]
             response = self.client.get(self.url, HTTP_ACCEPT_LANGUAGE='es-ES')
             geojson = json.loads(response.content)
             feature = geojson['features'][0]
@@ -212,7 +365,8 @@ class DataSourceSitraViewTests(TrekkingManagerTest):
 
     def test_geometry_as_geojson(self):
         with mock.patch('requests.get') as mocked:
-            mocked().text = self.sample
+            mocked().headers = {}
+            mocked().iter_content.return_value = [self.sample]
             response = self.client.get(self.url, HTTP_ACCEPT_LANGUAGE='es-ES')
             geojson = json.loads(response.content)
             feature = geojson['features'][0]
@@ -222,7 +376,8 @@ class DataSourceSitraViewTests(TrekkingManagerTest):
 
     def test_list_of_pictures(self):
         with mock.patch('requests.get') as mocked:
-            mocked().text = self.sample
+            mocked().headers = {}
+            mocked().iter_content.return_value = [self.sample]
             response = self.client.get(self.url, HTTP_ACCEPT_LANGUAGE='es-ES')
             geojson = json.loads(response.content)
             feature = geojson['features'][0]
@@ -231,6 +386,17 @@ class DataSourceSitraViewTests(TrekkingManagerTest):
                                   u'legend': u'Refuges en Valgaudemar',
                                   u'url': u'http://static.sitra-tourisme.com/filestore/objets-touristiques/images/600938.jpg'})
 
+    def test_streamed_conversion_is_same_as_whole(self):
+        objects = json.loads(self.sample)['objetsTouristiques']
+        expected = json.loads(json.dumps(sitra_to_geojson(objects, 'es')))
+        chunks = [self.sample[i:i + 100] for i in range(0, len(self.sample), 100)]
+        streamed = json.loads(''.join(serialize_features(sitra_features(chunks, 'es'))))
+        self.assertEqual(streamed, expected)
+
+    def test_truncated_payload_is_invalid(self):
+        with self.assertRaises(ValueError):
+            list(sitra_features([self.sample[:len(self.sample) / 2]], 'es'))
+
 
 class InformationDeskViewsTests(TrekkingManagerTest):
     def setUp(self):
@@ -247,6 +413,26 @@ class InformationDeskViewsTests(TrekkingManagerTest):
         records = json.loads(response.content)
         self.assertEqual(len(records['features']), 10)
 
+    def test_geojson_layer_coordinates_are_in_api_srid(self):
+        desk = InformationDesk.objects.all()[0]
+        api_geom = desk.geom.transform(settings.API_SRID, clone=True)
+        response = self.client.get(self.url)
+        record = [f for f in json.loads(response.content)['features'] if f['properties']['id'] == desk.pk][0]
+        self.assertAlmostEqual(record['properties']['longitude'], api_geom.x)
+        self.assertAlmostEqual(record['properties']['latitude'], api_geom.y)
+        self.assertAlmostEqual(record['geometry']['coordinates'][0], api_geom.x, places=5)
+
+    def test_geojson_layer_reads_thumbnails_from_cache(self):
+        with mock.patch('geotrek.tourism.models.cache', get_cache('django.core.cache.backends.locmem.LocMemCache',
+                                                                  LOCATION='desks')):
+            for desk in InformationDesk.objects.all():
+                desk.prepare_thumbnail()
+            with mock.patch.object(InformationDesk, 'prepare_thumbnail') as prepare_thumbnail:
+                response = self.client.get(self.url)
+            self.assertFalse(prepare_thumbnail.called)
+        records = json.loads(response.content)
+        self.assertTrue(all(f['properties']['photo_url'] for f in records['features']))
+
 
 class TouristicContentViewsSameStructureTests(AuthentFixturesTest):
     def setUp(self):
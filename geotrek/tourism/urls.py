@@ -24,7 +24,7 @@ class TouristicContentEntityOptions(PublishableEntityOptions):
         return tourism_serializers.TouristicContentSerializer
 
     def get_queryset(self):
-        return self.model.objects.existing()
+        return tourism_serializers.TouristicContentSerializer.prefetch_queryset(self.model.objects.existing())
 
 if settings.TOURISM_ENABLED:
     urlpatterns += registry.register(models.TouristicContent, TouristicContentEntityOptions)
@@ -35,7 +35,7 @@ class TouristicEventEntityOptions(PublishableEntityOptions):
         return tourism_serializers.TouristicEventSerializer
 
     def get_queryset(self):
-        return self.model.objects.existing()
+        return tourism_serializers.TouristicEventSerializer.prefetch_queryset(self.model.objects.existing())
 
 if settings.TOURISM_ENABLED:
     urlpatterns += registry.register(models.TouristicEvent, TouristicEventEntityOptions)
@@ -1,13 +1,10 @@
 import logging
 
-import requests
-from requests.exceptions import RequestException
-import geojson
 from djgeojson.views import GeoJSONLayerView
 from django.conf import settings
+from django.http import HttpResponse
 from django.views.generic.list import ListView
 from django.views.generic.detail import DetailView
-from django.views.decorators.cache import cache_page
 from django.contrib.auth.decorators import login_required
 from django.utils.decorators import method_decorator
 from mapentity.views import (JSONResponseMixin, MapEntityCreate,
@@ -17,11 +14,12 @@ from rest_framework import generics as rest_generics
 from rest_framework import permissions as rest_permissions
 
 from geotrek.authent.decorators import same_structure_required
+from geotrek.common.views import FlattenPicturesMixin
 from geotrek.tourism.models import DataSource, InformationDesk
 
 from .filters import TouristicContentFilterSet, TouristicEventFilterSet
 from .forms import TouristicContentForm, TouristicEventForm
-from .helpers import post_process
+from .helpers import DataSourceHelper
 from .models import TouristicContent, TouristicEvent, TouristicContentCategory
 from .serializers import TouristicContentCategorySerializer
 
@@ -51,28 +49,14 @@ class DataSourceList(JSONResponseMixin, ListView):
         return super(DataSourceList, self).dispatch(*args, **kwargs)
 
 
-class DataSourceGeoJSON(JSONResponseMixin, DetailView):
+class DataSourceGeoJSON(DetailView):
     model = DataSource
 
-    def get_context_data(self, *args, **kwargs):
-        source = self.get_object()
-
-        default_result = geojson.FeatureCollection(features=[])
-
-        try:
-            response = requests.get(source.url)
-        except RequestException as e:
-            logger.error(u"Source '%s' cannot be downloaded" % source.url)
-            logger.exception(e)
-            return default_result
-
-        try:
-            return post_process(source, self.request.LANGUAGE_CODE, response.text)
-        except (ValueError, AssertionError) as e:
-            return default_result
+    def render_to_response(self, context, **response_kwargs):
+        content = DataSourceHelper(self.object, self.request.LANGUAGE_CODE).get()
+        return HttpResponse(content, content_type='application/json')
 
     @method_decorator(login_required)
-    @method_decorator(cache_page(settings.CACHE_TIMEOUT_TOURISM_DATASOURCES, cache="fat"))
     def dispatch(self, *args, **kwargs):
         return super(DataSourceGeoJSON, self).dispatch(*args, **kwargs)
 
@@ -100,6 +84,10 @@ class InformationDeskGeoJSON(GeoJSONLayerView):
     def dispatch(self, *args, **kwargs):
         return super(InformationDeskGeoJSON, self).dispatch(*args, **kwargs)
 
+    def get_queryset(self):
+        # Coordinates are transformed in query, thumbnails read from cache
+        return InformationDesk.prefetch_thumbnails(InformationDesk.objects.layer())
+
 
 class TouristicContentCategoryJSONList(rest_generics.ListAPIView):
     model = TouristicContentCategory
@@ -112,7 +100,7 @@ class TouristicContentLayer(MapEntityLayer):
     properties = ['name']
 
 
-class TouristicContentList(MapEntityList):
+class TouristicContentList(FlattenPicturesMixin, MapEntityList):
     queryset = TouristicContent.objects.existing()
     filterform = TouristicContentFilterSet
     columns = ['id', 'name', 'category']
@@ -171,7 +159,7 @@ class TouristicEventLayer(MapEntityLayer):
     properties = ['name']
 
 
-class TouristicEventList(MapEntityList):
+class TouristicEventList(FlattenPicturesMixin, MapEntityList):
     queryset = TouristicEvent.objects.existing()
     filterform = TouristicEventFilterSet
     columns = ['id', 'name', 'type']
@@ -0,0 +1,348 @@
+import os
+import json
+import glob
+import hashlib
+import logging
+import zipfile
+from StringIO import StringIO
+
+from django.conf import settings
+from django.core.cache import get_cache
+from django.db import connection
+from django.utils import translation
+from rest_framework.renderers import JSONRenderer
+
+
+logger = logging.getLogger(__name__)
+
+
+class SnapshotHelper(object):
+    """ Renders public JSON documents of published objects into files on disk,
+    one per object and language, plus a GeoJSON collection per language.
+
+    An object is rendered again only when its version changed, i.e. the most
+    recent update of the object itself and of the objects it embeds, and the
+    list of these objects (given by ``dependencies``, callables returning
+    ``(pk, date_update, embedded pks)`` rows for all objects or the given pks).
+    """
+    FORMATS = ('json', 'geojson')
+
+    def __init__(self, model, serializer_class, dependencies=None):
+        self.model = model
+        self.serializer_class = serializer_class
+        self.dependencies = dependencies or []
+        self.name = model._meta.module_name
+
+    @classmethod
+    def languages(cls):
+        return [l[0] for l in settings.MAPENTITY_CONFIG['TRANSLATED_LANGUAGES']]
+
+    @property
+    def root(self):
+        return os.path.join(settings.PUBLIC_SNAPSHOTS_ROOT, self.name)
+
+    def path(self, lang, pk=None, fmt='json'):
+        if pk is None:
+            return os.path.join(self.root, lang, '%ss.geojson' % self.name)
+        return os.path.join(self.root, lang, '%s.%s' % (pk, fmt))
+
+    def write(self, path, content):
+        dirname = os.path.dirname(path)
+        if not os.path.exists(dirname):
+            try:
+                os.makedirs(dirname)
+            except OSError:  # Created meanwhile by another process
+                pass
+        tmp_path = '%s.%s.tmp' % (path, os.getpid())
+        with open(tmp_path, 'wb') as f:
+            f.write(content)
+        os.rename(tmp_path, path)
+
+    def remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.root, 'versions.json')
+
+    def manifest(self):
+        try:
+            with open(self.manifest_path, 'rb') as f:
+                return dict((int(pk), version) for pk, version in json.load(f).items())
+        except (IOError, ValueError):
+            return {}
+
+    def versions(self, pks=None):
+        """ Returns current version of all existing objects, or the given ones """
+        queryset = self.model.objects.existing()
+        if pks is not None:
+            queryset = queryset.filter(pk__in=pks)
+        updates = dict(queryset.values_list('pk', 'date_update'))
+        # Removing an embedded object changes the version too
+        embedded = {}
+        for i, dependency in enumerate(self.dependencies):
+            for pk, date_update, dependency_pks in dependency(pks):
+                if pk not in updates:
+                    continue
+                if date_update is not None:
+                    updates[pk] = max(updates[pk], date_update)
+                embedded.setdefault(pk, []).append((i, sorted(dependency_pks)))
+        versions = {}
+        for pk, date_update in updates.items():
+            versions[pk] = date_update.isoformat()
+            if pk in embedded:
+                versions[pk] += '-%s' % hashlib.md5(json.dumps(embedded[pk])).hexdigest()
+        return versions
+
+    def render(self, obj):
+        """ Returns JSON document and GeoJSON feature of object, in current language """
+        data = self.serializer_class(obj).data
+        geometry = obj.geom.transform(settings.API_SRID, clone=True).json if obj.geom else 'null'
+        document = JSONRenderer().render(data)
+        feature = '{"type": "Feature", "id": %s, "geometry": %s, "properties": %s}' % (obj.pk, geometry, document)
+        return document, feature
+
+    def publish_object(self, obj, lang):
+        if obj.published:
+            document, feature = self.render(obj)
+            self.write(self.path(lang, obj.pk, 'json'), document)
+            self.write(self.path(lang, obj.pk, 'geojson'), feature)
+        else:
+            for fmt in self.FORMATS:
+                self.remove(self.path(lang, obj.pk, fmt))
+
+    def publish_collection(self, lang):
+        features = []
+        for path in sorted(glob.glob(os.path.join(self.root, lang, '*.geojson'))):
+            if os.path.basename(path)[:-len('.geojson')].isdigit():
+                with open(path, 'rb') as f:
+                    features.append(f.read())
+        content = '{"type": "FeatureCollection", "features": [%s]}' % ', '.join(features)
+        self.write(self.path(lang), content)
+
+    def publish(self, force=False):
+        """ Renders objects whose version changed since last publication,
+        and removes deleted ones. Returns numbers of rendered and removed objects.
+        """
+        versions = self.versions()
+        manifest = self.manifest()
+        changed = [pk for pk, version in versions.items() if force or manifest.get(pk) != version]
+        removed = [pk for pk in manifest if pk not in versions]
+        if not changed and not removed:
+            return 0, 0
+
+        queryset = self.model.objects.existing().filter(pk__in=changed)
+        objects = self.serializer_class.prefetch_objects(self.serializer_class.prefetch_queryset(queryset))
+        for lang in self.languages():
+            with translation.override(lang):
+                for obj in objects:
+                    self.publish_object(obj, lang)
+            for pk in removed:
+                for fmt in self.FORMATS:
+                    self.remove(self.path(lang, pk, fmt))
+            self.publish_collection(lang)
+
+        self.write(self.manifest_path, json.dumps(versions))
+        return len(changed), len(removed)
+
+    def get(self, lang, pk=None, fmt='json'):
+        """ Returns path of published document, rendering it if missing or
+        if its dependencies changed. Returns ``None`` if object does not exist
+        or is not published.
+        """
+        path = self.path(lang, pk, fmt)
+        if pk is None:
+            self.publish()
+            if not os.path.exists(path):
+                self.publish_collection(lang)
+            return path
+        pk = int(pk)
+        version = self.versions([pk]).get(pk)
+        if version is None:
+            return None
+        manifest = self.manifest()
+        if manifest.get(pk) == version and os.path.exists(path):
+            return path
+        obj = self.model.objects.existing().get(pk=pk)
+        # Manifest versions are shared by languages
+        for other in self.languages():
+            with translation.override(other):
+                self.publish_object(obj, other)
+            self.publish_collection(other)
+        manifest[pk] = version
+        self.write(self.manifest_path, json.dumps(manifest))
+        return path if os.path.exists(path) else None
+
+    def invalidate(self, pk):
+        """ Drops documents of object, they will be rendered again on next
+        publication, or on request.
+        """
+        for lang in self.languages():
+            for fmt in self.FORMATS:
+                self.remove(self.path(lang, pk, fmt))
+            self.remove(self.path(lang))
+        manifest = self.manifest()
+        if manifest.pop(pk, None) is not None:
+            self.write(self.manifest_path, json.dumps(manifest))
+        logger.info("Invalidated %s %s snapshots." % (self.name, pk))
+
+
+class TrekExportHelper(object):
+    """ Renders GPX and KML exports of treks, cached in the fat cache
+    per language until the trek or its POIs are modified or removed.
+    """
+    CONTENT_TYPES = {
+        'gpx': 'application/gpx+xml',
+        'kml': 'application/vnd.google-earth.kml+xml',
+    }
+
+    def __init__(self, fmt):
+        self.fmt = fmt
+        self.content_type = self.CONTENT_TYPES[fmt]
+        self.cache = get_cache('fat')
+
+    @classmethod
+    def version(cls, trek, pois=None):
+        """ Returns latest update of trek and its POIs, and POIs pks.
+        ``pois`` gives latest update and pks of trek POIs, if already known.
+        """
+        if pois is None:
+            pois = list(trek.pois)
+            pois = (max([poi.date_update for poi in pois]) if pois else None, [poi.pk for poi in pois])
+        date_update, pks = pois
+        latest = trek.date_update if date_update is None else max(trek.date_update, date_update)
+        return latest, sorted(pks)
+
+    def cache_key(self, trek, version):
+        latest, pks = version
+        # Removing a POI changes the key too
+        return 'trek_%s_%s_%s_%s_%s' % (self.fmt, trek.pk, translation.get_language(),
+                                        latest.strftime('%y%m%d%H%M%S%f'),
+                                        hashlib.md5(','.join(str(pk) for pk in pks)).hexdigest())
+
+    def render(self, trek):
+        if self.fmt == 'kml':
+            content = trek.kml()
+        else:
+            from .serializers import TrekGPXSerializer
+            stream = StringIO()
+            TrekGPXSerializer().serialize([trek], stream=stream, geom_field='geom')
+            content = stream.getvalue()
+        if isinstance(content, unicode):
+            content = content.encode('utf-8')
+        return content
+
+    def get(self, trek, version=None):
+        if version is None:
+            version = self.version(trek)
+        key = self.cache_key(trek, version)
+        content = self.cache.get(key)
+        if content is None:
+            content = self.render(trek)
+            self.cache.set(key, content)
+        return content
+
+    def archive_key(self, treks):
+        """ Returns cache key of the zip of exports of given treks, and their versions """
+        pois = dict((tid, (date_update, pids)) for tid, date_update, pids in trek_pois_updates())
+        versions = dict((trek.pk, self.version(trek, pois.get(trek.pk, (None, [])))) for trek in treks)
+        key = hashlib.md5('|'.join([self.cache_key(trek, versions[trek.pk]) for trek in treks])).hexdigest()
+        return 'trek_%s_archive_%s' % (self.fmt, key), versions
+
+    def archive(self, treks, key, versions):
+        """ Returns a zip of exports of given treks (see ``archive_key()``).
+        Only modified treks are rendered again.
+        """
+        content = self.cache.get(key)
+        if content is None:
+            stream = StringIO()
+            with zipfile.ZipFile(stream, 'w', zipfile.ZIP_DEFLATED) as archive:
+                for trek in treks:
+                    archive.writestr('trek-%s.%s' % (trek.pk, self.fmt), self.get(trek, versions[trek.pk]))
+            content = stream.getvalue()
+            self.cache.set(key, content)
+        return content
+
+
+def nearby_updates(model, others, distance):
+    """ Returns ``(pk, date_update, pks)`` of objects ``others`` close to ``model`` objects,
+    read from the tourism proximity table (see ``tourism/sql/20_proximite.sql``).
+    """
+    def dependency(pks=None):
+        sql = """
+        SELECT e.id, max(o.date_update), array_agg(o.id)
+        FROM e_t_evenement e, t_r_proximite p, {table} o
+        WHERE e.kind = %s AND NOT e.supprime AND NOT o.supprime
+          AND p.objet_type = 'topology' AND p.objet = e.id
+          AND p.voisin_type = %s AND p.voisin = o.id AND p.distance <= %s
+        """.format(table=connection.ops.quote_name(others._meta.db_table))
+        params = [model.KIND, others._meta.module_name, distance]
+        if pks is not None:
+            sql += " AND e.id = ANY(%s)"
+            params.append(list(pks))
+        cursor = connection.cursor()
+        cursor.execute(sql + " GROUP BY e.id;", params)
+        return cursor.fetchall()
+    return dependency
+
+
+def grouped_updates(rows):
+    """ Groups ``(pk, date_update, embedded pk)`` rows by pk, like dependencies of ``SnapshotHelper`` """
+    dates = {}
+    embedded = {}
+    for pk, date_update, embedded_pk in rows:
+        dates.setdefault(pk, []).append(date_update)
+        embedded.setdefault(pk, []).append(embedded_pk)
+    return [(pk, max(dates[pk]), embedded[pk]) for pk in dates]
+
+
+def trek_pois_updates(pks=None):
+    """ Returns ``(trek pk, date_update, pks)`` of POIs along every trek, or the given ones """
+    from .models import POI
+
+    pairs = POI.treks_pairs(treks=pks)
+    updates = dict(POI.objects.existing().filter(pk__in=set(pid for pid, tid in pairs))
+                                         .values_list('pk', 'date_update'))
+    return grouped_updates([(tid, updates[pid], pid) for pid, tid in pairs if pid in updates])
+
+
+def trek_desks_updates(pks=None):
+    """ Returns ``(trek pk, None, pks)`` of information desks of every trek, or the given ones.
+    Desks have no update date, treks are invalidated when desks are saved.
+    """
+    from .models import Trek
+
+    queryset = Trek.information_desks.through.objects.all()
+    if pks is not None:
+        queryset = queryset.filter(trek__in=pks)
+    return grouped_updates([(tid, None, did) for tid, did in queryset.values_list('trek', 'informationdesk')])
+
+
+def trek_relationships_updates(pks=None):
+    """ Returns ``(trek pk, date_update, pks)`` of treks related to every trek, or the given ones """
+    from .models import TrekRelationship
+
+    queryset = TrekRelationship.objects.all()
+    if pks is not None:
+        queryset = queryset.filter(trek_a__in=pks)
+    return grouped_updates(queryset.values_list('trek_a', 'trek_b__date_update', 'trek_b'))
+
+
+def snapshot_helpers():
+    """ Snapshots of published treks and POIs, by model name """
+    from geotrek.tourism.models import TouristicContent, TouristicEvent
+    from .models import Trek, POI
+    from .serializers import TrekSerializer, POISerializer
+
+    def tourism(model):
+        return [nearby_updates(model, other, settings.TOURISM_INTERSECTION_MARGIN)
+                for other in (TouristicContent, TouristicEvent)]
+
+    return {
+        'trek': SnapshotHelper(Trek, TrekSerializer, [trek_pois_updates, trek_desks_updates,
+                                                      trek_relationships_updates] + tourism(Trek)),
+        'poi': SnapshotHelper(POI, POISerializer, tourism(POI)),
+    }
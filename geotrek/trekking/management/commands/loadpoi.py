@@ -1,27 +1,37 @@
 import os.path
+import time
+from optparse import make_option
 
-from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from django.contrib.gis.gdal import DataSource, OGRException, OGRIndexError
 from django.contrib.gis.geos import GEOSGeometry
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
 
-from geotrek.core.helpers import TopologyHelper
+from geotrek.common.utils import bulk_insert
+from geotrek.core.models import PathAggregation
 from geotrek.trekking.models import POI, POIType
 
 
 class Command(BaseCommand):
     args = '<point_layer>'
-    help = 'Load a layer with point geometries in a model\n'
+    help = 'Load a layer with point geometries (any OGR format) in a model\n'
+    help += 'Points are snapped to closest paths all at once, and POIs are inserted in one transaction.\n'
     can_import_settings = True
     field_name = 'name'
     field_poitype = 'type'
 
-    def handle(self, *args, **options):
-
-        try:
-            from osgeo import gdal, ogr, osr  # NOQA
-        except ImportError:
-            msg = 'GDAL Python bindings are not available. Can not proceed.'
-            raise CommandError(msg)
+    option_list = BaseCommand.option_list + (
+        make_option('--encoding',
+                    default='utf-8',
+                    help='File encoding.'),
+        make_option('--srid',
+                    type='int',
+                    default=None,
+                    help='SRID of file, if not declared (default is %s).' % settings.API_SRID),
+    )
 
+    def handle(self, *args, **options):
         # Validate arguments
         if len(args) != 1:
             raise CommandError('Filename missing. See help')
@@ -31,31 +41,88 @@ class Command(BaseCommand):
         if not os.path.exists(filename):
             raise CommandError('File does not exists at: %s' % filename)
 
-        ogrdriver = ogr.GetDriverByName("ESRI Shapefile")
-        datasource = ogrdriver.Open(filename, 1)
-        layer = datasource.GetLayer()
-        count = layer.GetFeatureCount()
-        self.stdout.write('%s objects found' % count)
-
-        for i in range(count):
-            feature = layer.GetFeature(i)
-            featureGeom = feature.GetGeometryRef()
-            geometry = GEOSGeometry(featureGeom.ExportToWkt())
-            name = feature.GetFieldAsString(self.field_name)
-            if name:
-                name = name.decode('utf-8')
-            poitype = feature.GetFieldAsString(self.field_poitype)
-            if poitype:
-                poitype = poitype.decode('utf-8')
-            self.create_poi(geometry, name, poitype)
+        self.options = options
+        features = self.read(filename)
+        self.stdout.write('%s objects found\n' % len(features))
+
+        start = time.time()
+        pois = self.create_pois(features)
+        duration = time.time() - start
+        rate = len(pois) / duration if duration > 0 else 0
+        self.stdout.write('%s POIs created in %.3f s (%.1f features/s)\n' % (len(pois), duration, rate))
+
+    def read(self, filename):
+        """ Returns ``(geometry, name, poitype)`` of all features """
+        try:
+            datasource = DataSource(filename, encoding=self.options.get('encoding', 'utf-8'))
+        except OGRException as e:
+            raise CommandError('Can not open %s: %s' % (filename, e))
+        layer = datasource[0]
+        if not layer.geom_type.name.startswith('Point'):
+            raise CommandError('Expected points, found %s' % layer.geom_type.name)
+        srid = self.options.get('srid') or (layer.srs.srid if layer.srs else None) or settings.API_SRID
+
+        features = []
+        for feature in layer:
+            geometry = GEOSGeometry(feature.geom.wkt, srid=srid)
+            features.append((geometry, self.field(feature, self.field_name),
+                             self.field(feature, self.field_poitype)))
+        return features
+
+    def field(self, feature, name):
+        try:
+            return feature.get(name)
+        except OGRIndexError:
+            return None
 
     def create_poi(self, geometry, name, poitype):
-        poitype, created = POIType.objects.get_or_create(label=poitype)
-        poi = POI.objects.create(name=name, type=poitype)
-        # Use existing topology helpers to transform a Point(x, y)
-        # to a path aggregation (topology)
-        serialized = '{"lng": %s, "lat": %s}' % (geometry.x, geometry.y)
-        topology = TopologyHelper.deserialize(serialized)
-        # Move deserialization aggregations to the POI
-        poi.mutate(topology)
-        return poi
+        return self.create_pois([(geometry, name, poitype)])[0]
+
+    @transaction.atomic
+    def create_pois(self, features):
+        labels = set([poitype for geometry, name, poitype in features])
+        poitypes = dict((t.label, t) for t in POIType.objects.filter(label__in=labels))
+        for label in labels - set(poitypes):
+            poitypes[label] = POIType.objects.create(label=label)
+
+        pois = []
+        for geometry, name, poitype in features:
+            if geometry.srid is None:
+                geometry.srid = settings.API_SRID
+            geom = geometry.transform(settings.SRID, clone=True)
+            pois.append(POI(name=name, type=poitypes[poitype], description='', geom=geom))
+        bulk_insert(POI, pois)
+        if settings.TREKKING_TOPOLOGY_ENABLED:
+            self.snap(pois)
+        return pois
+
+    def snap(self, pois):
+        """ Attaches all POIs to their closest path, with their distance
+        as offset (see ``ST_InterpolateAlong()``).
+        """
+        sql = """
+        UPDATE e_t_evenement e
+        SET decallage = s.interpolated[2]
+        FROM (
+            SELECT c.id, c.troncon,
+                   (SELECT ARRAY[i.position, i.distance]
+                    FROM ST_InterpolateAlong(t.geom, c.geom) AS i (position float, distance float)) AS interpolated
+            FROM (SELECT p.id, p.geom,
+                         (SELECT t.id FROM l_t_troncon t WHERE t.visible
+                          ORDER BY ST_Distance(t.geom, p.geom) LIMIT 1) AS troncon
+                  FROM e_t_evenement p WHERE p.id = ANY(%s)) AS c
+            JOIN l_t_troncon t ON t.id = c.troncon
+        ) AS s
+        WHERE e.id = s.id
+        RETURNING s.id, s.troncon, s.interpolated[1];
+        """
+        cursor = connection.cursor()
+        cursor.execute(sql, [[poi.pk for poi in pois]])
+        snapped = cursor.fetchall()
+        if len(snapped) < len(pois):
+            raise CommandError('%s POI(s) could not be attached to a path' % (len(pois) - len(snapped)))
+        aggregations = [PathAggregation(topo_object_id=pk, path_id=path, order=0,
+                                        start_position=position, end_position=position)
+                        for pk, path, position in snapped]
+        # Geometries are computed by triggers
+        PathAggregation.objects.bulk_create(aggregations)
@@ -0,0 +1,24 @@
+import time
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+
+from geotrek.trekking.helpers import snapshot_helpers
+
+
+class Command(BaseCommand):
+    help = 'Render public JSON documents of published treks and POIs on disk.\n'
+    help += 'Only objects whose dependencies changed since last run are rendered.\n'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--force',
+                    action='store_true',
+                    default=False,
+                    help='Render all objects again.'),
+    )
+
+    def handle(self, *args, **options):
+        for name, helper in sorted(snapshot_helpers().items()):
+            start = time.time()
+            rendered, removed = helper.publish(force=options['force'])
+            self.stdout.write('%s: %s rendered, %s removed in %.3f s\n' % (name, rendered, removed, time.time() - start))
@@ -1,18 +1,21 @@
-import os
 import logging
 
 from django.conf import settings
 from django.contrib.gis.db import models
+from django.db import connection
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 from django.utils.translation import ugettext_lazy as _
 
 import simplekml
+from paperclip.models import Attachment
 from mapentity.models import MapEntityMixin
 from mapentity.serializers import plain_text
 
 from geotrek.core.models import Path, Topology
-from geotrek.common.utils import intersecting
 from geotrek.common.mixins import PicturesMixin, PublishableMixin, PictogramMixin
 from geotrek.common.models import Theme
+from geotrek.common.helpers import MapImageHelper
 from geotrek.maintenance.models import Intervention, Project
 from geotrek.tourism import models as tourism_models
 
@@ -103,7 +106,7 @@ class Trek(PicturesMixin, PublishableMixin, MapEntityMixin, Topology):
     @property
     def relationships(self):
         # Does not matter if a or b
-        return TrekRelationship.objects.filter(trek_a=self)
+        return self.trek_relationship_a.all()
 
     @property
     def poi_types(self):
@@ -188,9 +191,10 @@ class Trek(PicturesMixin, PublishableMixin, MapEntityMixin, Topology):
 Path.add_property('treks', Trek.path_treks)
 Topology.add_property('treks', Trek.topology_treks)
 Intervention.add_property('treks', lambda self: self.topology.treks if self.topology else [])
-Project.add_property('treks', lambda self: self.edges_by_attr('treks'))
-tourism_models.TouristicContent.add_property('treks', lambda self: intersecting(Trek, self, distance=settings.TOURISM_INTERSECTION_MARGIN))
-tourism_models.TouristicEvent.add_property('treks', lambda self: intersecting(Trek, self, distance=settings.TOURISM_INTERSECTION_MARGIN))
+Project.add_property('treks', lambda self: (self.overlapping_edges(Trek) if settings.TREKKING_TOPOLOGY_ENABLED
+                                            else self.edges_by_attr('treks')))
+tourism_models.add_nearby_property(tourism_models.TouristicContent, 'treks', Trek)
+tourism_models.add_nearby_property(tourism_models.TouristicEvent, 'treks', Trek)
 
 
 class TrekRelationshipManager(models.Manager):
@@ -388,11 +392,7 @@ class POI(PicturesMixin, PublishableMixin, MapEntityMixin, Topology):
     def save(self, *args, **kwargs):
         super(POI, self).save(*args, **kwargs)
         # Invalidate treks map
-        for trek in self.treks.all():
-            try:
-                os.remove(trek.get_map_image_path())
-            except OSError:
-                pass
+        MapImageHelper.invalidate(POI, self.pk)
 
     @property
     def type_display(self):
@@ -416,12 +416,55 @@ class POI(PicturesMixin, PublishableMixin, MapEntityMixin, Topology):
             qs = cls.objects.filter(geom__intersects=area)
         return qs
 
+    @classmethod
+    def treks_pairs(cls, pois=None, treks=None):
+        """ Returns (poi id, trek id) for all existing POIs and treks, or the given ids """
+        if settings.TREKKING_TOPOLOGY_ENABLED:
+            # Same as ``Topology.overlapping()``, for all POIs at once
+            sql = """
+            SELECT DISTINCT p.id, t.id
+            FROM e_t_evenement p, e_r_evenement_troncon pa,
+                 e_t_evenement t, e_r_evenement_troncon ta
+            WHERE p.kind = %s AND NOT p.supprime AND pa.evenement = p.id
+              AND t.kind = %s AND NOT t.supprime AND ta.evenement = t.id
+              AND ta.troncon = pa.troncon
+              AND least(ta.pk_debut, ta.pk_fin) <= greatest(pa.pk_debut, pa.pk_fin)
+              AND greatest(ta.pk_debut, ta.pk_fin) >= least(pa.pk_debut, pa.pk_fin)
+            """
+            params = [cls.KIND, Trek.KIND]
+        else:
+            sql = """
+            SELECT DISTINCT p.id, t.id
+            FROM e_t_evenement p, e_t_evenement t
+            WHERE p.kind = %s AND NOT p.supprime
+              AND t.kind = %s AND NOT t.supprime
+              AND ST_DWithin(t.geom, p.geom, %s)
+            """
+            params = [cls.KIND, Trek.KIND, settings.TREK_POI_INTERSECTION_MARGIN]
+        if pois is not None:
+            sql += " AND p.id = ANY(%s)"
+            params.append(list(pois))
+        if treks is not None:
+            sql += " AND t.id = ANY(%s)"
+            params.append(list(treks))
+        cursor = connection.cursor()
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+    @classmethod
+    def map_image_dependents(cls, pks):
+        """ Treks whose map shows the given POIs (see ``MapImageHelper``) """
+        treks = set([tid for pid, tid in cls.treks_pairs(pois=pks)])
+        return Trek.objects.filter(pk__in=treks)
+
+
 Path.add_property('pois', POI.path_pois)
 Topology.add_property('pois', POI.topology_pois)
 Intervention.add_property('pois', lambda self: self.topology.pois if self.topology else [])
-Project.add_property('pois', lambda self: self.edges_by_attr('pois'))
-tourism_models.TouristicContent.add_property('pois', lambda self: intersecting(POI, self, distance=settings.TOURISM_INTERSECTION_MARGIN))
-tourism_models.TouristicEvent.add_property('pois', lambda self: intersecting(POI, self, distance=settings.TOURISM_INTERSECTION_MARGIN))
+Project.add_property('pois', lambda self: (self.overlapping_edges(POI) if settings.TREKKING_TOPOLOGY_ENABLED
+                                           else self.edges_by_attr('pois')))
+tourism_models.add_nearby_property(tourism_models.TouristicContent, 'pois', POI)
+tourism_models.add_nearby_property(tourism_models.TouristicEvent, 'pois', POI)
 
 
 class POIType(PictogramMixin):
@@ -436,3 +479,30 @@ class POIType(PictogramMixin):
 
     def __unicode__(self):
         return self.label
+
+
+@receiver(post_save, sender=Trek, dispatch_uid="trek_snapshots_invalidate")
+@receiver(post_delete, sender=Trek, dispatch_uid="trek_snapshots_invalidate_d")
+@receiver(post_save, sender=POI, dispatch_uid="poi_snapshots_invalidate")
+@receiver(post_delete, sender=POI, dispatch_uid="poi_snapshots_invalidate_d")
+def invalidate_snapshots(sender, instance, **kwargs):
+    from .helpers import snapshot_helpers
+    snapshot_helpers()[sender._meta.module_name].invalidate(instance.pk)
+
+
+@receiver(post_save, sender=Attachment, dispatch_uid="attachment_snapshots_invalidate")
+@receiver(post_delete, sender=Attachment, dispatch_uid="attachment_snapshots_invalidate_d")
+def invalidate_attachment_snapshots(sender, instance, **kwargs):
+    model = instance.content_type.model_class()
+    if model in (Trek, POI):
+        from .helpers import snapshot_helpers
+        snapshot_helpers()[model._meta.module_name].invalidate(instance.object_id)
+
+
+@receiver(post_save, sender=tourism_models.InformationDesk, dispatch_uid="informationdesk_snapshots_invalidate")
+def invalidate_information_desk_snapshots(sender, instance, **kwargs):
+    # Information desks have no update date, other embedded objects are tracked by versions
+    from .helpers import snapshot_helpers
+    helper = snapshot_helpers()['trek']
+    for pk in Trek.objects.filter(information_desks=instance).values_list('pk', flat=True):
+        helper.invalidate(pk)
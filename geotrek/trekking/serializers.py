@@ -10,9 +10,12 @@ from mapentity.serializers import GPXSerializer
 from geotrek.common.serializers import (
     PictogramSerializerMixin, ThemeSerializer,
     TranslatedModelSerializer, PicturesSerializerMixin,
-    PublishableSerializerMixin
+    PublishableSerializerMixin, PrefetchPlanSerializerMixin,
+    prefetch_pictures
 )
+from geotrek.zoning.models import prefetch_zones
 from geotrek.zoning.serializers import ZoningSerializerMixin
+from geotrek.tourism.models import prefetch_nearby
 from geotrek.altimetry.serializers import AltimetrySerializerMixin
 from geotrek.trekking import models as trekking_models
 
@@ -95,9 +98,14 @@ class TrekRelationshipSerializer(rest_serializers.ModelSerializer):
                   'trek', 'published')
 
 
-class TrekSerializer(PublishableSerializerMixin, PicturesSerializerMixin,
+class TrekSerializer(PrefetchPlanSerializerMixin, PublishableSerializerMixin, PicturesSerializerMixin,
                      AltimetrySerializerMixin, ZoningSerializerMixin,
                      TranslatedModelSerializer):
+    select_related = ('difficulty', 'route')
+    prefetch_related = ('networks', 'themes', 'usages', 'web_links__category',
+                        'information_desks__type', 'trek_relationship_a')
+    batch_resolvers = (prefetch_pictures, prefetch_zones, prefetch_nearby)
+
     duration_pretty = rest_serializers.Field(source='duration_pretty')
     difficulty = DifficultyLevelSerializer()
     route = RouteSerializer()
@@ -180,8 +188,11 @@ class RelatedPOISerializer(TranslatedModelSerializer):
         fields = ('id', 'slug', 'name', 'type')
 
 
-class POISerializer(PublishableSerializerMixin, PicturesSerializerMixin,
+class POISerializer(PrefetchPlanSerializerMixin, PublishableSerializerMixin, PicturesSerializerMixin,
                     ZoningSerializerMixin, TranslatedModelSerializer):
+    select_related = ('type',)
+    batch_resolvers = (prefetch_pictures, prefetch_zones, prefetch_nearby)
+
     type = POITypeSerializer()
 
     def __init__(self, *args, **kwargs):
@@ -5,10 +5,11 @@ from mock import patch
 
 from django.core.management.base import CommandError
 from django.test import TestCase
-from django.contrib.gis.geos import GEOSGeometry
+from django.conf import settings
+from django.contrib.gis.geos import GEOSGeometry, LineString, Point
 
 from geotrek.core.factories import PathFactory
-from geotrek.trekking.models import POI
+from geotrek.trekking.models import POI, POIType
 from geotrek.trekking.management.commands.loadpoi import Command
 
 
@@ -33,37 +34,42 @@ class LoadPOITest(TestCase):
         self.cmd.execute(self.filename, stdout=output)
         self.assertIn('2 objects found', output.getvalue())
 
-    def test_create_pois_is_executed(self):
-        with patch.object(Command, 'create_poi') as mocked:
+    def test_command_shows_creation_rate(self):
+        output = StringIO()
+        self.cmd.execute(self.filename, stdout=output)
+        self.assertIn('2 POIs created', output.getvalue())
+        self.assertIn('features/s', output.getvalue())
+
+    def test_create_pois_is_executed_once(self):
+        with patch.object(Command, 'create_pois') as mocked:
             self.cmd.execute(self.filename)
-            self.assertEquals(mocked.call_count, 2)
+            self.assertEquals(mocked.call_count, 1)
+            self.assertEquals(len(mocked.call_args[0][0]), 2)
 
     def test_create_pois_receives_geometries(self):
         geom1 = GEOSGeometry('POINT(-1.36308670782119 -5.98358469800134696)')
         geom2 = GEOSGeometry('POINT(-1.363087202331107 -5.98358423531846917)')
-        with patch.object(Command, 'create_poi') as mocked:
+        with patch.object(Command, 'create_pois') as mocked:
             self.cmd.execute(self.filename)
-            call1 = mocked.call_args_list[0][0]
-            call2 = mocked.call_args_list[1][0]
-            self.assertEquals(call1[0], geom1)
-            self.assertEquals(call2[0], geom2)
+            feature1, feature2 = mocked.call_args[0][0]
+            self.assertEquals(feature1[0], geom1)
+            self.assertEquals(feature2[0], geom2)
 
     def test_create_pois_receives_fields_names_and_types(self):
-        with patch.object(Command, 'create_poi') as mocked:
+        with patch.object(Command, 'create_pois') as mocked:
             self.cmd.execute(self.filename)
-            call1 = mocked.call_args_list[0][0]
-            call2 = mocked.call_args_list[1][0]
-            self.assertEquals(call1[1], 'pont')
-            self.assertEquals(call2[1], 'pancarte 1')
-            self.assertEquals(call1[2], u'équipement')
-            self.assertEquals(call2[2], 'signaletique')
+            feature1, feature2 = mocked.call_args[0][0]
+            self.assertEquals(feature1[1], 'pont')
+            self.assertEquals(feature2[1], 'pancarte 1')
+            self.assertEquals(feature1[2], u'équipement')
+            self.assertEquals(feature2[2], 'signaletique')
 
     def test_create_pois_receives_null_if_field_missing(self):
         self.cmd.field_name = 'name2'
-        with patch.object(Command, 'create_poi') as mocked:
+        with patch.object(Command, 'create_pois') as mocked:
             self.cmd.execute(self.filename)
-            call1 = mocked.call_args_list[0][0]
-            self.assertEquals(call1[1], None)
+            feature1 = mocked.call_args[0][0][0]
+            self.assertEquals(feature1[1], None)
 
     def test_pois_are_created(self):
         geom = GEOSGeometry('POINT(1 1)')
@@ -76,3 +82,24 @@ class LoadPOITest(TestCase):
         geom = GEOSGeometry('POINT(1 1)')
         poi = self.cmd.create_poi(geom, 'bridge', 'infra')
         self.assertEquals([self.path], list(poi.paths.all()))
+
+    def test_pois_are_snapped_in_bulk(self):
+        other = PathFactory.create(geom=LineString((0, 10), (10, 10), srid=settings.SRID))
+        point1 = Point(1, 1, srid=settings.SRID)
+        point2 = Point(5, 11, srid=settings.SRID)
+        pois = self.cmd.create_pois([(point1, 'bridge', 'infra'),
+                                     (point2, 'sign', 'infra')])
+        self.assertEquals(POIType.objects.filter(label='infra').count(), 1)
+        self.assertEquals([self.path], list(pois[0].paths.all()))
+        self.assertEquals([other], list(pois[1].paths.all()))
+        poi = POI.objects.get(pk=pois[1].pk)
+        self.assertAlmostEqual(abs(poi.offset), 1)
+        self.assertAlmostEqual(poi.geom.x, 5)
+        self.assertAlmostEqual(poi.geom.y, 11)
+
+    def test_pois_are_not_created_without_path(self):
+        self.path.delete()
+        before = POI.objects.count()
+        with self.settings(TREKKING_TOPOLOGY_ENABLED=True):
+            self.assertRaises(CommandError, self.cmd.create_poi, GEOSGeometry('POINT(1 1)'), 'bridge', 'infra')
+        self.assertEquals(POI.objects.count(), before)
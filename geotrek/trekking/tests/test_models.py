@@ -1,3 +1,5 @@
+import os
+
 from django.test import TestCase
 from django.contrib.gis.geos import (LineString, Polygon, MultiPolygon,
                                      MultiLineString)
@@ -7,7 +9,8 @@ from bs4 import BeautifulSoup
 from geotrek.core.factories import PathFactory, PathAggregationFactory
 from geotrek.zoning.factories import DistrictFactory, CityFactory
 from geotrek.trekking.factories import (POIFactory, TrekFactory, TrekWithPOIsFactory)
-from geotrek.trekking.models import Trek
+from geotrek.common.helpers import MapImageHelper
+from geotrek.trekking.models import Trek, POI
 
 
 class TrekTest(TestCase):
@@ -208,3 +211,41 @@ class RelatedObjectsTest(TestCase):
                                                               (3, 9), (3, 3)))))
         self.assertEqual(trek.cities, [city1, city2])
         self.assertEqual(trek.city_departure, unicode(city1))
+
+
+class MapImageInvalidationTest(TestCase):
+    def setUp(self):
+        self.trek = TrekWithPOIsFactory.create()
+        with open(self.trek.get_map_image_path(), 'w') as f:
+            f.write('***')
+
+    def test_treks_map_image_is_removed_on_poi_save(self):
+        self.trek.pois[0].save()
+        self.assertFalse(os.path.exists(self.trek.get_map_image_path()))
+
+    def test_invalidations_are_coalesced_until_end_of_block(self):
+        with MapImageHelper.deferred():
+            for poi in self.trek.pois:
+                poi.save()
+            self.assertTrue(os.path.exists(self.trek.get_map_image_path()))
+            self.assertEqual(MapImageHelper._dirty(), {POI: set([poi.pk for poi in self.trek.pois])})
+        self.assertFalse(os.path.exists(self.trek.get_map_image_path()))
+        self.assertEqual(MapImageHelper._dirty(), {})
+
+    def test_invalidations_are_flushed_when_transaction_is_committed(self):
+        with MapImageHelper.atomic():
+            with MapImageHelper.atomic():
+                self.trek.pois[0].save()
+            self.assertTrue(os.path.exists(self.trek.get_map_image_path()))
+        self.assertFalse(os.path.exists(self.trek.get_map_image_path()))
+
+    def test_invalidations_are_dropped_when_transaction_is_rolled_back(self):
+        with MapImageHelper.deferred():
+            try:
+                with MapImageHelper.atomic():
+                    self.trek.pois[0].save()
+                    raise ValueError()
+            except ValueError:
+                pass
+            self.assertEqual(MapImageHelper._dirty(), {})
+        self.assertTrue(os.path.exists(self.trek.get_map_image_path()))
@@ -2,6 +2,10 @@
 # -*- coding: utf-8 -*-
 import os
 import json
+import shutil
+import tempfile
+import zipfile
+from StringIO import StringIO
 from collections import OrderedDict
 
 import mock
@@ -9,17 +13,19 @@ from bs4 import BeautifulSoup
 
 from django.conf import settings
 from django.test import TestCase
-from django.contrib.gis.geos import LineString, MultiPoint, Point
+from django.contrib.gis.geos import LineString, MultiPoint, MultiPolygon, Point
 from django.core.urlresolvers import reverse
 from django.db import connection
+from django.http import HttpResponse
 from django.template.loader import find_template
 from django.test import RequestFactory
-from django.test.utils import override_settings
+from django.test.utils import override_settings, CaptureQueriesContext
 
 from mapentity.tests import MapEntityLiveTest
 from mapentity.factories import SuperUserFactory
 
 from geotrek.common.factories import AttachmentFactory, ThemeFactory
+from geotrek.common.models import Job
 from geotrek.common.tests import CommonTest
 from geotrek.common.utils.testdata import get_dummy_uploaded_image, get_dummy_uploaded_document
 from geotrek.authent.factories import TrekkingManagerFactory
@@ -31,7 +37,9 @@ from geotrek.trekking.factories import (POIFactory, POITypeFactory, TrekFactory,
                                         TrekRelationshipFactory)
 from geotrek.trekking.templatetags import trekking_tags
 from geotrek.trekking import views as trekking_views
+from geotrek.trekking.helpers import snapshot_helpers, TrekExportHelper
 from geotrek.tourism import factories as tourism_factories
+from geotrek.tourism.models import TouristicContent
 
 from .base import TrekkingManagerTest
 
@@ -84,6 +92,14 @@ class POIViewsTest(CommonTest):
 
         settings.DEBUG = False
 
+    def test_format_list_denormalizes_treks_and_zones(self):
+        trek = TrekWithPOIsFactory.create()
+        poi = trek.pois[0]
+        city = CityFactory.create(geom=MultiPolygon(poi.geom.buffer(10), srid=settings.SRID))
+        view = trekking_views.POIFormatList()
+        self.assertIn((poi.pk, trek.pk), POI.treks_pairs())
+        self.assertIn((poi.pk, 'city', city.pk), view.poi_zones())
+
 
 class POIJSONDetailTest(TrekkingManagerTest):
     def setUp(self):
@@ -300,6 +316,44 @@ class TrekCustomViewTests(TrekkingManagerTest):
         self.assertEqual(response.status_code, 200)
         self.assertTrue(len(response.content) < 1000)
 
+    @mock.patch('geotrek.trekking.models.Trek.prepare_elevation_chart')
+    def test_outdated_document_is_served_while_rendered_by_jobs(self, prepare_elevation_chart):
+        trek = TrekFactory.create()
+        path = trek.get_document_public_cache_path('en', 'odt')
+        with open(path, 'w') as f:
+            f.write('outdated')
+        os.utime(path, (0, 0))
+        try:
+            with self.settings(RENDERING_JOBS_ENABLED=True):
+                response = self.client.get(trek.get_document_public_url() + '?lang=en')
+        finally:
+            os.remove(path)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, 'outdated')
+        self.assertFalse(prepare_elevation_chart.called)
+
+    @mock.patch('geotrek.trekking.models.Trek.prepare_elevation_chart')
+    def test_missing_document_is_not_rendered_within_request(self, prepare_elevation_chart):
+        trek = TrekFactory.create()
+        with self.settings(RENDERING_JOBS_ENABLED=True):
+            response = self.client.get(trek.get_document_public_url() + '?lang=en')
+        self.assertEqual(response.status_code, 202)
+        self.assertFalse(prepare_elevation_chart.called)
+
+    @mock.patch('geotrek.trekking.models.Trek.prepare_elevation_chart')
+    def test_only_jobs_can_render_within_request(self, prepare_elevation_chart):
+        trek = TrekFactory.create()
+        url = trek.get_document_public_url() + '?lang=en&render=%s'
+        with self.settings(RENDERING_JOBS_ENABLED=True):
+            response = self.client.get(url % '1')
+            self.assertEqual(response.status_code, 202)
+            self.assertFalse(prepare_elevation_chart.called)
+            with mock.patch('mapentity.views.MapEntityDocument.render_to_response') as render_to_response:
+                render_to_response.return_value = HttpResponse('rendered')
+                response = self.client.get(url % Job.render_token(trek, 'en'))
+        self.assertEqual(response.content, 'rendered')
+        self.assertTrue(prepare_elevation_chart.called)
+
     @mock.patch('django.template.loaders.filesystem.open', create=True)
     def test_overriden_public_template(self, open_patched):
         overriden_template = os.path.join(settings.MEDIA_ROOT, 'templates', 'trekking', 'trek_public.odt')
@@ -553,6 +607,54 @@ class TrekJSONDetailTest(TrekkingManagerTest):
             u'name': self.touristic_event.name})
 
 
+class TrekJSONListQueriesTest(TrekkingManagerTest):
+
+    def setUp(self):
+        self.login()
+
+        polygon = 'SRID=%s;MULTIPOLYGON(((0 0, 0 3, 3 3, 3 0, 0 0)))' % settings.SRID
+        CityFactory(geom=polygon)
+        DistrictFactory(geom=polygon)
+        tourism_factories.TouristicContentFactory(geom='SRID=%s;POINT(1 1)' % settings.SRID)
+        tourism_factories.TouristicEventFactory(geom='SRID=%s;POINT(2 2)' % settings.SRID)
+        self.trek = self.create_trek()
+
+    def create_trek(self):
+        trek = TrekFactory.create()
+        trek.information_desks.add(tourism_factories.InformationDeskFactory.create(photo=None))
+        trek.usages.add(UsageFactory.create())
+        trek.themes.add(ThemeFactory.create())
+        trek.networks.add(TrekNetworkFactory.create())
+        trek.web_links.add(WebLinkFactory.create())
+        TrekRelationshipFactory.create(trek_a=trek, trek_b=TrekFactory.create())
+        return trek
+
+    def get_treks(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/treks/')
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.content), len(queries)
+
+    def test_queries_count_does_not_depend_on_treks_count(self):
+        treks, count = self.get_treks()
+        self.create_trek()
+        self.create_trek()
+        more_treks, more_count = self.get_treks()
+        self.assertEqual(len(more_treks), len(treks) + 4)
+        self.assertEqual(more_count, count)
+
+    def test_prefetched_relations_are_serialized(self):
+        treks, count = self.get_treks()
+        trek = [trek for trek in treks if trek['id'] == self.trek.pk][0]
+        self.assertEqual(len(trek['relationships']), 1)
+        self.assertEqual(len(trek['information_desks']), 1)
+        self.assertEqual(len(trek['web_links']), 1)
+        self.assertEqual(len(trek['touristic_contents']), 1)
+        self.assertEqual(len(trek['touristic_events']), 1)
+        self.assertEqual(len(trek['cities']), 1)
+        self.assertEqual(len(trek['districts']), 1)
+
+
 class TrekPointsReferenceTest(TrekkingManagerTest):
     def setUp(self):
         self.login()
@@ -615,6 +717,120 @@ class TrekGPXTest(TrekkingManagerTest):
         self.assertEqual(name, u"%s: %s" % (pois[0].type, pois[0].name))
         self.assertEqual(description, pois[0].description)
 
+    def test_gpx_not_modified_until_pois_change(self):
+        url = reverse('trekking:trek_gpx_detail', kwargs={'pk': self.trek.pk})
+        etag = self.response['ETag']
+        response = self.client.get(url, HTTP_ACCEPT_LANGUAGE='it-IT', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        poi = self.trek.pois.all()[0]
+        poi.description_it = 'Nuovo'
+        poi.save()
+        response = self.client.get(url, HTTP_ACCEPT_LANGUAGE='it-IT', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_gpx_archive_of_published_treks(self):
+        TrekFactory.create(published=False)
+        url = reverse('trekking:trek_export_archive', kwargs={'fmt': 'gpx'})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        archive = zipfile.ZipFile(StringIO(response.content))
+        self.assertEqual(archive.namelist(), ['trek-%s.gpx' % self.trek.pk])
+
+    def test_gpx_modified_when_poi_is_removed(self):
+        url = reverse('trekking:trek_gpx_detail', kwargs={'pk': self.trek.pk})
+        etag = self.response['ETag']
+        pois = list(self.trek.pois.order_by('date_update'))
+        # Not the latest update among trek POIs
+        POI.objects.filter(pk=pois[0].pk).update(deleted=True)
+        response = self.client.get(url, HTTP_ACCEPT_LANGUAGE='it-IT', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(BeautifulSoup(response.content).findAll('wpt')), len(pois) - 1)
+
+    def test_gpx_archive_not_built_when_not_modified(self):
+        url = reverse('trekking:trek_export_archive', kwargs={'fmt': 'gpx'})
+        etag = self.client.get(url)['ETag']
+        with mock.patch.object(TrekExportHelper, 'archive') as archive:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse(archive.called)
+
+
+class TrekSnapshotTest(TrekkingManagerTest):
+
+    def setUp(self):
+        self.login()
+        self.snapshots_root = tempfile.mkdtemp()
+        self.trek = TrekFactory.create(name_en='Milky way', published_en=True, published_fr=False)
+
+    def tearDown(self):
+        shutil.rmtree(self.snapshots_root)
+
+    def test_published_treks_are_served_per_language(self):
+        with override_settings(PUBLIC_SNAPSHOTS_ROOT=self.snapshots_root):
+            response = self.client.get(reverse('trekking:trek_snapshot_detail',
+                                               kwargs={'lang': 'en', 'pk': self.trek.pk, 'fmt': 'json'}))
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(json.loads(response.content)['name'], 'Milky way')
+            response = self.client.get(reverse('trekking:trek_snapshot_detail',
+                                               kwargs={'lang': 'fr', 'pk': self.trek.pk, 'fmt': 'json'}))
+            self.assertEqual(response.status_code, 404)
+            response = self.client.get(reverse('trekking:trek_snapshot_list', kwargs={'lang': 'en'}))
+            features = json.loads(response.content)['features']
+            self.assertEqual([f['id'] for f in features], [self.trek.pk])
+            response = self.client.get(reverse('trekking:trek_snapshot_list', kwargs={'lang': 'fr'}))
+            self.assertEqual(json.loads(response.content)['features'], [])
+
+    def test_not_modified_with_etag(self):
+        url = reverse('trekking:trek_snapshot_list', kwargs={'lang': 'en'})
+        with override_settings(PUBLIC_SNAPSHOTS_ROOT=self.snapshots_root):
+            response = self.client.get(url)
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_only_changed_treks_are_rendered_again(self):
+        helper = snapshot_helpers()['trek']
+        with override_settings(PUBLIC_SNAPSHOTS_ROOT=self.snapshots_root):
+            self.assertEqual(helper.publish(), (1, 0))
+            self.assertEqual(helper.publish(), (0, 0))
+            self.trek.name_en = 'Via Lactea'
+            self.trek.save()
+            self.assertEqual(helper.publish(), (1, 0))
+            with open(helper.path('en', self.trek.pk)) as f:
+                self.assertEqual(json.load(f)['name'], 'Via Lactea')
+            self.trek.delete()
+            self.assertFalse(os.path.exists(helper.path('en', self.trek.pk)))
+            response = self.client.get(reverse('trekking:trek_snapshot_list', kwargs={'lang': 'en'}))
+            self.assertEqual(json.loads(response.content)['features'], [])
+
+    def test_treks_are_rendered_again_when_dependency_is_removed(self):
+        helper = snapshot_helpers()['trek']
+        older = tourism_factories.TouristicContentFactory(geom='SRID=%s;POINT(1 1)' % settings.SRID)
+        tourism_factories.TouristicContentFactory(geom='SRID=%s;POINT(2 2)' % settings.SRID)
+        with override_settings(PUBLIC_SNAPSHOTS_ROOT=self.snapshots_root):
+            self.assertEqual(helper.publish(), (1, 0))
+            # Not the latest update among trek dependencies
+            TouristicContent.objects.filter(pk=older.pk).update(deleted=True)
+            self.assertEqual(helper.publish(), (1, 0))
+            self.assertEqual(helper.publish(), (0, 0))
+
+    def test_served_treks_follow_embedded_objects(self):
+        desk = tourism_factories.InformationDeskFactory.create(photo=None)
+        self.trek.information_desks.add(desk)
+        related = TrekFactory.create(name_en='Andromeda')
+        TrekRelationshipFactory.create(trek_a=self.trek, trek_b=related)
+        url = reverse('trekking:trek_snapshot_detail', kwargs={'lang': 'en', 'pk': self.trek.pk, 'fmt': 'json'})
+        with override_settings(PUBLIC_SNAPSHOTS_ROOT=self.snapshots_root):
+            self.client.get(url)
+            desk.name_en = 'Visitor center'
+            desk.save()
+            related.name_en = 'Triangulum'
+            related.save()
+            trek = json.loads(self.client.get(url).content)
+        self.assertEqual(trek['information_desks'][0]['name'], 'Visitor center')
+        self.assertEqual(trek['relationships'][0]['trek']['name'], 'Triangulum')
+
 
 class TrekViewTranslationTest(TrekkingManagerTest):
     def setUp(self):
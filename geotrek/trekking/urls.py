@@ -9,8 +9,9 @@ from geotrek.common.urls import PublishableEntityOptions
 from . import models
 from .views import (
     TrekDocumentPublic, POIDocumentPublic,
-    TrekGPXDetail, TrekKMLDetail, TrekPOIGeoJSON,
-    TrekInformationDeskGeoJSON, WebLinkCreatePopup
+    TrekGPXDetail, TrekKMLDetail, TrekExportArchive, TrekPOIGeoJSON,
+    TrekInformationDeskGeoJSON, WebLinkCreatePopup,
+    TrekSnapshot, POISnapshot
 )
 from . import serializers as trekking_serializers
 
@@ -23,8 +24,13 @@ urlpatterns = patterns(
     # Trek specific
     url(r'^api/trek/trek-(?P<pk>\d+).gpx$', TrekGPXDetail.as_view(), name="trek_gpx_detail"),
     url(r'^api/trek/trek-(?P<pk>\d+).kml$', TrekKMLDetail.as_view(), name="trek_kml_detail"),
+    url(r'^api/trek/treks.(?P<fmt>gpx|kml).zip$', TrekExportArchive.as_view(), name="trek_export_archive"),
     url(r'^api/trek/(?P<pk>\d+)/pois.geojson$', TrekPOIGeoJSON.as_view(), name="trek_poi_geojson"),
     url(r'^api/trek/(?P<pk>\d+)/information_desks.geojson$', TrekInformationDeskGeoJSON.as_view(), name="trek_information_desk_geojson"),
+    url(r'^api/(?P<lang>[\w-]+)/treks.geojson$', TrekSnapshot.as_view(), name="trek_snapshot_list"),
+    url(r'^api/(?P<lang>[\w-]+)/treks/(?P<pk>\d+).(?P<fmt>json|geojson)$', TrekSnapshot.as_view(), name="trek_snapshot_detail"),
+    url(r'^api/(?P<lang>[\w-]+)/pois.geojson$', POISnapshot.as_view(), name="poi_snapshot_list"),
+    url(r'^api/(?P<lang>[\w-]+)/pois/(?P<pk>\d+).(?P<fmt>json|geojson)$', POISnapshot.as_view(), name="poi_snapshot_detail"),
     url(r'^popup/add/weblink/', WebLinkCreatePopup.as_view(), name='weblink_add'),
 )
 
@@ -43,7 +49,7 @@ class TrekEntityOptions(AltimetryEntityOptions, PublishableEntityOptions):
         return trekking_serializers.TrekSerializer
 
     def get_queryset(self):
-        return self.model.objects.existing()
+        return trekking_serializers.TrekSerializer.prefetch_queryset(self.model.objects.existing())
 
 
 class POIEntityOptions(PublishableEntityOptions):
@@ -52,6 +58,9 @@ class POIEntityOptions(PublishableEntityOptions):
     def get_serializer(self):
         return trekking_serializers.POISerializer
 
+    def get_queryset(self):
+        return trekking_serializers.POISerializer.prefetch_queryset(self.model.objects.all())
+
 
 urlpatterns += registry.register(models.Trek, TrekEntityOptions)
 urlpatterns += registry.register(models.POI, POIEntityOptions)
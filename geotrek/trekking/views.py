@@ -1,8 +1,14 @@
+import os
+
 from django.conf import settings
-from django.http import HttpResponse, Http404
+from django.db import connection
+from django.http import HttpResponse, HttpResponseNotModified, Http404
 from django.utils.decorators import method_decorator
 from django.utils.html import escape
+from django.utils.http import http_date
 from django.utils import translation
+from django.views.decorators.http import condition
+from django.views.generic import View
 from django.views.generic.edit import CreateView
 from django.views.generic.detail import BaseDetailView
 from django.contrib.auth.decorators import login_required
@@ -13,47 +19,19 @@ from mapentity.views import (MapEntityLayer, MapEntityList, MapEntityJsonList, M
                              LastModifiedMixin)
 from mapentity.serializers import plain_text
 from mapentity.helpers import alphabet_enumeration
-from paperclip.models import Attachment
 
 from geotrek.core.views import CreateFromTopologyMixin
 
-from geotrek.common.views import FormsetMixin, DocumentPublic
+from geotrek.common.views import FormsetMixin, DocumentPublic, FlattenPicturesMixin
 from geotrek.zoning.models import District, City, RestrictedArea
+from geotrek.tourism.models import InformationDesk
 from geotrek.tourism.views import InformationDeskGeoJSON
 
 from .models import Trek, POI, WebLink
 from .filters import TrekFilterSet, POIFilterSet
 from .forms import TrekForm, TrekRelationshipFormSet, POIForm, WebLinkCreateFormPopup
-from .serializers import TrekGPXSerializer, TrekSerializer
-
-
-class FlattenPicturesMixin(object):
-    def get_template_names(self):
-        """ Due to bug in Django, providing get_queryset() method hides
-        template_names lookup.
-        https://code.djangoproject.com/ticket/17484
-        """
-        opts = self.get_model()._meta
-        extra = ["%s/%s%s.html" % (opts.app_label, opts.object_name.lower(), self.template_name_suffix)]
-        return extra + super(FlattenPicturesMixin, self).get_template_names()
-
-    def get_queryset(self):
-        """ Override queryset to avoid attachment lookup while serializing.
-        It will fetch attachments, and force ``pictures`` attribute of instances.
-        """
-        app_label = self.get_model()._meta.app_label
-        model_name = self.get_model()._meta.object_name.lower()
-        attachments = Attachment.objects.filter(content_type__app_label=app_label,
-                                                content_type__model=model_name)
-        pictures = {}
-        for attachment in attachments:
-            if attachment.is_image:
-                obj_id = attachment.object_id
-                pictures.setdefault(obj_id, []).append(attachment)
-
-        for obj in super(FlattenPicturesMixin, self).get_queryset():
-            obj.pictures = pictures.get(obj.id, [])
-            yield obj
+from .serializers import TrekSerializer
+from .helpers import snapshot_helpers, TrekExportHelper
 
 
 class TrekLayer(MapEntityLayer):
@@ -80,33 +58,56 @@ class TrekFormatList(MapEntityFormat, TrekList):
                     'gpx', 'kml', 'printable', 'filelist_url', 'information_desk_layer']))
 
 
-class TrekGPXDetail(LastModifiedMixin, BaseDetailView):
+class TrekExportDetail(BaseDetailView):
+    """ Serves GPX or KML export of trek, cached until the trek or its POIs are modified """
     queryset = Trek.objects.existing()
+    export_format = None
 
     @method_decorator(login_required)
     def dispatch(self, *args, **kwargs):
-        return super(TrekGPXDetail, self).dispatch(*args, **kwargs)
+        return super(TrekExportDetail, self).dispatch(*args, **kwargs)
 
-    def render_to_response(self, context):
-        gpx_serializer = TrekGPXSerializer()
-        response = HttpResponse(mimetype='application/gpx+xml')
-        response['Content-Disposition'] = 'attachment; filename=trek-%s.gpx' % self.get_object().pk
-        gpx_serializer.serialize([self.get_object()], stream=response, geom_field='geom')
-        return response
+    def get(self, request, *args, **kwargs):
+        trek = self.get_object()
+        helper = TrekExportHelper(self.export_format)
+        version = helper.version(trek)
 
+        @condition(etag_func=lambda request, *args, **kwargs: helper.cache_key(trek, version),
+                   last_modified_func=lambda request, *args, **kwargs: version[0])
+        def _get(request, *args, **kwargs):
+            response = HttpResponse(helper.get(trek, version), content_type=helper.content_type)
+            if self.export_format == 'gpx':
+                response['Content-Disposition'] = 'attachment; filename=trek-%s.gpx' % trek.pk
+            return response
+        return _get(request, *args, **kwargs)
+
+
+class TrekGPXDetail(TrekExportDetail):
+    export_format = 'gpx'
+
+
+class TrekKMLDetail(TrekExportDetail):
+    export_format = 'kml'
 
-class TrekKMLDetail(LastModifiedMixin, BaseDetailView):
-    queryset = Trek.objects.existing()
+
+class TrekExportArchive(View):
+    """ Serves a zip of GPX or KML exports of all published treks """
 
     @method_decorator(login_required)
     def dispatch(self, *args, **kwargs):
-        return super(TrekKMLDetail, self).dispatch(*args, **kwargs)
+        return super(TrekExportArchive, self).dispatch(*args, **kwargs)
 
-    def render_to_response(self, context):
-        trek = self.get_object()
-        response = HttpResponse(trek.kml(),
-                                content_type='application/vnd.google-earth.kml+xml')
-        return response
+    def get(self, request, fmt):
+        helper = TrekExportHelper(fmt)
+        treks = [trek for trek in Trek.objects.existing() if trek.published]
+        key, versions = helper.archive_key(treks)
+
+        @condition(etag_func=lambda request, *args, **kwargs: key)
+        def _get(request, *args, **kwargs):
+            response = HttpResponse(helper.archive(treks, key, versions), content_type='application/zip')
+            response['Content-Disposition'] = 'attachment; filename=treks-%s.zip' % fmt
+            return response
+        return _get(request)
 
 
 class TrekPOIGeoJSON(LastModifiedMixin, GeoJSONLayerView):
@@ -148,7 +149,41 @@ class TrekInformationDeskGeoJSON(LastModifiedMixin, GeoJSONLayerView):
             trek = Trek.objects.get(pk=trek_pk)
         except Trek.DoesNotExist:
             raise Http404
-        return trek.information_desks.all()
+        return InformationDesk.prefetch_thumbnails(trek.information_desks.layer())
+
+
+class SnapshotView(View):
+    """ Serves documents prepared by ``SnapshotHelper`` """
+    model = None
+
+    @method_decorator(login_required)
+    def dispatch(self, *args, **kwargs):
+        return super(SnapshotView, self).dispatch(*args, **kwargs)
+
+    def get(self, request, lang, pk=None, fmt='json'):
+        helper = snapshot_helpers()[self.model._meta.module_name]
+        if lang not in helper.languages():
+            raise Http404
+        path = helper.get(lang, pk, fmt)
+        if path is None:
+            raise Http404
+        try:
+            stat = os.stat(path)
+            with open(path, 'rb') as f:
+                content = f.read()
+        except (IOError, OSError):  # Invalidated meanwhile
+            raise Http404
+        etag = '"%x-%x"' % (int(stat.st_mtime), stat.st_size)
+        if request.META.get('HTTP_IF_NONE_MATCH') == etag:
+            return HttpResponseNotModified()
+        response = HttpResponse(content, content_type='application/json')
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(stat.st_mtime)
+        return response
+
+
+class TrekSnapshot(SnapshotView):
+    model = Trek
 
 
 class TrekDetail(MapEntityDetail):
@@ -218,11 +253,9 @@ class TrekDocumentPublic(DocumentPublic):
 
         return context
 
-    def render_to_response(self, context, **response_kwargs):
+    def prepare_rendering(self, trek):
         # Prepare altimetric graph
-        trek = self.get_object()
         trek.prepare_elevation_chart(self.request.build_absolute_uri('/'))
-        return super(TrekDocumentPublic, self).render_to_response(context, **response_kwargs)
 
 
 class TrekRelationshipFormsetMixin(FormsetMixin):
@@ -267,22 +300,25 @@ class POIFormatList(MapEntityFormat, POIList):
 
         denormalized = {}
 
-        # Since Land layers should have less records, start by them.
-        land_layers = [('districts', District),
-                       ('cities', City),
-                       ('areas', RestrictedArea)]
-        for attrname, land_layer in land_layers:
+        # One spatial join for all land layers, using subdivided zones
+        land_layers = {'city': ('cities', City),
+                       'district': ('districts', District),
+                       'restrictedarea': ('areas', RestrictedArea)}
+        zones = {}
+        for layer, (attrname, land_layer) in land_layers.items():
             denormalized[attrname] = {}
-            for d in land_layer.objects.all():
-                overlapping = POI.objects.existing().filter(geom__within=d.geom)
-                for pid in overlapping.values_list('id', flat=True):
-                    denormalized[attrname].setdefault(pid, []).append(d)
+            zones[layer] = dict((unicode(zone.pk), zone) for zone in land_layer.objects.defer('geom'))
+        for pid, layer, zone in self.poi_zones():
+            attrname = land_layers[layer][0]
+            denormalized[attrname].setdefault(pid, []).append(zones[layer][zone])
 
-        # Same for treks
+        # One overlap query for treks
         denormalized['treks'] = {}
-        for d in Trek.objects.existing():
-            for pid in d.pois.all():
-                denormalized['treks'].setdefault(pid, []).append(d)
+        poi_treks = POI.treks_pairs()
+        treks = Trek.objects.existing().in_bulk(set(tid for pid, tid in poi_treks))
+        for pid, tid in poi_treks:
+            if tid in treks:
+                denormalized['treks'].setdefault(pid, []).append(treks[tid])
 
         for poi in qs:
             # Put denormalized in specific attribute used in serializers
@@ -291,6 +327,22 @@ class POIFormatList(MapEntityFormat, POIList):
                 setattr(poi, '%s_csv_display' % attrname, overlapping)
             yield poi
 
+    def poi_zones(self):
+        """ Returns (poi id, layer, zone id) for all existing POIs """
+        sql = """
+        SELECT DISTINCT p.id, d.couche, d.zone
+        FROM e_t_evenement p, l_zone_decoupee d
+        WHERE p.kind = %s AND NOT p.supprime AND ST_Intersects(d.geom, p.geom)
+        ORDER BY d.couche, d.zone;
+        """
+        cursor = connection.cursor()
+        cursor.execute(sql, [POI.KIND])
+        return cursor.fetchall()
+
+
+class POISnapshot(SnapshotView):
+    model = POI
+
 
 class POIDetail(MapEntityDetail):
     queryset = POI.objects.existing()
@@ -1,3 +1,4 @@
+from django.db import connection
 from django.utils.translation import ugettext_lazy as _
 
 from geotrek.core.filters import TopologyFilter, PathFilterSet, TrailFilterSet
@@ -46,7 +47,12 @@ class IntersectionFilter(TopologyFilter):
     def filter(self, qs, value):
         if not value:
             return qs
-        return qs.filter(geom__intersects=value.geom)
+        # Memberships are maintained by triggers (see sql/30_objets_zones.sql)
+        qn = connection.ops.quote_name
+        where = '%s.%s IN (SELECT objet FROM f_r_objet_zone WHERE objet_type = %%s AND couche = %%s AND zone = %%s)' % (
+            qn(qs.model._meta.db_table), qn(qs.model._meta.pk.column))
+        return qs.extra(where=[where], params=[qs.model._meta.module_name, self.model._meta.module_name,
+                                               unicode(value.pk)])
 
 
 class IntersectionFilterCity(IntersectionFilter):
@@ -0,0 +1,130 @@
+import os
+import json
+import shutil
+import logging
+
+from django.conf import settings
+from django.db import connection
+
+
+logger = logging.getLogger(__name__)
+
+
+class LandTileHelper(object):
+    """ Builds land layers tiles in PostGIS, either as Mapbox Vector Tiles
+    (requires PostGIS 2.4+) or as GeoJSON, and caches them on disk
+    until the layer is modified.
+    """
+    WORLD_SIZE = 2 * 20037508.342789244  # Spherical mercator extent
+    EXTENT = 4096  # Vector tile internal resolution
+    BUFFER = 64  # Vector tile clipping margin (in tile units)
+    PIXELS = 256  # Tile size on screen
+
+    FORMATS = {
+        'pbf': 'application/x-protobuf',
+        'geojson': 'application/json',
+    }
+
+    def __init__(self, model, properties):
+        self.model = model
+        self.properties = properties
+        self.layer = model._meta.module_name
+
+    @classmethod
+    def mvt_enabled(cls):
+        if not hasattr(cls, '_mvt_enabled'):
+            cursor = connection.cursor()
+            cursor.execute("SELECT 1 FROM pg_proc WHERE proname = 'st_asmvt';")
+            cls._mvt_enabled = cursor.fetchone() is not None
+        return cls._mvt_enabled
+
+    @classmethod
+    def bounds(cls, z, x, y):
+        """ Tile bounds in spherical mercator """
+        size = cls.WORLD_SIZE / 2 ** z
+        xmin = -cls.WORLD_SIZE / 2 + x * size
+        ymax = cls.WORLD_SIZE / 2 - y * size
+        return (xmin, ymax - size, xmin + size, ymax)
+
+    @classmethod
+    def layer_root(cls, layer):
+        return os.path.join(settings.LAND_TILES_ROOT, layer)
+
+    @classmethod
+    def invalidate(cls, layer):
+        root = cls.layer_root(layer)
+        if os.path.exists(root):
+            shutil.rmtree(root, ignore_errors=True)
+            logger.info("Invalidated %s tiles." % layer)
+
+    def path(self, z, x, y, fmt):
+        return os.path.join(self.layer_root(self.layer), str(z), str(x), '%s.%s' % (y, fmt))
+
+    def get(self, z, x, y, fmt):
+        path = self.path(z, x, y, fmt)
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                return f.read()
+        content = self.render(z, x, y, fmt)
+        dirname = os.path.dirname(path)
+        if not os.path.exists(dirname):
+            try:
+                os.makedirs(dirname)
+            except OSError:  # Created meanwhile by another request
+                pass
+        tmp_path = '%s.%s.tmp' % (path, os.getpid())
+        with open(tmp_path, 'wb') as f:
+            f.write(content)
+        os.rename(tmp_path, path)
+        return content
+
+    def columns(self):
+        qn = connection.ops.quote_name
+        fields = [self.model._meta.get_field(name) for name in self.properties]
+        return ', '.join(['%s AS %s' % (qn(field.column), qn(field.name)) for field in fields])
+
+    def render(self, z, x, y, fmt):
+        bounds = self.bounds(z, x, y)
+        # Simplify geometries below half a screen pixel
+        tolerance = (bounds[2] - bounds[0]) / self.PIXELS / 2.0
+        params = dict(columns=self.columns(),
+                      table=connection.ops.quote_name(self.model._meta.db_table),
+                      srid=settings.SRID,
+                      api_srid=settings.API_SRID,
+                      precision=settings.LAYER_PRECISION_LAND,
+                      extent=self.EXTENT,
+                      buffer=self.BUFFER)
+        cursor = connection.cursor()
+        if fmt == 'pbf':
+            sql = """
+            SELECT ST_AsMVT(tile, %%s, {extent}, 'geom') FROM (
+                SELECT {columns},
+                       ST_AsMVTGeom(ST_Transform(ST_SimplifyPreserveTopology(geom, %%s), 3857),
+                                    ST_MakeEnvelope(%%s, %%s, %%s, %%s, 3857)::box2d,
+                                    {extent}, {buffer}, true) AS geom
+                FROM {table}
+                WHERE geom && ST_Transform(ST_MakeEnvelope(%%s, %%s, %%s, %%s, 3857), {srid})
+            ) AS tile WHERE geom IS NOT NULL;
+            """.format(**params)
+            cursor.execute(sql, [self.layer, tolerance] + list(bounds) + list(bounds))
+            content = cursor.fetchone()[0]
+            return str(content) if content is not None else ''
+
+        # Clip with some margin, to avoid borders artefacts
+        margin = (bounds[2] - bounds[0]) * self.BUFFER / self.EXTENT
+        clip = (bounds[0] - margin, bounds[1] - margin, bounds[2] + margin, bounds[3] + margin)
+        sql = """
+        SELECT {columns},
+               ST_AsGeoJSON(ST_Transform(ST_Intersection(ST_SimplifyPreserveTopology(geom, %s), clip),
+                                         {api_srid}), {precision})
+        FROM {table}, (SELECT ST_Transform(ST_MakeEnvelope(%s, %s, %s, %s, 3857), {srid}) AS clip) AS c
+        WHERE geom && clip;
+        """.format(**params)
+        cursor.execute(sql, [tolerance] + list(clip))
+        features = []
+        for row in cursor.fetchall():
+            properties = dict(zip(self.properties, row[:-1]))
+            features.append({'type': 'Feature',
+                             'geometry': json.loads(row[-1]),
+                             'properties': properties})
+        return json.dumps({'type': 'FeatureCollection', 'features': features})
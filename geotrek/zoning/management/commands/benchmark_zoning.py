@@ -0,0 +1,54 @@
+import time
+from optparse import make_option
+
+from django.conf import settings
+from django.contrib.gis.geos import LineString
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from geotrek.common.utils import sql_extent
+from geotrek.core.models import Path
+
+
+class Command(BaseCommand):
+    help = 'Measure path insertion latency with whole and subdivided zoning polygons.\n'
+    help += 'Parallel paths are created across the cities layer, and everything is rolled back.\n'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--paths',
+                    type='int',
+                    default=50,
+                    help='Number of paths inserted per run.'),
+        make_option('--max-vertices',
+                    type='int',
+                    default=settings.LAND_SUBDIVIDE_MAX_VERTICES,
+                    help='Max vertices of subdivided pieces.'),
+    )
+
+    def handle(self, *args, **options):
+        try:
+            xmin, ymin, xmax, ymax = sql_extent("SELECT ST_Extent(geom) FROM l_commune;")
+        except Exception:
+            raise CommandError('No city present, load some first.')
+
+        count = options['paths']
+        runs = [('whole', 0), ('subdivided', options['max_vertices'])]
+
+        self.stdout.write('%12s %10s %10s %12s %12s\n' % ('polygons', 'pieces', 'paths', 'total (s)', 'per path (ms)'))
+        with transaction.atomic():
+            cursor = connection.cursor()
+            for label, max_vertices in runs:
+                sid = transaction.savepoint()
+                cursor.execute("SELECT ft_zone_decoupee_sync(NULL, NULL, %s);", [max_vertices])
+                cursor.execute("SELECT count(*) FROM l_zone_decoupee;")
+                pieces = cursor.fetchone()[0]
+
+                start = time.time()
+                for i in range(count):
+                    y = ymin + (ymax - ymin) * (i + 1) / (count + 1.0)
+                    Path.objects.create(geom=LineString((xmin, y), (xmax, y), srid=settings.SRID))
+                duration = time.time() - start
+
+                transaction.savepoint_rollback(sid)
+                self.stdout.write('%12s %10d %10d %12.3f %12.1f\n' % (label, pieces, count, duration,
+                                                                      1000.0 * duration / count))
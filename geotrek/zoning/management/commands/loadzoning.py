@@ -0,0 +1,183 @@
+import os.path
+import time
+from collections import Counter
+from optparse import make_option
+
+from django.conf import settings
+from django.contrib.gis.gdal import DataSource, OGRException
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from geotrek.zoning.helpers import LandTileHelper
+from geotrek.zoning.models import RestrictedAreaType
+
+
+# SQL expression of zone key (used to match existing zones with loaded ones),
+# attributes changes, and columns to fill from loaded features.
+LAYERS = {
+    'city': {
+        'table': 'l_commune',
+        'key': 'z.insee',
+        'update': 'commune = i.name',
+        'changed': 'z.commune IS DISTINCT FROM i.name',
+        'insert': ('insee, commune', 'i.code, i.name'),
+    },
+    'district': {
+        'table': 'l_secteur',
+        'key': 'z.secteur',
+        'update': 'secteur = i.name',
+        'changed': 'FALSE',
+        'insert': ('secteur', 'i.name'),
+    },
+    'restrictedarea': {
+        'table': 'l_zonage_reglementaire',
+        'key': "z.type || '|' || z.zonage",
+        'update': 'zonage = i.name, type = i.type',
+        'changed': 'FALSE',
+        'insert': ('zonage, type', 'i.name, i.type'),
+    },
+}
+
+
+class Command(BaseCommand):
+    args = '<city|district|restrictedarea> <filename>'
+    help = 'Replace a whole zoning layer with the polygons of a file (any OGR format).\n'
+    help += 'Zones missing from file are removed. Path edges and objects zones are rebuilt at once.\n'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--name-field',
+                    default='name',
+                    help='Field of zone name.'),
+        make_option('--code-field',
+                    default='code',
+                    help='Field of city code (cities only).'),
+        make_option('--type-field',
+                    default='type',
+                    help='Field of restricted area type name (restricted areas only).'),
+        make_option('--encoding',
+                    default='utf-8',
+                    help='File encoding.'),
+        make_option('--srid',
+                    type='int',
+                    default=None,
+                    help='SRID of file, if not declared.'),
+        make_option('--dry-run',
+                    action='store_true',
+                    default=False,
+                    help='Report differences only, do not modify anything.'),
+    )
+
+    def handle(self, *args, **options):
+        if len(args) != 2:
+            raise CommandError('Layer or filename missing. See help')
+        layer_name, filename = args
+        if layer_name not in LAYERS:
+            raise CommandError('Unknown layer %s, use one of: %s' % (layer_name, ', '.join(sorted(LAYERS))))
+        if not os.path.exists(filename):
+            raise CommandError('File does not exists at: %s' % filename)
+        self.layer_name = layer_name
+        self.layer = LAYERS[layer_name]
+        self.options = options
+        self.timings = []
+
+        with transaction.atomic():
+            sid = transaction.savepoint()
+            self.cursor = connection.cursor()
+
+            self.step('read', self.read, filename)
+            added, changed, removed = self.step('diff', self.diff)
+            self.stdout.write('%s zone(s) added, %s changed, %s removed\n' % (len(added), len(changed), len(removed)))
+            for label, keys in (('+', added), ('~', changed), ('-', removed)):
+                for key in sorted(keys):
+                    self.stdout.write(u'  %s %s\n' % (label, key))
+
+            if options['dry_run']:
+                transaction.savepoint_rollback(sid)
+            else:
+                self.step('replace', self.replace)
+                edges = self.step('rebuild', self.rebuild)
+                self.stdout.write('%s edge(s) created\n' % edges)
+                transaction.savepoint_commit(sid)
+
+        if not options['dry_run']:
+            LandTileHelper.invalidate(layer_name)
+
+        for step, duration in self.timings:
+            self.stdout.write('%10s %10.3f s\n' % (step, duration))
+
+    def step(self, name, func, *args):
+        start = time.time()
+        result = func(*args)
+        self.timings.append((name, time.time() - start))
+        return result
+
+    def read(self, filename):
+        try:
+            datasource = DataSource(filename, encoding=self.options['encoding'])
+        except OGRException as e:
+            raise CommandError('Can not open %s: %s' % (filename, e))
+        layer = datasource[0]
+        if layer.geom_type.name not in ('Polygon', 'MultiPolygon'):
+            raise CommandError('Expected polygons, found %s' % layer.geom_type.name)
+        srid = self.options['srid'] or (layer.srs.srid if layer.srs else None)
+        if not srid:
+            raise CommandError('File projection is unknown, use --srid option.')
+
+        self.cursor.execute("CREATE TEMPORARY TABLE zoning_import (key varchar PRIMARY KEY, code varchar, "
+                            "name varchar, type integer, geom geometry) ON COMMIT DROP;")
+
+        types = {}
+        rows = []
+        for feature in layer:
+            name = feature.get(self.options['name_field'])
+            code = type_id = None
+            if self.layer_name == 'city':
+                code = feature.get(self.options['code_field'])
+                key = code
+            elif self.layer_name == 'restrictedarea':
+                type_name = feature.get(self.options['type_field'])
+                if type_name not in types:
+                    types[type_name] = RestrictedAreaType.objects.get_or_create(name=type_name)[0].pk
+                type_id = types[type_name]
+                key = u'%s|%s' % (type_id, name)
+            else:
+                key = name
+            rows.append((key, code, name, type_id, feature.geom.wkt, srid))
+        duplicates = sorted(key for key, count in Counter(row[0] for row in rows).items() if count > 1)
+        if duplicates:
+            raise CommandError(u'Duplicate zone(s) in file: %s' % u', '.join(unicode(key) for key in duplicates))
+        self.cursor.executemany("INSERT INTO zoning_import (key, code, name, type, geom) "
+                                "SELECT %s, %s, %s, %s, ST_Multi(ST_CollectionExtract(ST_MakeValid("
+                                "ST_Transform(ST_GeomFromText(%s, %s), " + str(settings.SRID) + ")), 3));",
+                                rows)
+        self.stdout.write('%s zone(s) read\n' % len(rows))
+
+    def diff(self):
+        params = dict(self.layer)
+        self.cursor.execute("SELECT i.key FROM zoning_import i WHERE NOT EXISTS "
+                            "(SELECT 1 FROM {table} z WHERE {key} = i.key);".format(**params))
+        added = [row[0] for row in self.cursor.fetchall()]
+        self.cursor.execute("SELECT i.key FROM zoning_import i, {table} z WHERE {key} = i.key "
+                            "AND (NOT ST_OrderingEquals(z.geom, i.geom) OR {changed});".format(**params))
+        changed = [row[0] for row in self.cursor.fetchall()]
+        self.cursor.execute("SELECT {key} FROM {table} z WHERE NOT EXISTS "
+                            "(SELECT 1 FROM zoning_import i WHERE {key} = i.key);".format(**params))
+        removed = [row[0] for row in self.cursor.fetchall()]
+        return added, changed, removed
+
+    def replace(self):
+        params = dict(self.layer, columns=self.layer['insert'][0], values=self.layer['insert'][1])
+        # Per-row zoning triggers are skipped, everything is rebuilt afterwards
+        self.cursor.execute("SELECT ft_suspend_triggers('zoning', TRUE);")
+        self.cursor.execute("DELETE FROM {table} z WHERE NOT EXISTS "
+                            "(SELECT 1 FROM zoning_import i WHERE {key} = i.key);".format(**params))
+        self.cursor.execute("UPDATE {table} z SET geom = i.geom, {update} FROM zoning_import i "
+                            "WHERE {key} = i.key AND (NOT ST_OrderingEquals(z.geom, i.geom) OR {changed});".format(**params))
+        self.cursor.execute("INSERT INTO {table} ({columns}, geom) SELECT {values}, i.geom FROM zoning_import i "
+                            "WHERE NOT EXISTS (SELECT 1 FROM {table} z WHERE {key} = i.key);".format(**params))
+
+    def rebuild(self):
+        self.cursor.execute("SELECT ft_couche_sig_rebuild(%s);", [self.layer_name])
+        edges = self.cursor.fetchone()[0]
+        self.cursor.execute("SELECT ft_suspend_triggers('zoning', FALSE);")
+        return edges
@@ -8,12 +8,28 @@ from operator import attrgetter
 
 from django.contrib.gis.db import models
 from django.conf import settings
+from django.db import connection
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 from django.utils.translation import ugettext_lazy as _
 
-from geotrek.common.utils import uniquify, intersecting
+from geotrek.common.utils import uniquify
 from geotrek.core.models import Topology, Path
 from geotrek.maintenance.models import Intervention, Project
 from geotrek.tourism.models import TouristicContent, TouristicEvent
+from geotrek.zoning.helpers import LandTileHelper
+
+
+def zones(cls, obj):
+    """ Zones of ``cls`` intersecting ``obj``, read from the membership table
+    maintained by triggers (see ``sql/30_objets_zones.sql``).
+    """
+    obj_type = 'topology' if isinstance(obj, Topology) else obj._meta.module_name
+    pk = cls._meta.pk
+    qn = connection.ops.quote_name
+    where = '%s.%s IN (SELECT zone::%s FROM f_r_objet_zone WHERE couche = %%s AND objet_type = %%s AND objet = %%s)' % (
+        qn(cls._meta.db_table), qn(pk.column), 'integer' if isinstance(pk, models.AutoField) else 'varchar')
+    return cls.objects.extra(where=[where], params=[cls._meta.module_name, obj_type, obj.pk])
 
 
 class RestrictedAreaType(models.Model):
@@ -88,13 +104,13 @@ if settings.TREKKING_TOPOLOGY_ENABLED:
     Topology.add_property('areas', lambda self: uniquify(map(attrgetter('restricted_area'), self.area_edges)))
     Intervention.add_property('area_edges', lambda self: self.topology.area_edges if self.topology else [])
     Intervention.add_property('areas', lambda self: self.topology.areas if self.topology else [])
-    Project.add_property('area_edges', lambda self: self.edges_by_attr('area_edges'))
+    Project.add_property('area_edges', lambda self: self.overlapping_edges(RestrictedAreaEdge))
     Project.add_property('areas', lambda self: uniquify(map(attrgetter('restricted_area'), self.area_edges)))
 else:
-    Topology.add_property('areas', lambda self: intersecting(RestrictedArea, self))
+    Topology.add_property('areas', lambda self: zones(RestrictedArea, self))
 
-TouristicContent.add_property('areas', lambda self: intersecting(RestrictedArea, self))
-TouristicEvent.add_property('areas', lambda self: intersecting(RestrictedArea, self))
+TouristicContent.add_property('areas', lambda self: zones(RestrictedArea, self))
+TouristicEvent.add_property('areas', lambda self: zones(RestrictedArea, self))
 
 
 class City(models.Model):
@@ -148,13 +164,13 @@ if settings.TREKKING_TOPOLOGY_ENABLED:
     Topology.add_property('cities', lambda self: uniquify(map(attrgetter('city'), self.city_edges)))
     Intervention.add_property('city_edges', lambda self: self.topology.city_edges if self.topology else [])
     Intervention.add_property('cities', lambda self: self.topology.cities if self.topology else [])
-    Project.add_property('city_edges', lambda self: self.edges_by_attr('city_edges'))
+    Project.add_property('city_edges', lambda self: self.overlapping_edges(CityEdge))
     Project.add_property('cities', lambda self: uniquify(map(attrgetter('city'), self.city_edges)))
 else:
-    Topology.add_property('cities', lambda self: intersecting(City, self))
+    Topology.add_property('cities', lambda self: zones(City, self))
 
-TouristicContent.add_property('cities', lambda self: intersecting(City, self))
-TouristicEvent.add_property('cities', lambda self: intersecting(City, self))
+TouristicContent.add_property('cities', lambda self: zones(City, self))
+TouristicEvent.add_property('cities', lambda self: zones(City, self))
 
 
 class District(models.Model):
@@ -206,10 +222,73 @@ if settings.TREKKING_TOPOLOGY_ENABLED:
     Topology.add_property('districts', lambda self: uniquify(map(attrgetter('district'), self.district_edges)))
     Intervention.add_property('district_edges', lambda self: self.topology.district_edges if self.topology else [])
     Intervention.add_property('districts', lambda self: self.topology.districts if self.topology else [])
-    Project.add_property('district_edges', lambda self: self.edges_by_attr('district_edges'))
+    Project.add_property('district_edges', lambda self: self.overlapping_edges(DistrictEdge))
     Project.add_property('districts', lambda self: uniquify(map(attrgetter('district'), self.district_edges)))
 else:
-    Topology.add_property('districts', lambda self: intersecting(District, self))
-
-TouristicContent.add_property('districts', lambda self: intersecting(District, self))
-TouristicEvent.add_property('districts', lambda self: intersecting(District, self))
+    Topology.add_property('districts', lambda self: zones(District, self))
+
+TouristicContent.add_property('districts', lambda self: zones(District, self))
+TouristicEvent.add_property('districts', lambda self: zones(District, self))
+
+
+def prefetch_zones(topologies):
+    """ Set ``cities``, ``districts`` and ``areas`` of all given topologies,
+    with one query per layer instead of one per topology.
+    """
+    topologies = [topology for topology in topologies if topology.pk]
+    if not topologies:
+        return
+    pks = tuple(topology.pk for topology in topologies)
+    cursor = connection.cursor()
+    layers = (('cities', City, CityEdge, 'city'),
+              ('districts', District, DistrictEdge, 'district'),
+              ('areas', RestrictedArea, RestrictedAreaEdge, 'restricted_area'))
+    for name, cls, edge_cls, fk in layers:
+        if settings.TREKKING_TOPOLOGY_ENABLED:
+            # Same as ``Topology.overlapping()`` ordering, for all topologies at once
+            sql = """
+            SELECT ta.evenement, e.{column}
+            FROM e_r_evenement_troncon ta, e_r_evenement_troncon ea, {table} e, e_t_evenement ee
+            WHERE ta.evenement IN %s AND ea.troncon = ta.troncon
+              AND ea.evenement = e.evenement AND ee.id = e.evenement AND NOT ee.supprime
+              AND least(ea.pk_debut, ea.pk_fin) <= greatest(ta.pk_debut, ta.pk_fin)
+              AND greatest(ea.pk_debut, ea.pk_fin) >= least(ta.pk_debut, ta.pk_fin)
+            ORDER BY ta.evenement,
+                     ta.ordre + CASE WHEN ta.pk_debut > ta.pk_fin THEN (1 - ea.pk_debut) ELSE ea.pk_debut END;
+            """.format(column=connection.ops.quote_name(edge_cls._meta.get_field(fk).column),
+                       table=connection.ops.quote_name(edge_cls._meta.db_table))
+            cursor.execute(sql, [pks])
+        else:
+            cursor.execute("SELECT objet, zone FROM f_r_objet_zone "
+                           "WHERE couche = %s AND objet_type = 'topology' AND objet IN %s;",
+                           [cls._meta.module_name, pks])
+        rows = [(pk, cls._meta.pk.to_python(zone)) for pk, zone in cursor.fetchall()]
+        zones = cls.objects.filter(pk__in=set(zone for pk, zone in rows))
+        if settings.TREKKING_TOPOLOGY_ENABLED:
+            # Ordered along topologies
+            zones = dict((zone.pk, zone) for zone in zones)
+            found = {}
+            for pk, zone in rows:
+                found.setdefault(pk, []).append(zones[zone])
+            found = dict((pk, uniquify(values)) for pk, values in found.items())
+        else:
+            # Default ordering of zones
+            owners = {}
+            for pk, zone in rows:
+                owners.setdefault(zone, []).append(pk)
+            found = {}
+            for zone in zones:
+                for pk in owners[zone.pk]:
+                    found.setdefault(pk, []).append(zone)
+        for topology in topologies:
+            topology.prefetch_property(name, found.get(topology.pk, []))
+
+
+@receiver(post_save, sender=City, dispatch_uid="city_tiles_invalidate")
+@receiver(post_delete, sender=City, dispatch_uid="city_tiles_invalidate_d")
+@receiver(post_save, sender=District, dispatch_uid="district_tiles_invalidate")
+@receiver(post_delete, sender=District, dispatch_uid="district_tiles_invalidate_d")
+@receiver(post_save, sender=RestrictedArea, dispatch_uid="restrictedarea_tiles_invalidate")
+@receiver(post_delete, sender=RestrictedArea, dispatch_uid="restrictedarea_tiles_invalidate_d")
+def invalidate_land_tiles(sender, **kwargs):
+    LandTileHelper.invalidate(sender._meta.module_name)
@@ -30,6 +30,140 @@ ALTER TABLE l_secteur ADD CONSTRAINT l_secteur_geom_isvalid CHECK (ST_IsValid(ge
 ALTER TABLE l_zonage_reglementaire DROP CONSTRAINT IF EXISTS l_zonage_reglementaire_geom_isvalid;
 ALTER TABLE l_zonage_reglementaire ADD CONSTRAINT l_zonage_reglementaire_geom_isvalid CHECK (ST_IsValid(geom));
 
+-------------------------------------------------------------------------------
+-- Subdivided Commune/Zonage/Secteur polygons
+-------------------------------------------------------------------------------
+-- Zones are big multipolygons with thousands of vertices. Spatial predicates
+-- and intersections are computed against small pieces of them instead
+-- (see LAND_SUBDIVIDE_MAX_VERTICES setting).
+
+CREATE TABLE IF NOT EXISTS zonage.l_zone_decoupee (
+    couche varchar(32) NOT NULL,
+    zone varchar(16) NOT NULL,
+    geom geometry(Polygon, {{SRID}}) NOT NULL
+);
+
+DROP INDEX IF EXISTS l_zone_decoupee_geom_idx;
+CREATE INDEX l_zone_decoupee_geom_idx ON zonage.l_zone_decoupee USING gist(geom);
+
+DROP INDEX IF EXISTS l_zone_decoupee_zone_idx;
+CREATE INDEX l_zone_decoupee_zone_idx ON zonage.l_zone_decoupee (couche, zone);
+
+
+CREATE OR REPLACE FUNCTION zonage.ft_subdivide(geom geometry, max_vertices integer) RETURNS SETOF geometry AS $$
+DECLARE
+    xmid float;
+    ymid float;
+    part geometry;
+BEGIN
+    IF geom IS NULL OR ST_IsEmpty(geom) THEN
+        RETURN;
+    END IF;
+
+    -- No subdivision
+    IF max_vertices IS NULL OR max_vertices <= 0 OR ST_NPoints(geom) <= max_vertices THEN
+        RETURN QUERY SELECT (ST_Dump(geom)).geom;
+        RETURN;
+    END IF;
+
+    -- Use native function when available (PostGIS 2.2+)
+    IF EXISTS (SELECT 1 FROM pg_proc WHERE proname = 'st_subdivide') THEN
+        RETURN QUERY EXECUTE 'SELECT (ST_Dump(ST_Subdivide($1, greatest($2, 8)))).geom' USING geom, max_vertices;
+        RETURN;
+    END IF;
+
+    -- Otherwise cut recursively along the longest side of bounding box
+    IF ST_XMax(geom) - ST_XMin(geom) >= ST_YMax(geom) - ST_YMin(geom) THEN
+        xmid := (ST_XMin(geom) + ST_XMax(geom)) / 2.0;
+        IF xmid <= ST_XMin(geom) THEN
+            RETURN QUERY SELECT (ST_Dump(geom)).geom;
+            RETURN;
+        END IF;
+        FOR part IN SELECT ST_CollectionExtract(ST_Intersection(geom, ST_MakeEnvelope(x1, ST_YMin(geom), x2, ST_YMax(geom), ST_SRID(geom))), 3)
+                    FROM (VALUES (ST_XMin(geom), xmid), (xmid, ST_XMax(geom))) AS halves(x1, x2)
+        LOOP
+            RETURN QUERY SELECT * FROM ft_subdivide(part, max_vertices);
+        END LOOP;
+    ELSE
+        ymid := (ST_YMin(geom) + ST_YMax(geom)) / 2.0;
+        IF ymid <= ST_YMin(geom) THEN
+            RETURN QUERY SELECT (ST_Dump(geom)).geom;
+            RETURN;
+        END IF;
+        FOR part IN SELECT ST_CollectionExtract(ST_Intersection(geom, ST_MakeEnvelope(ST_XMin(geom), y1, ST_XMax(geom), y2, ST_SRID(geom))), 3)
+                    FROM (VALUES (ST_YMin(geom), ymid), (ymid, ST_YMax(geom))) AS halves(y1, y2)
+        LOOP
+            RETURN QUERY SELECT * FROM ft_subdivide(part, max_vertices);
+        END LOOP;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+
+CREATE OR REPLACE FUNCTION zonage.ft_zone_decoupee_sync(couches varchar[], zids varchar[], max_vertices integer) RETURNS void AS $$
+BEGIN
+    -- NULL means all layers or all zones
+    DELETE FROM l_zone_decoupee
+        WHERE (couches IS NULL OR couche = ANY(couches))
+          AND (zids IS NULL OR zone = ANY(zids));
+
+    INSERT INTO l_zone_decoupee (couche, zone, geom)
+        SELECT 'city', z.insee, ft_subdivide(z.geom, max_vertices) FROM l_commune z
+            WHERE (couches IS NULL OR 'city' = ANY(couches)) AND (zids IS NULL OR z.insee = ANY(zids))
+        UNION ALL
+        SELECT 'district', z.id::varchar, ft_subdivide(z.geom, max_vertices) FROM l_secteur z
+            WHERE (couches IS NULL OR 'district' = ANY(couches)) AND (zids IS NULL OR z.id::varchar = ANY(zids))
+        UNION ALL
+        SELECT 'restrictedarea', z.id::varchar, ft_subdivide(z.geom, max_vertices) FROM l_zonage_reglementaire z
+            WHERE (couches IS NULL OR 'restrictedarea' = ANY(couches)) AND (zids IS NULL OR z.id::varchar = ANY(zids));
+END;
+$$ LANGUAGE plpgsql;
+
+
+DROP TRIGGER IF EXISTS commune_00_decoupe_iud_tgr ON l_commune;
+DROP TRIGGER IF EXISTS secteur_00_decoupe_iud_tgr ON l_secteur;
+DROP TRIGGER IF EXISTS zonage_00_decoupe_iud_tgr ON l_zonage_reglementaire;
+
+CREATE OR REPLACE FUNCTION zonage.zone_decoupee_iud() RETURNS trigger AS $$
+DECLARE
+    couche_name varchar := TG_ARGV[0];
+    id_name varchar := TG_ARGV[1];
+    zid varchar;
+BEGIN
+    -- Named with 00 to run before other triggers of zones, which rely on pieces
+    -- Whole layer reloads rebuild pieces at once (see ft_couche_sig_rebuild())
+    IF ft_triggers_suspended('zoning') THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP != 'INSERT' THEN
+        EXECUTE 'SELECT ($1).'|| quote_ident(id_name) ||'::varchar' INTO zid USING OLD;
+        DELETE FROM l_zone_decoupee WHERE couche = couche_name AND zone = zid;
+    END IF;
+    IF TG_OP != 'DELETE' THEN
+        EXECUTE 'SELECT ($1).'|| quote_ident(id_name) ||'::varchar' INTO zid USING NEW;
+        PERFORM ft_zone_decoupee_sync(ARRAY[couche_name], ARRAY[zid], {{LAND_SUBDIVIDE_MAX_VERTICES}});
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER commune_00_decoupe_iud_tgr
+AFTER INSERT OR UPDATE OF geom OR DELETE ON l_commune
+FOR EACH ROW EXECUTE PROCEDURE zone_decoupee_iud('city', 'insee');
+
+CREATE TRIGGER secteur_00_decoupe_iud_tgr
+AFTER INSERT OR UPDATE OF geom OR DELETE ON l_secteur
+FOR EACH ROW EXECUTE PROCEDURE zone_decoupee_iud('district', 'id');
+
+CREATE TRIGGER zonage_00_decoupe_iud_tgr
+AFTER INSERT OR UPDATE OF geom OR DELETE ON l_zonage_reglementaire
+FOR EACH ROW EXECUTE PROCEDURE zone_decoupee_iud('restrictedarea', 'id');
+
+-- Initial subdivision
+SELECT ft_zone_decoupee_sync(NULL, NULL, {{LAND_SUBDIVIDE_MAX_VERTICES}})
+WHERE NOT EXISTS (SELECT 1 FROM l_zone_decoupee);
+
+
 -------------------------------------------------------------------------------
 -- Delete Commune/Zonage/Secteur when evenements are deleted
 -------------------------------------------------------------------------------
@@ -41,6 +175,11 @@ DECLARE
     tab varchar;
     eid integer;
 BEGIN
+    -- Evenements are deleted by caller (see ft_delete_zoning_edges())
+    IF ft_triggers_suspended('topologies') THEN
+        RETURN NULL;
+    END IF;
+
     FOREACH tab IN ARRAY ARRAY[['f_t_commune', 'f_t_secteur', 'f_t_zonage']]
     LOOP
         -- Delete related object in association tables
@@ -74,6 +213,10 @@ DROP TRIGGER IF EXISTS zonage_troncons_d_tgr ON f_t_zonage;
 
 CREATE OR REPLACE FUNCTION zonage.nettoyage_auto_couches_sig_d() RETURNS trigger AS $$
 BEGIN
+    IF ft_triggers_suspended('topologies') THEN
+        RETURN NULL;
+    END IF;
+
     DELETE FROM e_r_evenement_troncon WHERE evenement = OLD.evenement;
     DELETE FROM e_t_evenement WHERE id = OLD.evenement;
     RETURN NULL;
@@ -95,51 +238,151 @@ FOR EACH ROW EXECUTE PROCEDURE nettoyage_auto_couches_sig_d();
 
 
 -------------------------------------------------------------------------------
--- Sync when Troncon modified
+-- Set-based computation of Commune/Zonage/Secteur evenements
 -------------------------------------------------------------------------------
+-- Each function works on a whole set of paths (``pids``), of edge kinds
+-- (``kinds``) and of zones (``zids``). NULL means no restriction.
+-- Evenements geometry and altimetry are computed here in the same statement,
+-- thus per-row topology triggers are suspended meanwhile.
+
+CREATE OR REPLACE FUNCTION zonage.ft_create_zoning_edges(pids integer[], kinds varchar[], zids varchar[]) RETURNS integer AS $$
+DECLARE
+    was_suspended boolean;
+    t_count integer;
+BEGIN
+    was_suspended := ft_triggers_suspended('topologies');
+    PERFORM ft_suspend_triggers('topologies', TRUE);
+
+    WITH pieces AS (
+        SELECT kind, zone, troncon, ST_Union(igeom) AS igeom
+        FROM (SELECT CASE d.couche WHEN 'city' THEN 'CITYEDGE'
+                                   WHEN 'district' THEN 'DISTRICTEDGE'
+                                   ELSE 'RESTRICTEDAREAEDGE' END::varchar AS kind,
+                     d.zone, t.id AS troncon, ST_Intersection(d.geom, t.geom) AS igeom
+              FROM l_t_troncon t, l_zone_decoupee d
+              WHERE (pids IS NULL OR t.id = ANY(pids))
+                AND (zids IS NULL OR d.zone = ANY(zids))
+                AND ST_Intersects(d.geom, t.geom)) AS sub
+        WHERE (kinds IS NULL OR kind = ANY(kinds))
+        GROUP BY kind, zone, troncon
+    ),
+    intersections AS (
+        -- Sew lines cut by pieces boundaries, keep isolated points
+        SELECT kind, zone, troncon, (ST_Dump(ST_LineMerge(ST_CollectionExtract(igeom, 2)))).geom AS igeom FROM pieces
+        UNION ALL
+        SELECT kind, zone, troncon, (ST_Dump(ST_CollectionExtract(igeom, 1))).geom FROM pieces
+    ),
+    located AS (
+        SELECT kind, zone, troncon, tgeom, tgeom_3d,
+               least(pk_a, pk_b) AS pk_debut, greatest(pk_a, pk_b) AS pk_fin
+        FROM (SELECT i.kind, i.zone, i.troncon, t.geom AS tgeom, t.geom_3d AS tgeom_3d,
+                     ST_Line_Locate_Point(t.geom, COALESCE(ST_StartPoint(i.igeom), i.igeom)) AS pk_a,
+                     ST_Line_Locate_Point(t.geom, COALESCE(ST_EndPoint(i.igeom), i.igeom)) AS pk_b
+              FROM intersections i, l_t_troncon t
+              WHERE t.id = i.troncon) AS sub
+    ),
+    edges AS (
+        SELECT nextval(pg_get_serial_sequence('e_t_evenement', 'id')) AS eid, kind, zone, troncon, pk_debut, pk_fin,
+               CASE WHEN pk_debut = pk_fin THEN ST_Line_Interpolate_Point(tgeom, pk_debut)
+                    ELSE ST_Smart_Line_Substring(tgeom, pk_debut, pk_fin) END AS egeom,
+               CASE WHEN pk_debut = pk_fin THEN ST_Line_Interpolate_Point(tgeom, pk_debut)
+                    ELSE ST_Smart_Line_Substring(tgeom_3d, pk_debut, pk_fin) END AS egeom_3d
+        FROM located
+    ),
+    evenements AS (
+        INSERT INTO e_t_evenement (id, date_insert, date_update, kind, decallage, supprime, geom, geom_3d, longueur,
+                                   pente, altitude_minimum, altitude_maximum, denivelee_positive, denivelee_negative)
+        SELECT eid, now(), now(), kind, 0, FALSE, ST_Force_2D(egeom), ST_Force_3DZ((elevation).draped), ST_3DLength((elevation).draped),
+               (elevation).slope, (elevation).min_elevation, (elevation).max_elevation,
+               (elevation).positive_gain, (elevation).negative_gain
+        FROM (SELECT eid, kind, egeom, ft_elevation_infos(egeom_3d) AS elevation FROM edges OFFSET 0) AS sub
+        RETURNING id
+    ),
+    aggregations AS (
+        INSERT INTO e_r_evenement_troncon (troncon, evenement, pk_debut, pk_fin, ordre)
+        SELECT troncon, eid, pk_debut, pk_fin, 0 FROM edges
+    ),
+    communes AS (
+        INSERT INTO f_t_commune (evenement, commune)
+        SELECT eid, zone FROM edges WHERE kind = 'CITYEDGE'
+    ),
+    secteurs AS (
+        INSERT INTO f_t_secteur (evenement, secteur)
+        SELECT eid, zone::integer FROM edges WHERE kind = 'DISTRICTEDGE'
+    ),
+    zonages AS (
+        INSERT INTO f_t_zonage (evenement, zone)
+        SELECT eid, zone::integer FROM edges WHERE kind = 'RESTRICTEDAREAEDGE'
+    )
+    SELECT count(*) INTO t_count FROM evenements;
+
+    PERFORM ft_suspend_triggers('topologies', was_suspended);
+    RETURN t_count;
+END;
+$$ LANGUAGE plpgsql;
 
-DROP TRIGGER IF EXISTS l_t_troncon_couches_sig_iu_tgr ON l_t_troncon;
 
-CREATE OR REPLACE FUNCTION lien_auto_troncon_couches_sig_iu() RETURNS trigger AS $$
+CREATE OR REPLACE FUNCTION zonage.ft_delete_zoning_edges(pids integer[], kinds varchar[], zids varchar[]) RETURNS integer AS $$
 DECLARE
-    rec record;
-    tab varchar;
-    eid integer;
+    was_suspended boolean;
+    eids integer[];
 BEGIN
-    -- Remove obsolete evenement
-    IF TG_OP = 'UPDATE' THEN
-        -- Related evenement/zonage/secteur/commune will be cleared by another trigger
-        DELETE FROM e_r_evenement_troncon et USING f_t_zonage z WHERE et.troncon = OLD.id AND et.evenement = z.evenement;
-        DELETE FROM e_r_evenement_troncon et USING f_t_secteur s WHERE et.troncon = OLD.id AND et.evenement = s.evenement;
-        DELETE FROM e_r_evenement_troncon et USING f_t_commune c WHERE et.troncon = OLD.id AND et.evenement = c.evenement;
+    SELECT array_agg(DISTINCT e.evenement) INTO eids
+        FROM (SELECT evenement, 'CITYEDGE'::varchar AS kind, commune::varchar AS zone FROM f_t_commune
+              UNION ALL
+              SELECT evenement, 'DISTRICTEDGE'::varchar, secteur::varchar FROM f_t_secteur
+              UNION ALL
+              SELECT evenement, 'RESTRICTEDAREAEDGE'::varchar, zone::varchar FROM f_t_zonage) AS e
+        WHERE (kinds IS NULL OR e.kind = ANY(kinds))
+          AND (zids IS NULL OR e.zone = ANY(zids))
+          AND (pids IS NULL OR EXISTS (SELECT 1 FROM e_r_evenement_troncon et
+                                       WHERE et.evenement = e.evenement AND et.troncon = ANY(pids)));
+
+    IF eids IS NULL THEN
+        RETURN 0;
     END IF;
 
-    -- Add new evenement
-    -- Note: Column names differ between commune, secteur and zonage, we can not use an elegant loop.
+    was_suspended := ft_triggers_suspended('topologies');
+    PERFORM ft_suspend_triggers('topologies', TRUE);
 
-    -- Commune
-    FOR rec IN EXECUTE 'SELECT id, ST_Line_Locate_Point($1, COALESCE(ST_StartPoint(geom), geom)) as pk_a, ST_Line_Locate_Point($1, COALESCE(ST_EndPoint(geom), geom)) as pk_b FROM (SELECT insee AS id, (ST_Dump(ST_Multi(ST_Intersection(geom, $1)))).geom AS geom FROM l_commune WHERE ST_Intersects(geom, $1)) AS sub' USING NEW.geom
-    LOOP
-        INSERT INTO e_t_evenement (date_insert, date_update, kind, decallage, longueur, geom, supprime) VALUES (now(), now(), 'CITYEDGE', 0, 0, NEW.geom, FALSE) RETURNING id INTO eid;
-        INSERT INTO e_r_evenement_troncon (troncon, evenement, pk_debut, pk_fin) VALUES (NEW.id, eid, least(rec.pk_a, rec.pk_b), greatest(rec.pk_a, rec.pk_b));
-        INSERT INTO f_t_commune (evenement, commune) VALUES (eid, rec.id);
-    END LOOP;
+    DELETE FROM e_r_evenement_troncon WHERE evenement = ANY(eids);
+    DELETE FROM f_t_commune WHERE evenement = ANY(eids);
+    DELETE FROM f_t_secteur WHERE evenement = ANY(eids);
+    DELETE FROM f_t_zonage WHERE evenement = ANY(eids);
+    DELETE FROM e_t_evenement WHERE id = ANY(eids);
 
-    -- Secteur
-    FOR rec IN EXECUTE 'SELECT id, ST_Line_Locate_Point($1,COALESCE(ST_StartPoint(geom), geom)) as pk_a, ST_Line_Locate_Point($1, COALESCE(ST_EndPoint(geom), geom)) as pk_b FROM (SELECT id, (ST_Dump(ST_Multi(ST_Intersection(geom, $1)))).geom AS geom FROM l_secteur WHERE ST_Intersects(geom, $1)) AS sub' USING NEW.geom
-    LOOP
-        INSERT INTO e_t_evenement (date_insert, date_update, kind, decallage, longueur, geom, supprime) VALUES (now(), now(), 'DISTRICTEDGE', 0, 0, NEW.geom, FALSE) RETURNING id INTO eid;
-        INSERT INTO e_r_evenement_troncon (troncon, evenement, pk_debut, pk_fin) VALUES (NEW.id, eid, least(rec.pk_a, rec.pk_b), greatest(rec.pk_a, rec.pk_b));
-        INSERT INTO f_t_secteur (evenement, secteur) VALUES (eid, rec.id);
-    END LOOP;
+    PERFORM ft_suspend_triggers('topologies', was_suspended);
 
-    -- Zonage
-    FOR rec IN EXECUTE 'SELECT id, ST_Line_Locate_Point($1, COALESCE(ST_StartPoint(geom), geom)) as pk_a, ST_Line_Locate_Point($1, COALESCE(ST_EndPoint(geom), geom)) as pk_b FROM (SELECT id, (ST_Dump(ST_Multi(ST_Intersection(geom, $1)))).geom AS geom FROM l_zonage_reglementaire WHERE ST_Intersects(geom, $1)) AS sub' USING NEW.geom
-    LOOP
-        INSERT INTO e_t_evenement (date_insert, date_update, kind, decallage, longueur, geom, supprime) VALUES (now(), now(), 'RESTRICTEDAREAEDGE', 0, 0, NEW.geom, FALSE) RETURNING id INTO eid;
-        INSERT INTO e_r_evenement_troncon (troncon, evenement, pk_debut, pk_fin) VALUES (NEW.id, eid, least(rec.pk_a, rec.pk_b), greatest(rec.pk_a, rec.pk_b));
-        INSERT INTO f_t_zonage (evenement, zone) VALUES (eid, rec.id);
-    END LOOP;
+    -- Touch latest topology once (see evenement_latest_updated_d())
+    UPDATE e_t_evenement SET date_update = NOW()
+    WHERE id IN (SELECT id FROM e_t_evenement ORDER BY date_update DESC LIMIT 1);
+
+    RETURN array_length(eids, 1);
+END;
+$$ LANGUAGE plpgsql;
+
+
+-------------------------------------------------------------------------------
+-- Sync when Troncon modified
+-------------------------------------------------------------------------------
+
+DROP TRIGGER IF EXISTS l_t_troncon_couches_sig_iu_tgr ON l_t_troncon;
+
+CREATE OR REPLACE FUNCTION zonage.lien_auto_troncon_couches_sig_iu() RETURNS trigger AS $$
+BEGIN
+    -- Bulk loaders suspend this trigger, and call ft_create_zoning_edges()
+    -- once for all their paths.
+    IF ft_triggers_suspended('zoning') THEN
+        RETURN NULL;
+    END IF;
+
+    -- Remove obsolete evenements
+    IF TG_OP = 'UPDATE' THEN
+        PERFORM ft_delete_zoning_edges(ARRAY[OLD.id], NULL, NULL);
+    END IF;
+
+    -- Add new evenements
+    PERFORM ft_create_zoning_edges(ARRAY[NEW.id], NULL, NULL);
 
     RETURN NULL;
 END;
@@ -159,36 +402,25 @@ DROP TRIGGER IF EXISTS commune_troncons_iu_tgr ON l_commune;
 DROP TRIGGER IF EXISTS secteur_troncons_iu_tgr ON l_secteur;
 DROP TRIGGER IF EXISTS zonage_troncons_iu_tgr ON l_zonage_reglementaire;
 
-CREATE OR REPLACE FUNCTION lien_auto_couches_sig_troncon_iu() RETURNS trigger AS $$
+CREATE OR REPLACE FUNCTION zonage.lien_auto_couches_sig_troncon_iu() RETURNS trigger AS $$
 DECLARE
-    table_name varchar := TG_ARGV[0];
     id_name varchar := TG_ARGV[1];
-    fk_name varchar := TG_ARGV[2];
     kind_name varchar := TG_ARGV[3];
-    obj record;
-    rec record;
-    eid integer;
+    zid varchar;
 BEGIN
-    -- Harmonize ID name
-    BEGIN
-        SELECT NEW.insee AS id INTO obj;
-    EXCEPTION
-        WHEN undefined_column THEN
-            SELECT NEW.id AS id INTO obj;
-    END;
-
-    -- Remove obsolete evenement
+    IF ft_triggers_suspended('zoning') THEN
+        RETURN NULL;
+    END IF;
+
+    EXECUTE 'SELECT ($1).'|| quote_ident(id_name) ||'::varchar' INTO zid USING NEW;
+
+    -- Remove obsolete evenements
     IF TG_OP = 'UPDATE' THEN
-        EXECUTE 'DELETE FROM '|| quote_ident(table_name) ||' WHERE '|| quote_ident(fk_name) ||' = $1' USING obj.id;
+        PERFORM ft_delete_zoning_edges(NULL, ARRAY[kind_name], ARRAY[zid]);
     END IF;
 
-    -- Add new evenement
-    FOR rec IN EXECUTE 'SELECT id, egeom AS geom, ST_Line_Locate_Point(tgeom, ST_StartPoint(egeom)) AS pk_a, ST_Line_Locate_Point(tgeom, ST_EndPoint(egeom)) AS pk_b FROM (SELECT id, geom AS tgeom, (ST_Dump(ST_Multi(ST_Intersection(geom, $1)))).geom AS egeom FROM l_t_troncon WHERE ST_Intersects(geom, $1)) AS sub' USING NEW.geom
-    LOOP
-        INSERT INTO e_t_evenement (date_insert, date_update, kind, decallage, longueur, geom, supprime) VALUES (now(), now(), kind_name, 0, 0, rec.geom, FALSE) RETURNING id INTO eid;
-        INSERT INTO e_r_evenement_troncon (troncon, evenement, pk_debut, pk_fin) VALUES (rec.id, eid, least(rec.pk_a, rec.pk_b), greatest(rec.pk_a, rec.pk_b));
-        EXECUTE 'INSERT INTO '|| quote_ident(table_name) ||' (evenement, '|| quote_ident(fk_name) ||') VALUES ($1, $2)' USING eid, obj.id;
-    END LOOP;
+    -- Add new evenements
+    PERFORM ft_create_zoning_edges(NULL, ARRAY[kind_name], ARRAY[zid]);
 
     RETURN NULL;
 END;
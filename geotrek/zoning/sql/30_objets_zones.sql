@@ -0,0 +1,171 @@
+-------------------------------------------------------------------------------
+-- Zones of non-topological objects
+-------------------------------------------------------------------------------
+-- Objects located by their own geometry (touristic contents and events, or
+-- topologies in Geotrek-light) get their cities, districts and restricted
+-- areas from this membership table, maintained by triggers on both sides,
+-- instead of running spatial predicates for every object.
+
+CREATE TABLE IF NOT EXISTS zonage.f_b_objet_zone_source (
+    objet_type varchar(32) PRIMARY KEY,
+    objet_table varchar(64) NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS zonage.f_r_objet_zone (
+    objet_type varchar(32) NOT NULL,
+    objet integer NOT NULL,
+    couche varchar(32) NOT NULL,
+    zone varchar(16) NOT NULL
+);
+
+DROP INDEX IF EXISTS f_r_objet_zone_objet_idx;
+CREATE INDEX f_r_objet_zone_objet_idx ON zonage.f_r_objet_zone (objet_type, objet);
+
+DROP INDEX IF EXISTS f_r_objet_zone_zone_idx;
+CREATE INDEX f_r_objet_zone_zone_idx ON zonage.f_r_objet_zone (couche, zone);
+
+
+CREATE OR REPLACE FUNCTION zonage.ft_objet_zone_link(otype varchar, otable varchar, oids integer[], couches varchar[], zids varchar[]) RETURNS void AS $$
+BEGIN
+    -- NULL means no restriction on objects, layers or zones
+    EXECUTE 'INSERT INTO f_r_objet_zone (objet_type, objet, couche, zone)'
+         || ' SELECT DISTINCT $1, o.id, d.couche, d.zone FROM '|| quote_ident(otable) ||' o, l_zone_decoupee d'
+         || '  WHERE ($2 IS NULL OR o.id = ANY($2)) AND ($3 IS NULL OR d.couche = ANY($3))'
+         || '    AND ($4 IS NULL OR d.zone = ANY($4)) AND ST_Intersects(d.geom, o.geom)'
+    USING otype, oids, couches, zids;
+END;
+$$ LANGUAGE plpgsql;
+
+
+-------------------------------------------------------------------------------
+-- Sync when objects are modified
+-------------------------------------------------------------------------------
+
+CREATE OR REPLACE FUNCTION zonage.objet_zone_iud() RETURNS trigger AS $$
+DECLARE
+    otype varchar := TG_ARGV[0];
+BEGIN
+    IF TG_OP != 'INSERT' THEN
+        DELETE FROM f_r_objet_zone WHERE objet_type = otype AND objet = OLD.id;
+    END IF;
+    IF TG_OP != 'DELETE' THEN
+        PERFORM ft_objet_zone_link(otype, TG_TABLE_NAME, ARRAY[NEW.id], NULL, NULL);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+
+CREATE OR REPLACE FUNCTION zonage.ft_objet_zone_register(otype varchar, otable varchar) RETURNS void AS $$
+BEGIN
+    -- Install the trigger on objects table, and (re)build its memberships
+    DELETE FROM f_b_objet_zone_source WHERE objet_type = otype;
+    INSERT INTO f_b_objet_zone_source (objet_type, objet_table) VALUES (otype, otable);
+
+    EXECUTE 'DROP TRIGGER IF EXISTS '|| quote_ident(otable || '_objet_zone_iud_tgr') ||' ON '|| quote_ident(otable);
+    EXECUTE 'CREATE TRIGGER '|| quote_ident(otable || '_objet_zone_iud_tgr')
+         || ' AFTER INSERT OR UPDATE OF geom OR DELETE ON '|| quote_ident(otable)
+         || ' FOR EACH ROW EXECUTE PROCEDURE objet_zone_iud('|| quote_literal(otype) ||')';
+
+    DELETE FROM f_r_objet_zone WHERE objet_type = otype;
+    PERFORM ft_objet_zone_link(otype, otable, NULL, NULL, NULL);
+END;
+$$ LANGUAGE plpgsql;
+
+
+CREATE OR REPLACE FUNCTION zonage.ft_objet_zone_unregister(otype varchar, otable varchar) RETURNS void AS $$
+BEGIN
+    DELETE FROM f_b_objet_zone_source WHERE objet_type = otype;
+    EXECUTE 'DROP TRIGGER IF EXISTS '|| quote_ident(otable || '_objet_zone_iud_tgr') ||' ON '|| quote_ident(otable);
+    DELETE FROM f_r_objet_zone WHERE objet_type = otype;
+END;
+$$ LANGUAGE plpgsql;
+
+
+-------------------------------------------------------------------------------
+-- Sync when Commune/Zonage/Secteur modified
+-------------------------------------------------------------------------------
+
+DROP TRIGGER IF EXISTS commune_objet_zone_iud_tgr ON l_commune;
+DROP TRIGGER IF EXISTS secteur_objet_zone_iud_tgr ON l_secteur;
+DROP TRIGGER IF EXISTS zonage_objet_zone_iud_tgr ON l_zonage_reglementaire;
+
+CREATE OR REPLACE FUNCTION zonage.zone_objet_iud() RETURNS trigger AS $$
+DECLARE
+    couche_name varchar := TG_ARGV[0];
+    id_name varchar := TG_ARGV[1];
+    zid varchar;
+    src record;
+BEGIN
+    -- Whole layer reloads rebuild memberships at once (see ft_couche_sig_rebuild())
+    IF ft_triggers_suspended('zoning') THEN
+        RETURN NULL;
+    END IF;
+
+    IF TG_OP != 'INSERT' THEN
+        EXECUTE 'SELECT ($1).'|| quote_ident(id_name) ||'::varchar' INTO zid USING OLD;
+        DELETE FROM f_r_objet_zone WHERE couche = couche_name AND zone = zid;
+    END IF;
+    IF TG_OP != 'DELETE' THEN
+        EXECUTE 'SELECT ($1).'|| quote_ident(id_name) ||'::varchar' INTO zid USING NEW;
+        FOR src IN SELECT objet_type, objet_table FROM f_b_objet_zone_source
+        LOOP
+            PERFORM ft_objet_zone_link(src.objet_type, src.objet_table, NULL, ARRAY[couche_name], ARRAY[zid]);
+        END LOOP;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER commune_objet_zone_iud_tgr
+AFTER INSERT OR UPDATE OF geom OR DELETE ON l_commune
+FOR EACH ROW EXECUTE PROCEDURE zone_objet_iud('city', 'insee');
+
+CREATE TRIGGER secteur_objet_zone_iud_tgr
+AFTER INSERT OR UPDATE OF geom OR DELETE ON l_secteur
+FOR EACH ROW EXECUTE PROCEDURE zone_objet_iud('district', 'id');
+
+CREATE TRIGGER zonage_objet_zone_iud_tgr
+AFTER INSERT OR UPDATE OF geom OR DELETE ON l_zonage_reglementaire
+FOR EACH ROW EXECUTE PROCEDURE zone_objet_iud('restrictedarea', 'id');
+
+
+-------------------------------------------------------------------------------
+-- Rebuild a whole layer
+-------------------------------------------------------------------------------
+-- Used after bulk loads performed with 'zoning' triggers suspended: pieces,
+-- path edges and objects memberships of the layer are rebuilt set-based.
+
+CREATE OR REPLACE FUNCTION zonage.ft_couche_sig_rebuild(couche_name varchar) RETURNS integer AS $$
+DECLARE
+    kind_name varchar;
+    src record;
+    t_count integer;
+BEGIN
+    kind_name := CASE couche_name WHEN 'city' THEN 'CITYEDGE'
+                                  WHEN 'district' THEN 'DISTRICTEDGE'
+                                  ELSE 'RESTRICTEDAREAEDGE' END;
+
+    PERFORM ft_zone_decoupee_sync(ARRAY[couche_name], NULL, {{LAND_SUBDIVIDE_MAX_VERTICES}});
+
+    PERFORM ft_delete_zoning_edges(NULL, ARRAY[kind_name], NULL);
+    SELECT ft_create_zoning_edges(NULL, ARRAY[kind_name], NULL) INTO t_count;
+
+    DELETE FROM f_r_objet_zone WHERE couche = couche_name;
+    FOR src IN SELECT objet_type, objet_table FROM f_b_objet_zone_source
+    LOOP
+        PERFORM ft_objet_zone_link(src.objet_type, src.objet_table, NULL, ARRAY[couche_name], NULL);
+    END LOOP;
+
+    RETURN t_count;
+END;
+$$ LANGUAGE plpgsql;
+
+
+-------------------------------------------------------------------------------
+-- Topologies are zoned through their paths, except in Geotrek-light
+-------------------------------------------------------------------------------
+
+SELECT CASE WHEN {{TREKKING_TOPOLOGY_ENABLED}}
+            THEN ft_objet_zone_unregister('topology', 'e_t_evenement')
+            ELSE ft_objet_zone_register('topology', 'e_t_evenement') END;
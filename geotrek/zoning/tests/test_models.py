@@ -1,11 +1,21 @@
+import os
+import json
+import shutil
+import tempfile
+from StringIO import StringIO
+
 from django.test import TestCase
+from django.db import connection
+from django.core.management import call_command
+from django.core.management.base import CommandError
 from django.conf import settings
 from django.contrib.gis.geos import LineString, Polygon, MultiPolygon
 
 from geotrek.core.models import Topology
 from geotrek.core.factories import PathFactory
 from geotrek.land.tests.test_views import EdgeHelperTest
-from geotrek.zoning.models import City
+from geotrek.tourism.factories import TouristicContentFactory
+from geotrek.zoning.models import City, District
 from geotrek.zoning.factories import (DistrictEdgeFactory, CityEdgeFactory,
                                       RestrictedAreaFactory, RestrictedAreaEdgeFactory)
 
@@ -39,6 +49,181 @@ class PathUpdateTest(TestCase):
         p1.save()
 
 
+class ZoningEdgesBatchTest(TestCase):
+
+    def setUp(self):
+        self.city = City.objects.create(code='005177', name='Trifouillis-les-oies',
+                                        geom=MultiPolygon(Polygon(((0, 0), (2, 0), (2, 2), (0, 2), (0, 0)),
+                                                                  srid=settings.SRID)))
+
+    def test_edge_geometry_is_computed_on_insert(self):
+        p = PathFactory.create(geom=LineString((1, 1), (3, 1), srid=settings.SRID))
+        edge = self.city.cityedge_set.get()
+        self.assertEqual(edge.geom.coords, ((1, 1), (2, 1)))
+        self.assertEqual(edge.length, 1)
+        pa = edge.aggregations.get()
+        self.assertEqual(pa.path, p)
+        self.assertEqual(pa.start_position, 0.0)
+        self.assertEqual(pa.end_position, 0.5)
+
+    def test_edges_are_created_for_several_paths_at_once(self):
+        p1 = PathFactory.create(geom=LineString((1, 1), (1, 3), srid=settings.SRID))
+        p2 = PathFactory.create(geom=LineString((3, 3), (1.5, 1.5), srid=settings.SRID))
+        cursor = connection.cursor()
+        cursor.execute("SELECT ft_delete_zoning_edges(%s, NULL, NULL);", [[p1.pk, p2.pk]])
+        self.assertEqual(cursor.fetchone()[0], 2)
+        self.assertEqual(self.city.cityedge_set.count(), 0)
+        cursor.execute("SELECT ft_create_zoning_edges(%s, ARRAY['CITYEDGE'], NULL);", [[p1.pk, p2.pk]])
+        self.assertEqual(cursor.fetchone()[0], 2)
+        self.assertEqual(p1.aggregations.count(), 1)
+        self.assertEqual(p2.aggregations.count(), 1)
+        edge2 = self.city.cityedge_set.get(aggregations__path=p2)
+        self.assertEqual(edge2.geom.coords, ((2, 2), (1.5, 1.5)))
+
+
+class SubdividedZonesTest(TestCase):
+
+    def setUp(self):
+        # A city with many vertices along its bottom border
+        coords = [(x / 10.0, 0) for x in range(21)] + [(2, 2), (0, 2), (0, 0)]
+        self.city = City.objects.create(code='005177', name='Trifouillis-les-oies',
+                                        geom=MultiPolygon(Polygon(coords, srid=settings.SRID)))
+        self.cursor = connection.cursor()
+        self.cursor.execute("SELECT ft_zone_decoupee_sync(NULL, NULL, 8);")
+
+    def test_zones_are_cut_into_pieces(self):
+        self.cursor.execute("SELECT count(*), max(ST_NPoints(geom)) FROM l_zone_decoupee WHERE zone = '005177';")
+        count, npoints = self.cursor.fetchone()
+        self.assertTrue(count > 1)
+        self.assertTrue(npoints <= 8)
+
+    def test_edges_are_sewn_across_pieces(self):
+        p = PathFactory.create(geom=LineString((-1, 1), (3, 1), srid=settings.SRID))
+        edge = self.city.cityedge_set.get()
+        self.assertEqual(edge.geom.coords, ((0, 1), (2, 1)))
+        pa = p.aggregations.get()
+        self.assertAlmostEqual(pa.start_position, 0.25)
+        self.assertAlmostEqual(pa.end_position, 0.75)
+
+    def test_objects_are_zoned_once(self):
+        content = TouristicContentFactory.create(geom='SRID=%s;POINT(1 0.5)' % settings.SRID)
+        self.assertEqual(list(content.cities), [self.city])
+
+
+class LayerRebuildTest(TestCase):
+
+    def test_layer_is_rebuilt_after_suspended_load(self):
+        p = PathFactory.create(geom=LineString((1, 1), (3, 1), srid=settings.SRID))
+        content = TouristicContentFactory.create(geom='SRID=%s;POINT(1 1)' % settings.SRID)
+        cursor = connection.cursor()
+        cursor.execute("SELECT ft_suspend_triggers('zoning', TRUE);")
+        city = City.objects.create(code='005177', name='Trifouillis-les-oies',
+                                   geom=MultiPolygon(Polygon(((0, 0), (2, 0), (2, 2), (0, 2), (0, 0)),
+                                                             srid=settings.SRID)))
+        self.assertEqual(city.cityedge_set.count(), 0)
+        self.assertEqual(len(content.cities), 0)
+        cursor.execute("SELECT ft_couche_sig_rebuild('city');")
+        self.assertEqual(cursor.fetchone()[0], 1)
+        cursor.execute("SELECT ft_suspend_triggers('zoning', FALSE);")
+        self.assertEqual(city.cityedge_set.get().aggregations.get().path, p)
+        self.assertEqual(list(content.cities), [city])
+
+
+class LoadZoningTest(TestCase):
+
+    def setUp(self):
+        self.path = PathFactory.create(geom=LineString((1, 1), (3, 1), srid=settings.SRID))
+        self.city = City.objects.create(code='005177', name='Trifouillis-les-oies',
+                                        geom=MultiPolygon(Polygon(((0, 0), (2, 0), (2, 2), (0, 2), (0, 0)),
+                                                                  srid=settings.SRID)))
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def layer_file(self, zones):
+        filename = os.path.join(self.tmpdir, 'zones.geojson')
+        features = [{'type': 'Feature', 'properties': properties,
+                     'geometry': {'type': 'Polygon', 'coordinates': [coords]}}
+                    for properties, coords in zones]
+        with open(filename, 'w') as f:
+            f.write(json.dumps({'type': 'FeatureCollection', 'features': features}))
+        return filename
+
+    def load(self, layer, zones, **options):
+        output = StringIO()
+        call_command('loadzoning', layer, self.layer_file(zones), srid=settings.SRID, stdout=output, **options)
+        return output.getvalue()
+
+    def cities_file(self):
+        return [
+            ({'code': '005177', 'name': 'Trifouillis'}, [(0, 0), (3, 0), (3, 2), (0, 2), (0, 0)]),
+            ({'code': '005178', 'name': 'Pouilly'}, [(10, 10), (12, 10), (12, 12), (10, 12), (10, 10)]),
+        ]
+
+    def test_dry_run_reports_differences_only(self):
+        output = self.load('city', self.cities_file(), dry_run=True)
+        self.assertIn('1 zone(s) added, 1 changed, 0 removed', output)
+        self.assertIn('+ 005178', output)
+        self.assertIn('~ 005177', output)
+        self.assertEqual(City.objects.count(), 1)
+        city = City.objects.get()
+        self.assertEqual(city.name, 'Trifouillis-les-oies')
+        self.assertEqual(city.cityedge_set.get().geom.coords, ((1, 1), (2, 1)))
+
+    def test_layer_is_replaced_and_edges_rebuilt(self):
+        output = self.load('city', self.cities_file())
+        self.assertIn('1 edge(s) created', output)
+        self.assertEqual(City.objects.count(), 2)
+        city = City.objects.get(code='005177')
+        self.assertEqual(city.name, 'Trifouillis')
+        edge = city.cityedge_set.get()
+        self.assertEqual(edge.geom.coords, ((1, 1), (3, 1)))
+        self.assertEqual(edge.aggregations.get().path, self.path)
+        # Zoning triggers are enabled again
+        cursor = connection.cursor()
+        cursor.execute("SELECT ft_triggers_suspended('zoning');")
+        self.assertFalse(cursor.fetchone()[0])
+        PathFactory.create(geom=LineString((11, 11), (13, 11), srid=settings.SRID))
+        self.assertEqual(City.objects.get(code='005178').cityedge_set.count(), 1)
+
+    def test_missing_zones_are_removed(self):
+        output = self.load('district', [({'name': 'Secteur'}, [(0, 0), (3, 0), (3, 2), (0, 2), (0, 0)])])
+        self.assertIn('1 zone(s) added, 0 changed, 0 removed', output)
+        district = District.objects.get()
+        self.assertEqual(district.districtedge_set.get().geom.coords, ((1, 1), (3, 1)))
+        output = self.load('district', [({'name': 'Autre'}, [(10, 10), (12, 10), (12, 12), (10, 12), (10, 10)])])
+        self.assertIn('- Secteur', output)
+        self.assertEqual(District.objects.get().name, 'Autre')
+        self.assertEqual(District.objects.get().districtedge_set.count(), 0)
+        self.assertEqual(self.city.cityedge_set.count(), 1)
+
+    def test_duplicate_zones_are_reported(self):
+        zones = self.cities_file() + [({'code': '005178', 'name': 'Pouilly bis'}, [(5, 5), (6, 5), (6, 6), (5, 5)])]
+        with self.assertRaisesRegexp(CommandError, '005178'):
+            self.load('city', zones)
+        self.assertEqual(City.objects.get().name, 'Trifouillis-les-oies')
+
+
+class ObjectZonesTest(TestCase):
+
+    def test_zones_follow_objects_and_layers(self):
+        content = TouristicContentFactory.create(geom='SRID=%s;POINT(1 1)' % settings.SRID)
+        self.assertEqual(len(content.cities), 0)
+        city = City.objects.create(code='005177', name='Trifouillis-les-oies',
+                                   geom=MultiPolygon(Polygon(((0, 0), (2, 0), (2, 2), (0, 2), (0, 0)),
+                                                             srid=settings.SRID)))
+        self.assertEqual(list(content.cities), [city])
+        content.geom = 'SRID=%s;POINT(3 3)' % settings.SRID
+        content.save()
+        self.assertEqual(len(content.cities), 0)
+        city.geom = MultiPolygon(Polygon(((2, 2), (4, 2), (4, 4), (2, 4), (2, 2)), srid=settings.SRID))
+        city.save()
+        self.assertEqual(list(content.cities), [city])
+        city.delete()
+        self.assertEqual(len(content.cities), 0)
+
+
 class LandLayersUpdateTest(TestCase):
 
     def test_troncons_link(self):
@@ -1,7 +1,17 @@
+import os
+import json
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.contrib.gis.geos import Polygon, MultiPolygon
 from django.test import TestCase
+from django.test.utils import override_settings
 from django.core.urlresolvers import reverse
 
 from geotrek.zoning.factories import RestrictedAreaTypeFactory
+from geotrek.zoning.helpers import LandTileHelper
+from geotrek.zoning.models import City
 
 
 class LandLayersViewsTest(TestCase):
@@ -25,3 +35,52 @@ class RestrictedAreaViewsTest(TestCase):
         url = reverse('zoning:restrictedarea_type_layer', kwargs={'type_pk': t.pk})
         response = self.client.get(url)
         self.assertEqual(response.status_code, 200)
+
+
+class LandTilesViewsTest(TestCase):
+
+    def setUp(self):
+        self.tiles_root = tempfile.mkdtemp()
+        self.city = City.objects.create(code='005177', name='Trifouillis-les-oies',
+                                        geom=MultiPolygon(Polygon(((0, 0), (2, 0), (2, 2), (0, 2), (0, 0)),
+                                                                  srid=settings.SRID)))
+
+    def tearDown(self):
+        shutil.rmtree(self.tiles_root)
+
+    def tile_url(self, fmt):
+        return reverse('zoning:city_tile', kwargs={'z': 0, 'x': 0, 'y': 0, 'format': fmt})
+
+    def test_geojson_tile(self):
+        with override_settings(LAND_TILES_ROOT=self.tiles_root):
+            response = self.client.get(self.tile_url('geojson'))
+        self.assertEqual(response.status_code, 200)
+        features = json.loads(response.content)['features']
+        self.assertEqual(len(features), 1)
+        self.assertEqual(features[0]['properties'], {'code': '005177', 'name': 'Trifouillis-les-oies'})
+
+    def test_pbf_tile(self):
+        with override_settings(LAND_TILES_ROOT=self.tiles_root):
+            response = self.client.get(self.tile_url('pbf'))
+        if LandTileHelper.mvt_enabled():
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response['Content-Type'], 'application/x-protobuf')
+        else:
+            self.assertEqual(response.status_code, 501)
+
+    def test_tile_out_of_range(self):
+        url = reverse('zoning:city_tile', kwargs={'z': 1, 'x': 2, 'y': 0, 'format': 'geojson'})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 404)
+
+    def test_tiles_are_cached_until_layer_changes(self):
+        with override_settings(LAND_TILES_ROOT=self.tiles_root):
+            self.client.get(self.tile_url('geojson'))
+            path = os.path.join(self.tiles_root, 'city', '0', '0', '0.geojson')
+            self.assertTrue(os.path.exists(path))
+            self.city.name = 'Trifouillis-les-poules'
+            self.city.save()
+            self.assertFalse(os.path.exists(path))
+            response = self.client.get(self.tile_url('geojson'))
+        features = json.loads(response.content)['features']
+        self.assertEqual(features[0]['properties']['name'], 'Trifouillis-les-poules')
@@ -1,10 +1,12 @@
-from django.http import Http404
+from django.http import Http404, HttpResponse
 from django.views.decorators.cache import cache_page
 from django.conf import settings
 from django.utils.decorators import method_decorator
+from django.views.generic import View
 from djgeojson.views import GeoJSONLayerView
 
 from .models import City, RestrictedArea, RestrictedAreaType, District
+from .helpers import LandTileHelper
 
 
 class LandLayerMixin(object):
@@ -41,3 +43,37 @@ class RestrictedAreaTypeGeoJSONLayer(LandLayerMixin, GeoJSONLayerView):
 class DistrictGeoJSONLayer(LandLayerMixin, GeoJSONLayerView):
     model = District
     properties = ['name']
+
+
+class LandLayerTile(View):
+    """ Land layer tile, as Mapbox Vector Tile or GeoJSON.
+    Geometries are simplified according to zoom level, and tiles are
+    cached on disk until the layer is modified.
+    """
+    model = None
+    properties = []
+
+    def get(self, request, *args, **kwargs):
+        z, x, y = int(kwargs['z']), int(kwargs['x']), int(kwargs['y'])
+        fmt = kwargs['format']
+        if z > 22 or x >= 2 ** z or y >= 2 ** z:
+            raise Http404
+        if fmt == 'pbf' and not LandTileHelper.mvt_enabled():
+            return HttpResponse('Vector tiles require PostGIS 2.4 or later.', status=501)
+        helper = LandTileHelper(self.model, self.properties)
+        return HttpResponse(helper.get(z, x, y, fmt), content_type=helper.FORMATS[fmt])
+
+
+class CityTile(LandLayerTile):
+    model = City
+    properties = ['code', 'name']
+
+
+class RestrictedAreaTile(LandLayerTile):
+    model = RestrictedArea
+    properties = ['id', 'name', 'area_type']
+
+
+class DistrictTile(LandLayerTile):
+    model = District
+    properties = ['id', 'name']